@@ -0,0 +1,85 @@
+import pandas as pd
+
+from records import DAYS_OF_WEEK, MINUTES_PER_DAY, STATUSES, minutes_column, parse_minutes
+
+
+# Monday of the deadline's week as "YYYY-MM-DD", for a column of deadlines
+def deadline_weeks(deadlines):
+    deadlines = pd.to_datetime(pd.Series(deadlines, dtype=object)).dt.normalize()
+    return (deadlines - pd.to_timedelta(deadlines.dt.weekday, unit="D")).dt.strftime("%Y-%m-%d").tolist()
+
+
+# Scheduled minutes for one "Time From"/"Time To" pair; an end before the
+# start means the slot runs past midnight
+def scheduled_minutes(time_from, time_to):
+    return (parse_minutes(time_to) - parse_minutes(time_from)) % MINUTES_PER_DAY
+
+
+# Aggregates behind the Visualizations page, for one user or for everyone.
+#
+# todo_counts maps (status, deadline week) to a task count, from which the
+# status histogram and the completion trend are both read; weekday_minutes
+# maps day names to scheduled minutes. The SQLite backend keeps these counts
+# in tables updated inside every write, so loading them is a keyed lookup.
+class UserStats:
+    def __init__(self, todo_counts=None, weekday_minutes=None, users=None):
+        self.todo_counts = {key: n for key, n in (todo_counts or {}).items() if n}
+        self.weekday_minutes = {day: n for day, n in (weekday_minutes or {}).items() if n}
+        self.users = users
+
+    def copy(self):
+        return UserStats(self.todo_counts, self.weekday_minutes, self.users)
+
+    @property
+    def empty(self):
+        return not self.todo_counts and not self.weekday_minutes
+
+    # Build from rows of (status, week, tasks) and (day, minutes)
+    @classmethod
+    def from_rows(cls, todo_rows, schedule_rows, users=None):
+        todo_counts, weekday_minutes = {}, {}
+        for status, week, tasks in todo_rows:
+            todo_counts[(status, week)] = todo_counts.get((status, week), 0) + tasks
+        for day, minutes in schedule_rows:
+            weekday_minutes[day] = weekday_minutes.get(day, 0) + minutes
+        return cls(todo_counts, weekday_minutes, users)
+
+    # Build from todo and schedule frames in the stored layout (one scan)
+    @classmethod
+    def from_frames(cls, todo_df, schedule_df, users=None):
+        todo_rows = []
+        if not todo_df.empty:
+            counts = pd.DataFrame({"Status": todo_df["Status"].astype(str).to_numpy(),
+                                   "Week": deadline_weeks(todo_df["Deadline"])}).value_counts()
+            todo_rows = [(status, week, int(n)) for (status, week), n in counts.items()]
+        schedule_rows = []
+        if not schedule_df.empty:
+            minutes = (minutes_column(schedule_df["Time To"]).astype(int)
+                       - minutes_column(schedule_df["Time From"]).astype(int)) % MINUTES_PER_DAY
+            totals = pd.Series(minutes, index=schedule_df["Day"].to_numpy()).groupby(level=0).sum()
+            schedule_rows = [(day, int(n)) for day, n in totals.items()]
+        return cls.from_rows(todo_rows, schedule_rows, users)
+
+    # Task count per status, in the usual status order
+    def status_counts(self):
+        counts = {}
+        for (status, _), n in self.todo_counts.items():
+            counts[status] = counts.get(status, 0) + n
+        order = [status for status in STATUSES if status in counts] + sorted(set(counts) - set(STATUSES))
+        return pd.Series([counts[status] for status in order], index=order, dtype=int, name="count")
+
+    # Scheduled hours per weekday, Monday first, for days that have any
+    def weekday_hours(self):
+        days = [day for day in DAYS_OF_WEEK if day in self.weekday_minutes]
+        return pd.Series([self.weekday_minutes[day] / 60 for day in days], index=days, dtype=float)
+
+    # Tasks and completed tasks per deadline week, with the completion rate
+    def completion_trend(self):
+        weeks = {}
+        for (status, week), n in self.todo_counts.items():
+            total, completed = weeks.get(week, (0, 0))
+            weeks[week] = (total + n, completed + (n if status == "Completed" else 0))
+        trend = pd.DataFrame([(week, total, completed) for week, (total, completed) in sorted(weeks.items())],
+                             columns=["Week", "Tasks", "Completed"]).set_index("Week")
+        trend["Completion Rate"] = trend["Completed"] / trend["Tasks"]
+        return trend
@@ -0,0 +1,208 @@
+import base64
+import hashlib
+import hmac
+import os
+import threading
+from collections import OrderedDict
+
+# Open directories are kept per process so the user index survives reruns
+_directories = {}
+_directories_lock = threading.Lock()
+
+
+def _b64encode(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _b64decode(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+# Unsalted SHA-256 hex digests, the format users.csv has always used.
+# Only kept so existing accounts can log in and be upgraded.
+class LegacySha256Hasher:
+    algorithm = "sha256"
+
+    def hash(self, password):
+        return hashlib.sha256(password.encode()).hexdigest()
+
+    def verify(self, password, encoded):
+        return hmac.compare_digest(self.hash(password).encode(), encoded.encode())
+
+    def needs_rehash(self, encoded):
+        return True
+
+
+# Salted PBKDF2-HMAC-SHA256: "pbkdf2_sha256$<iterations>$<salt>$<hash>"
+class Pbkdf2Hasher:
+    algorithm = "pbkdf2_sha256"
+
+    def __init__(self, iterations=600_000):
+        self.iterations = iterations
+
+    def hash(self, password, salt=None):
+        salt = os.urandom(16) if salt is None else salt
+        digest = hashlib.pbkdf2_hmac("sha256", password.encode(), salt, self.iterations)
+        return f"{self.algorithm}${self.iterations}${_b64encode(salt)}${_b64encode(digest)}"
+
+    # Malformed or truncated hashes never match
+    def verify(self, password, encoded):
+        try:
+            _, iterations, salt, digest = encoded.split("$")
+            expected = hashlib.pbkdf2_hmac("sha256", password.encode(), _b64decode(salt), int(iterations))
+            return hmac.compare_digest(expected, _b64decode(digest))
+        except ValueError:
+            return False
+
+    def needs_rehash(self, encoded):
+        return int(encoded.split("$")[1]) != self.iterations
+
+
+# Salted scrypt: "scrypt$<n>$<r>$<p>$<salt>$<hash>"
+class ScryptHasher:
+    algorithm = "scrypt"
+
+    def __init__(self, n=2 ** 14, r=8, p=1):
+        self.n = n
+        self.r = r
+        self.p = p
+
+    def hash(self, password, salt=None):
+        salt = os.urandom(16) if salt is None else salt
+        digest = hashlib.scrypt(password.encode(), salt=salt, n=self.n, r=self.r, p=self.p, maxmem=256 * 1024 * 1024)
+        return f"{self.algorithm}${self.n}${self.r}${self.p}${_b64encode(salt)}${_b64encode(digest)}"
+
+    # Malformed or truncated hashes (and impossible costs) never match
+    def verify(self, password, encoded):
+        try:
+            _, n, r, p, salt, digest = encoded.split("$")
+            expected = hashlib.scrypt(password.encode(), salt=_b64decode(salt), n=int(n), r=int(r), p=int(p),
+                                      maxmem=256 * 1024 * 1024)
+            return hmac.compare_digest(expected, _b64decode(digest))
+        except (ValueError, OverflowError, MemoryError):
+            return False
+
+    def needs_rehash(self, encoded):
+        _, n, r, p, _, _ = encoded.split("$")
+        return (int(n), int(r), int(p)) != (self.n, self.r, self.p)
+
+
+HASHERS = {
+    LegacySha256Hasher.algorithm: LegacySha256Hasher,
+    Pbkdf2Hasher.algorithm: Pbkdf2Hasher,
+    ScryptHasher.algorithm: ScryptHasher,
+}
+
+
+# Build a hasher from a config name like "scrypt" or "pbkdf2_sha256"
+def make_hasher(name, **cost):
+    if name not in HASHERS:
+        raise ValueError(f"Unknown password hasher: {name}")
+    return HASHERS[name](**cost)
+
+
+# The hasher that produced a stored hash (legacy hashes have no "$" prefix),
+# or None if no known hasher did. Empty CSV cells come back as NaN, not "".
+def hasher_for(encoded, current):
+    if not isinstance(encoded, str):
+        return None
+    algorithm = encoded.split("$", 1)[0] if "$" in encoded else LegacySha256Hasher.algorithm
+    if algorithm == current.algorithm:
+        return current
+    hasher = HASHERS.get(algorithm)
+    return None if hasher is None else hasher()
+
+
+# Email-keyed user directory.
+#
+# All users are loaded into a dict once per process and the dict is updated on
+# registration, so lookups never scan users.csv. Each entry is tagged with the
+# storage's "users" version for that email (see storage version()); an entry
+# whose version has moved, because another process changed the account, and
+# an unknown email are both read again from the storage.
+# Successful verifications are remembered (keyed by an HMAC of email and
+# password under a per-process key, never the password itself) so repeat
+# logins skip the expensive KDF. Hashes made with an old algorithm or cost
+# are upgraded on the next successful login. Unknown emails are checked
+# against a throwaway hash, so a failed login takes as long whether or not
+# the account exists.
+class UserDirectory:
+    def __init__(self, storage, hasher, verification_cache_size=10_000):
+        self.storage = storage
+        self.hasher = hasher
+        self.verification_cache_size = verification_cache_size
+        # Tagged with the version of an account nobody has written since the
+        # load; for SQLite that is only true of migrated accounts, so the others
+        # are read once more on first use
+        version = storage.version("users", None)
+        self._users = {email: (stored, version) for email, stored in storage.load_users()}
+        self._verified = OrderedDict()
+        self._cache_key = os.urandom(32)
+        self._dummy_hash = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._users)
+
+    def _stored_hash(self, email):
+        version = self.storage.version("users", email)
+        entry = self._users.get(email)
+        if entry is not None and entry[1] == version:
+            return entry[0]
+        stored = self.storage.get_user_password(email)
+        with self._lock:
+            if stored is None:
+                self._users.pop(email, None)
+            else:
+                self._users[email] = (stored, version)
+        return stored
+
+    def exists(self, email):
+        return self._stored_hash(email) is not None
+
+    def add_user(self, email, password):
+        encoded = self.hasher.hash(password)
+        self.storage.insert_user(email, encoded)
+        with self._lock:
+            self._users.pop(email, None)
+
+    def authenticate(self, email, password):
+        stored = self._stored_hash(email)
+        if stored is None:
+            if self._dummy_hash is None:
+                self._dummy_hash = self.hasher.hash(os.urandom(16).hex())
+            self.hasher.verify(password, self._dummy_hash)
+            return False
+
+        token = hmac.new(self._cache_key, f"{email}\0{password}".encode(), hashlib.sha256).digest()
+        with self._lock:
+            if self._verified.get(email) == (token, stored):
+                self._verified.move_to_end(email)
+                return True
+
+        hasher = hasher_for(stored, self.hasher)
+        if hasher is None or not hasher.verify(password, stored):
+            return False
+
+        if hasher is not self.hasher or hasher.needs_rehash(stored):
+            stored = self.hasher.hash(password)
+            self.storage.update_user_password(email, stored)
+            with self._lock:
+                self._users.pop(email, None)
+        with self._lock:
+            self._verified[email] = (token, stored)
+            self._verified.move_to_end(email)
+            while len(self._verified) > self.verification_cache_size:
+                self._verified.popitem(last=False)
+        return True
+
+
+# Open (or reuse) the user directory for a storage backend
+def open_user_directory(storage, hasher):
+    key = (id(storage), hasher.algorithm, tuple(sorted(vars(hasher).items())))
+    with _directories_lock:
+        directory = _directories.get(key)
+        if directory is None or directory.storage is not storage:
+            directory = UserDirectory(storage, hasher)
+            _directories[key] = directory
+        return directory
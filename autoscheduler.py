@@ -0,0 +1,248 @@
+import heapq
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from records import DAYS_OF_WEEK, format_minutes, typed_todo_frame
+from recurrence import CalendarIndex, weekly_events
+
+# Objective weight of one scheduled minute per Priority value
+PRIORITY_WEIGHTS = {"High": 3, "Medium": 2, "Low": 1}
+
+# Default working hours per weekday, as (start, end) minutes since midnight
+DEFAULT_WORKING_HOURS = {day: [(9 * 60, 18 * 60)] for day in DAYS_OF_WEEK}
+
+# Largest ILP (task x slot variables) the exact mode will try to build
+MAX_ILP_VARIABLES = 200_000
+
+
+# Result of an auto-scheduling run. Todos are keyed by their row in the todo
+# frame, so two todos with the same name are scheduled separately; `tasks`
+# maps each row to its name.
+class AutoSchedule:
+    def __init__(self, blocks, scheduled, needed, weights, method, tasks):
+        # blocks: list of {"Task", "Date", "Day", "Time From", "Time To", "Minutes"}
+        self.blocks = blocks
+        self.tasks = tasks
+        self.scheduled = scheduled
+        self.unscheduled = {row: needed[row] - scheduled.get(row, 0) for row in needed
+                            if needed[row] > scheduled.get(row, 0)}
+        self.objective = sum(weights[row] * minutes for row, minutes in scheduled.items())
+        best = sum(weights[row] * minutes for row, minutes in needed.items())
+        # Fraction of the priority-weighted work that fits before its deadline
+        self.score = self.objective / best if best else 1.0
+        self.method = method
+
+    def to_frame(self):
+        return pd.DataFrame(self.blocks, columns=["Task", "Date", "Day", "Time From", "Time To", "Minutes"])
+
+
+# Free working slots from start until the horizon, skipping busy calendar time.
+# Returns (slot dates, slot start minutes, index of each day's first slot).
+def _free_slots(calendar, start, horizon, working_hours, slot_minutes):
+    # Candidate slot starts per weekday are computed once
+    weekday_slots = []
+    for day in DAYS_OF_WEEK:
+        starts = set()
+        for window_start, window_end in working_hours.get(day, []):
+            first = -(-window_start // slot_minutes) * slot_minutes
+            starts.update(range(first, window_end - slot_minutes + 1, slot_minutes))
+        weekday_slots.append(sorted(starts))
+
+    dates, minutes, day_first = [], [], {}
+    date = start.date()
+    now_minute = start.hour * 60 + start.minute
+    while date < horizon:
+        day_first[date] = len(dates)
+        day_index = calendar.day(date)
+        for minute in weekday_slots[date.weekday()]:
+            if date == start.date() and minute < now_minute:
+                continue
+            if not day_index.overlaps(minute, minute + slot_minutes):
+                dates.append(date)
+                minutes.append(minute)
+        date += timedelta(days=1)
+    return dates, minutes, day_first
+
+
+# Weighted job sequencing: highest weight first, each unit in the latest free
+# slot before its deadline. For unit slots with deadlines this is exact, and
+# the per-day cap only ever makes it skip a day.
+def _select_latest_fit(units, last_slot, weights, slot_day, day_first, cap_units):
+    parent = list(range(len(slot_day) + 1))
+
+    # Latest free slot position <= x (positions are slot index + 1; 0 means none)
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    placement = {}
+    for task in sorted(units, key=lambda t: (-weights[t], last_slot[t])):
+        need = units[task]
+        per_day = {}
+        pos = find(last_slot[task] + 1)
+        while need and pos:
+            slot = pos - 1
+            day = slot_day[slot]
+            if cap_units is not None and per_day.get(day, 0) >= cap_units:
+                pos = find(day_first[day])
+                continue
+            placement[slot] = task
+            parent[pos] = pos - 1
+            per_day[day] = per_day.get(day, 0) + 1
+            need -= 1
+            pos = find(pos - 1)
+    return placement
+
+
+# Re-lay the selected units earliest-deadline-first so work happens as early as
+# possible. Returns None if the per-day cap makes that layout fall short.
+def _layout_edf(placement, last_slot, weights, slot_day, cap_units):
+    remaining = {}
+    for task in placement.values():
+        remaining[task] = remaining.get(task, 0) + 1
+    heap = [(last_slot[task], -weights[task], task) for task in remaining]
+    heapq.heapify(heap)
+
+    layout = {}
+    per_day = {}
+    for slot in range(len(slot_day)):
+        if not heap:
+            break
+        skipped = []
+        while heap:
+            deadline, weight, task = heapq.heappop(heap)
+            if deadline < slot:
+                return None
+            if cap_units is not None and per_day.get((task, slot_day[slot]), 0) >= cap_units:
+                skipped.append((deadline, weight, task))
+                continue
+            layout[slot] = task
+            per_day[(task, slot_day[slot])] = per_day.get((task, slot_day[slot]), 0) + 1
+            remaining[task] -= 1
+            if remaining[task]:
+                heapq.heappush(heap, (deadline, weight, task))
+            break
+        for entry in skipped:
+            heapq.heappush(heap, entry)
+    return layout if not heap else None
+
+
+# Exact 0/1 model solved with PuLP/CBC inside the time budget (optional dependency)
+def _solve_ilp(units, last_slot, weights, slot_day, cap_units, time_budget):
+    try:
+        import pulp
+    except ImportError:
+        return None
+    if sum(last_slot[task] + 1 for task in units) > MAX_ILP_VARIABLES:
+        return None
+
+    model = pulp.LpProblem("auto_schedule", pulp.LpMaximize)
+    names = {task: f"t{i}" for i, task in enumerate(units)}
+    x = {(task, slot): pulp.LpVariable(f"x_{names[task]}_{slot}", cat="Binary")
+         for task in units for slot in range(last_slot[task] + 1)}
+    model += pulp.lpSum(weights[task] * var for (task, _), var in x.items())
+    by_slot, by_task_day = {}, {}
+    for (task, slot), var in x.items():
+        by_slot.setdefault(slot, []).append(var)
+        by_task_day.setdefault((task, slot_day[slot]), []).append(var)
+    for variables in by_slot.values():
+        model += pulp.lpSum(variables) <= 1
+    for task in units:
+        model += pulp.lpSum(x[task, slot] for slot in range(last_slot[task] + 1)) <= units[task]
+    if cap_units is not None:
+        for variables in by_task_day.values():
+            model += pulp.lpSum(variables) <= cap_units
+    model.solve(pulp.PULP_CBC_CMD(msg=False, timeLimit=max(1, int(time_budget))))
+    return {slot: task for (task, slot), var in x.items() if var.value() and var.value() > 0.5}
+
+
+# Pack every pending todo into free working time up to and including its
+# deadline day.
+#
+# Tasks are weighted by Priority; the objective is priority-weighted scheduled
+# minutes and AutoSchedule.score is that as a fraction of the best possible.
+# The greedy pass is exact unless max_minutes_per_day is set; then exact=True
+# also tries an ILP (needs PuLP) for up to time_budget seconds. Busy time comes
+# from `calendar` (a recurrence.CalendarIndex, including dated events) or, if
+# that is not given, from the weekly schedule_df.
+def auto_schedule(todo_df, schedule_df, now=None, working_hours=None, slot_minutes=30,
+                  review_days=0, max_minutes_per_day=None, exact=False, time_budget=5.0, calendar=None):
+    now = datetime.now() if now is None else pd.Timestamp(now).to_pydatetime()
+    working_hours = DEFAULT_WORKING_HOURS if working_hours is None else working_hours
+
+    todo_df = typed_todo_frame(todo_df)
+    pending = todo_df[todo_df["Status"] != "Completed"]
+    tasks, needed, weights, deadlines = {}, {}, {}, {}
+    for row, task, deadline, minutes, priority in zip(pending.index, pending["Task"], pending["Deadline"],
+                                                      pending["Time Needed"], pending["Priority"]):
+        tasks[row] = task
+        needed[row] = int(minutes)
+        weights[row] = PRIORITY_WEIGHTS.get(priority, 1)
+        deadlines[row] = (deadline - timedelta(days=review_days)).date()
+    if not needed:
+        return AutoSchedule([], {}, {}, {}, "greedy", {})
+
+    horizon = max(deadlines.values()) + timedelta(days=1)
+    if calendar is None:
+        calendar = CalendarIndex(weekly_events(schedule_df))
+    slot_dates, slot_minutes_list, day_first = _free_slots(calendar, now, horizon, working_hours, slot_minutes)
+    day_first_by_index = {i: day_first[date] for i, date in enumerate(sorted(day_first))}
+    date_index = {date: i for i, date in enumerate(sorted(day_first))}
+    slot_day = [date_index[date] for date in slot_dates]
+
+    # Last usable slot per task: the last one on its deadline date
+    slot_date_array = np.array(slot_dates, dtype="datetime64[D]")
+    last_slot = {row: int(np.searchsorted(slot_date_array, np.datetime64(deadline, "D"), side="right")) - 1
+                 for row, deadline in deadlines.items()}
+    units = {row: -(-minutes // slot_minutes) for row, minutes in needed.items()}
+    cap_units = None if max_minutes_per_day is None else max(1, max_minutes_per_day // slot_minutes)
+
+    placement = _select_latest_fit(units, last_slot, weights, slot_day, day_first_by_index, cap_units)
+    method = "greedy"
+    if exact and cap_units is not None and len(placement) < sum(units.values()):
+        started = time.perf_counter()
+        solution = _solve_ilp(units, last_slot, weights, slot_day, cap_units, time_budget)
+        if solution is not None and _weight(solution, weights) > _weight(placement, weights):
+            placement = solution
+            method = f"ilp ({time.perf_counter() - started:.1f}s)"
+    placement = _layout_edf(placement, last_slot, weights, slot_day, cap_units) or placement
+
+    return _build_schedule(placement, slot_dates, slot_minutes_list, slot_minutes, needed, weights, method, tasks)
+
+
+def _weight(placement, weights):
+    return sum(weights[task] for task in placement.values())
+
+
+# Merge consecutive slots of the same task into blocks and trim each task's last block
+def _build_schedule(placement, slot_dates, slot_minutes_list, slot_minutes, needed, weights, method, tasks):
+    left = dict(needed)
+    blocks = []
+    for slot in sorted(placement):
+        row = placement[slot]
+        minutes = min(slot_minutes, left[row])
+        if minutes <= 0:
+            continue
+        left[row] -= minutes
+        date, start = slot_dates[slot], slot_minutes_list[slot]
+        last = blocks[-1] if blocks else None
+        if last and last["_row"] == row and last["Date"] == date and last["_end"] == start:
+            last["_end"] = start + minutes
+        else:
+            blocks.append({"Task": tasks[row], "Date": date, "_row": row, "_start": start, "_end": start + minutes})
+
+    for block in blocks:
+        del block["_row"]
+        start, end = block.pop("_start"), block.pop("_end")
+        block["Day"] = DAYS_OF_WEEK[block["Date"].weekday()]
+        block["Time From"] = format_minutes(start)
+        block["Time To"] = format_minutes(end)
+        block["Minutes"] = end - start
+    scheduled = {row: needed[row] - left[row] for row in needed if needed[row] > left[row]}
+    return AutoSchedule(blocks, scheduled, needed, weights, method, tasks)
+
@@ -0,0 +1,354 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+# User counts for the standard scales
+SCALES = {"1k": 1_000, "10k": 10_000, "100k": 100_000}
+
+# Synthetic rows per user
+TODOS_PER_USER = 5
+SCHEDULE_PER_USER = 8
+
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Members per group in the group availability benchmark
+GROUP_SIZE = 200
+
+# Cold import of the app (streamlit itself excluded) must stay under this
+IMPORT_BUDGET_MS = 1000
+
+# Modules that must not be loaded until a page or call needs them
+DEFERRED_MODULES = ("matplotlib", "smtplib", "email.mime", "pulp", "service")
+
+# Run in a fresh interpreter: a bare streamlit stand-in, then the app module
+IMPORT_PROBE = ("import sys, types; st = types.ModuleType('streamlit'); "
+                "st.__getattr__ = lambda name: lambda *args, **kwargs: None; "
+                "sys.modules['streamlit'] = st; import schedule_app")
+
+# Run in a fresh interpreter: draw every chart kind, then report whether that
+# pulled in pyplot (which registers global figures and is slow to import)
+RENDER_PROBE = ("import sys, pandas as pd, charts; "
+                "samples = {'status': pd.Series([3, 1], index=['Pending', 'Completed']), "
+                "'weekly_working_time': pd.Series([1.5, 4.0], index=['Monday', 'Friday']), "
+                "'completion_trend': pd.DataFrame({'Tasks': [4, 2], 'Completed': [1, 2]}, "
+                "index=['2026-10-12', '2026-10-19'])}; "
+                "assert set(samples) == set(charts.CHARTS); "
+                "[charts.render_png(kind, data) for kind, data in samples.items()]; "
+                "print('matplotlib.pyplot' in sys.modules)")
+
+
+# Minimal stand-in for streamlit so the app's functions run headless:
+# every UI call is a no-op, buttons are never pressed and selectboxes pick
+# their first option.
+def install_streamlit_stub():
+    stub = types.ModuleType("streamlit")
+
+    def noop(*args, **kwargs):
+        return None
+
+    def selectbox(label, options, *args, **kwargs):
+        options = list(options)
+        return options[0] if options else None
+
+    def slider(label, min_value=None, max_value=None, value=None, *args, **kwargs):
+        return value
+
+    stub.__getattr__ = lambda name: noop
+    stub.button = lambda *args, **kwargs: False
+    stub.checkbox = lambda *args, **kwargs: False
+    stub.selectbox = selectbox
+    stub.slider = slider
+    stub.session_state = {}
+    stub.sidebar = stub
+    sys.modules["streamlit"] = stub
+    return stub
+
+
+def email_for(i):
+    return f"user{i}@example.com"
+
+
+def password_for(i):
+    return f"password{i}"
+
+
+# Write users.csv, todo_tasks.csv and schedule_tasks.csv for n users into directory
+def generate_data(directory, n_users, seed=0):
+    import hashlib
+
+    rng = np.random.default_rng(seed)
+    emails = np.array([email_for(i) for i in range(n_users)], dtype=object)
+    pd.DataFrame({
+        "Email": emails,
+        "Password": [hashlib.sha256(password_for(i).encode()).hexdigest() for i in range(n_users)],
+    }).to_csv(os.path.join(directory, "users.csv"), index=False)
+
+    n_todos = n_users * TODOS_PER_USER
+    today = date.today()
+    deadlines = [str(today + timedelta(days=int(d))) for d in rng.integers(1, 60, n_todos)]
+    pd.DataFrame({
+        "Email": np.repeat(emails, TODOS_PER_USER),
+        "Task": [f"task {i % TODOS_PER_USER}" for i in range(n_todos)],
+        "Deadline": deadlines,
+        "Status": rng.choice(["Pending", "In Progress", "Completed"], n_todos),
+        "Time Needed": rng.integers(1, 20, n_todos) * 30,
+        "Priority": rng.choice(["High", "Medium", "Low"], n_todos),
+        "Reminder": rng.choice([True, False], n_todos),
+    }).to_csv(os.path.join(directory, "todo_tasks.csv"), index=False)
+
+    # Non-overlapping hour-long entries: slot k of a user's schedule is on
+    # weekday k % 7 starting at 8 AM + 2h * (k // 7)
+    n_schedule = n_users * SCHEDULE_PER_USER
+    slot = np.tile(np.arange(SCHEDULE_PER_USER), n_users)
+    start_hour = 8 + 2 * (slot // 7)
+    pd.DataFrame({
+        "Email": np.repeat(emails, SCHEDULE_PER_USER),
+        "Task": [f"event {k}" for k in slot],
+        "Day": np.array(DAYS_OF_WEEK, dtype=object)[slot % 7],
+        "Time From": [_format_hour(h) for h in start_hour],
+        "Time To": [_format_hour(h + 1) for h in start_hour],
+    }).to_csv(os.path.join(directory, "schedule_tasks.csv"), index=False)
+    pd.DataFrame(columns=["Email", "VerificationCode", "Timestamp"]).to_csv(
+        os.path.join(directory, "verification_codes.csv"), index=False)
+    return n_todos, n_schedule
+
+
+def _format_hour(hour):
+    return f"{(hour % 12) or 12:02d}:00 {'AM' if hour < 12 else 'PM'}"
+
+
+# Benchmarked operations: name -> function(app, rng, n_users) doing one call
+def _operations():
+    counter = {"todo": 0}
+
+    def save_todo_task(app, rng, n_users):
+        counter["todo"] += 1
+        app.save_todo_task(email_for(rng.randrange(n_users)), f"bench {counter['todo']}",
+                           date.today() + timedelta(days=7), "Pending", 60, "Medium", False)
+
+    def visualize_weekly_working_time(app, rng, n_users):
+        app.visualize_weekly_working_time(app.load_user_stats(email_for(rng.randrange(n_users))).weekday_hours())
+
+    return {
+        "validate_user": lambda app, rng, n: app.validate_user(email_for(i := rng.randrange(n)), password_for(i)),
+        "load_todo_tasks": lambda app, rng, n: app.load_todo_tasks(email_for(rng.randrange(n))),
+        "save_todo_task": save_todo_task,
+        "update_task": lambda app, rng, n: app.update_task(email_for(rng.randrange(n)), "task 1", "In Progress", 90),
+        "check_overlap": lambda app, rng, n: app.check_overlap(
+            email_for(rng.randrange(n)), rng.choice(DAYS_OF_WEEK), "08:30 AM", "09:30 AM"),
+        "find_free_time_slots": lambda app, rng, n: app.find_free_time_slots(
+            None, 60, email_for(rng.randrange(n)), rng.choice(DAYS_OF_WEEK)),
+        "find_free_time": lambda app, rng, n: app.find_free_time(
+            email_for(rng.randrange(n)), datetime.now(), datetime.now() + timedelta(days=14), 60, (9, 18)),
+        "find_group_free_time": lambda app, rng, n: app.find_group_free_time(
+            [email_for(i) for i in rng.sample(range(n), min(GROUP_SIZE, n))],
+            datetime.now(), datetime.now() + timedelta(days=7), 60, (9, 18)),
+        "add_todo_tasks_to_schedule": lambda app, rng, n: app.add_todo_tasks_to_schedule(email_for(rng.randrange(n))),
+        "visualize_weekly_working_time": visualize_weekly_working_time,
+    }
+
+
+def _clear_caches():
+    from cache import suggestion_cache, task_cache
+    from charts import chart_renderer
+    from intervals import interval_indexes
+    from recurrence import calendar_indexes
+    task_cache.clear()
+    suggestion_cache.clear()
+    interval_indexes.clear()
+    calendar_indexes.clear()
+    chart_renderer.clear()
+
+
+# Time each operation; returns {name: {p50_ms, p95_ms, p99_ms, mean_ms, iterations, peak_memory_kb}}
+def run_operations(app, n_users, iterations, cold=False, only=None, seed=0):
+    rng = random.Random(seed)
+    results = {}
+    for name, operation in _operations().items():
+        if only and name not in only:
+            continue
+        operation(app, rng, n_users)  # warm-up (imports, first connection)
+        timings = []
+        for _ in range(iterations):
+            if cold:
+                _clear_caches()
+            started = time.perf_counter()
+            operation(app, rng, n_users)
+            timings.append((time.perf_counter() - started) * 1000)
+
+        # Peak memory is measured on a separate call so tracing does not skew timings
+        if cold:
+            _clear_caches()
+        tracemalloc.start()
+        operation(app, rng, n_users)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+        results[name] = {
+            "p50_ms": round(float(p50), 3),
+            "p95_ms": round(float(p95), 3),
+            "p99_ms": round(float(p99), 3),
+            "mean_ms": round(float(np.mean(timings)), 3),
+            "iterations": iterations,
+            "peak_memory_kb": round(peak / 1024, 1),
+        }
+    return results
+
+
+# Generate data for one scale in a scratch directory and benchmark the app against it
+def run_scale(label, n_users, backend, iterations, cold, only):
+    original_directory = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix=f"schedule-bench-{label}-") as directory:
+        started = time.perf_counter()
+        n_todos, n_schedule = generate_data(directory, n_users)
+        generate_seconds = time.perf_counter() - started
+
+        os.chdir(directory)
+        try:
+            os.environ["SCHEDULE_APP_STORAGE"] = backend
+            os.environ["SCHEDULE_APP_DATABASE"] = os.path.join(directory, "schedule_app.db")
+            for module in ("storage", "cache", "intervals", "recurrence", "charts", "core", "schedule_app"):
+                if module in sys.modules:
+                    importlib.reload(sys.modules[module])
+            import schedule_app as app
+
+            started = time.perf_counter()
+            app.get_storage()
+            open_seconds = time.perf_counter() - started
+
+            results = run_operations(app, n_users, iterations, cold, only)
+        finally:
+            os.chdir(original_directory)
+
+    return {
+        "users": n_users,
+        "todo_rows": n_todos,
+        "schedule_rows": n_schedule,
+        "generate_seconds": round(generate_seconds, 3),
+        "storage_open_seconds": round(open_seconds, 3),
+        "operations": results,
+    }
+
+
+# Cold-import the app in fresh interpreters under -X importtime and check the
+# fastest run against the budget and the deferred-module list
+def check_imports(budget_ms=IMPORT_BUDGET_MS, runs=5):
+    best = None
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-X", "importtime", "-c", IMPORT_PROBE], capture_output=True,
+                                text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        modules = {}
+        for line in result.stderr.splitlines():
+            if not line.startswith("import time:") or "[us]" in line:
+                continue
+            self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+            modules[name.strip()] = (int(self_us), int(cumulative_us))
+        if best is None or modules["schedule_app"][1] < best["schedule_app"][1]:
+            best = modules
+
+    import_ms = best["schedule_app"][1] / 1000
+    loaded = [deferred for deferred in DEFERRED_MODULES
+              if any(name == deferred or name.startswith(deferred + ".") for name in best)]
+    slowest = sorted(best.items(), key=lambda item: -item[1][0])[:10]
+    pyplot_loaded = check_chart_rendering()
+    return {
+        "import_ms": round(import_ms, 1),
+        "budget_ms": budget_ms,
+        "deferred_loaded": loaded,
+        "charts_load_pyplot": pyplot_loaded,
+        "slowest_self_ms": {name: round(self_us / 1000, 1) for name, (self_us, _) in slowest},
+        "ok": import_ms <= budget_ms and not loaded and not pyplot_loaded,
+    }
+
+
+# Whether rendering the charts imports matplotlib.pyplot (it must not)
+def check_chart_rendering():
+    result = subprocess.run([sys.executable, "-c", RENDER_PROBE], capture_output=True, text=True, check=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__)))
+    return result.stdout.strip() == "True"
+
+
+# Compare against a previous report; returns a list of regressions over the threshold
+def compare(report, baseline, threshold):
+    regressions = []
+    for label, scale in report["scales"].items():
+        for name, current in scale["operations"].items():
+            previous = baseline.get("scales", {}).get(label, {}).get("operations", {}).get(name)
+            if previous and previous["p95_ms"] > 0 and current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+                regressions.append({"scale": label, "operation": name,
+                                    "baseline_p95_ms": previous["p95_ms"], "p95_ms": current["p95_ms"]})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Schedule App data and scheduling functions.")
+    parser.add_argument("--scales", default="1k,10k", help=f"comma-separated subset of {','.join(SCALES)}")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "partitioned", "csv"])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--cold", action="store_true", help="clear the in-process caches before every call")
+    parser.add_argument("--only", help="comma-separated operation names to run")
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    parser.add_argument("--baseline", help="previous JSON report to compare p95 latencies against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p95 slowdown vs. baseline (0.2 = 20%%)")
+    parser.add_argument("--import-budget", type=float, default=IMPORT_BUDGET_MS, help="cold import budget in ms")
+    parser.add_argument("--imports-only", action="store_true", help="only run the cold import check")
+    args = parser.parse_args()
+
+    imports = check_imports(args.import_budget)
+    if args.imports_only:
+        print(json.dumps(imports, indent=2))
+        sys.exit(0 if imports["ok"] else 1)
+
+    install_streamlit_stub()
+    import matplotlib
+    matplotlib.use("Agg")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    only = set(args.only.split(",")) if args.only else None
+    report = {
+        "meta": {
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "backend": args.backend,
+            "iterations": args.iterations,
+            "cold": args.cold,
+        },
+        "imports": imports,
+        "scales": {},
+    }
+    for label in args.scales.split(","):
+        report["scales"][label] = run_scale(label, SCALES[label], args.backend, args.iterations, args.cold, only)
+
+    exit_code = 0 if imports["ok"] else 1
+    if args.baseline:
+        with open(args.baseline) as handle:
+            report["regressions"] = compare(report, json.load(handle), args.threshold)
+        exit_code = 1 if report["regressions"] else exit_code
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,365 @@
+import csv
+import io
+import re
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from intervals import split_overnight
+from records import DAYS_OF_WEEK, PRIORITIES, STATUSES, format_minutes
+from storage import SCHEDULE_COLUMNS, TODO_COLUMNS
+
+# Defaults for optional columns of an imported todo
+TODO_DEFAULTS = {"Status": "Pending", "Time Needed": 60, "Priority": "Medium", "Reminder": False}
+
+# iCalendar <-> app vocabularies
+ICAL_STATUSES = {"NEEDS-ACTION": "Pending", "IN-PROCESS": "In Progress", "COMPLETED": "Completed"}
+STATUS_ICAL = {status: name for name, status in ICAL_STATUSES.items()}
+PRIORITY_ICAL = {"High": 1, "Medium": 5, "Low": 9}
+
+_DURATION = re.compile(r"P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+# Raised when an import has invalid rows or overlapping times; nothing is written
+class BulkImportError(ValueError):
+    def __init__(self, problems):
+        super().__init__(f"{len(problems)} problem(s) in import: " + "; ".join(problems[:5]))
+        self.problems = problems
+
+
+# Reading
+
+# Read an uploaded/opened file or a path: ".ics" files (or content starting
+# with BEGIN:VCALENDAR) as iCalendar, anything else as CSV. Returns
+# (kind of content, text) where kind is "ics" or "csv".
+def _read_source(source):
+    name = getattr(source, "name", source if isinstance(source, str) else "")
+    if hasattr(source, "read"):
+        text = source.read()
+    else:
+        with open(source, newline="") as handle:
+            text = handle.read()
+    if isinstance(text, bytes):
+        try:
+            text = text.decode("utf-8-sig")
+        except UnicodeDecodeError as error:
+            raise BulkImportError([f"file is not UTF-8 text: {error}"]) from None
+    is_ics = str(name).lower().endswith(".ics") or text.lstrip().upper().startswith("BEGIN:VCALENDAR")
+    return ("ics" if is_ics else "csv"), text
+
+
+# Components of an iCalendar text as (type, {property: (params, value)}).
+# Folded lines are joined; nested components (VALARM) are reported on their parent as a flag.
+def parse_ics(text):
+    lines = []
+    for line in text.splitlines():
+        if line[:1] in (" ", "\t") and lines:
+            lines[-1] += line[1:]
+        elif line:
+            lines.append(line)
+
+    components, stack = [], []
+    for line in lines:
+        name, _, value = line.partition(":")
+        name, *params = name.split(";")
+        name = name.upper()
+        if name == "BEGIN":
+            stack.append((value.upper(), {}))
+        elif name == "END" and stack:
+            kind, properties = stack.pop()
+            if stack and stack[-1][0] != "VCALENDAR":
+                stack[-1][1]["HAS-" + kind] = ((), "1")
+            elif kind != "VCALENDAR":
+                components.append((kind, properties))
+        elif stack:
+            stack[-1][1].setdefault(name, (tuple(params), _unescape(value)))
+    return components
+
+
+def _unescape(value):
+    return value.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+
+# A CSV upload as a frame; unreadable files are reported like invalid rows
+def _read_csv(text):
+    try:
+        return pd.read_csv(io.StringIO(text))
+    except (pd.errors.ParserError, pd.errors.EmptyDataError) as error:
+        raise BulkImportError([f"could not read CSV: {error}"]) from None
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+
+# iCalendar DATE or DATE-TIME value (time zones are read as local wall time)
+def _ical_datetime(value):
+    value = value.rstrip("Z")
+    return datetime.strptime(value, "%Y%m%dT%H%M%S") if "T" in value else datetime.strptime(value, "%Y%m%d")
+
+
+# iCalendar DURATION ("PT1H30M") in minutes
+def _ical_minutes(value):
+    match = _DURATION.match(value.lstrip("+"))
+    if not match:
+        raise ValueError(f"bad duration {value!r}")
+    weeks, days, hours, minutes, seconds = (int(part or 0) for part in match.groups())
+    return ((weeks * 7 + days) * 24 + hours) * 60 + minutes + seconds // 60
+
+
+def _ical_priority(value):
+    value = int(value)
+    return "Medium" if value in (0, 5) else "High" if value < 5 else "Low"
+
+
+# Todos from a frame, a CSV file or an iCalendar file (VTODO components).
+# Raises BulkImportError listing every file or component that cannot be read.
+def read_todo_tasks(source):
+    if isinstance(source, pd.DataFrame):
+        return source
+    kind, text = _read_source(source)
+    if kind == "csv":
+        return _read_csv(text)
+    rows, problems = [], []
+    todos = [properties for component, properties in parse_ics(text) if component == "VTODO"]
+    for number, properties in enumerate(todos, start=1):
+        get = lambda name: properties.get(name, ((), None))[1]
+        duration = get("ESTIMATED-DURATION") or get("DURATION")
+        due = get("DUE")
+        try:
+            rows.append({
+                "Task": get("SUMMARY"),
+                "Deadline": _ical_datetime(due).date() if due else None,
+                "Status": ICAL_STATUSES.get((get("STATUS") or "").upper(), TODO_DEFAULTS["Status"]),
+                "Time Needed": _ical_minutes(duration) if duration else TODO_DEFAULTS["Time Needed"],
+                "Priority": _ical_priority(get("PRIORITY")) if get("PRIORITY") else TODO_DEFAULTS["Priority"],
+                "Reminder": get("HAS-VALARM") is not None,
+            })
+        except ValueError as error:
+            problems.append(f"todo {number}: {error}")
+    if problems:
+        raise BulkImportError(problems)
+    return pd.DataFrame(rows, columns=["Task", "Deadline", "Status", "Time Needed", "Priority", "Reminder"])
+
+
+# Schedule entries from a frame, a CSV file or an iCalendar file. The schedule
+# is weekly, so each VEVENT becomes an entry on its start date's weekday; an
+# event must end after it starts and within a day (all-day events, and events
+# with neither DTEND nor DURATION, cannot be weekly slots). Raises
+# BulkImportError listing every file or component that cannot be read.
+def read_schedule_tasks(source):
+    if isinstance(source, pd.DataFrame):
+        return source
+    kind, text = _read_source(source)
+    if kind == "csv":
+        return _read_csv(text)
+    rows, problems = [], []
+    events = [properties for component, properties in parse_ics(text)
+              if component == "VEVENT" and "DTSTART" in properties]
+    for number, properties in enumerate(events, start=1):
+        try:
+            start = _ical_datetime(properties["DTSTART"][1])
+            if "DTEND" in properties:
+                end = _ical_datetime(properties["DTEND"][1])
+            else:
+                end = start + timedelta(minutes=_ical_minutes(properties.get("DURATION", ((), "PT0M"))[1]))
+            if end <= start:
+                raise ValueError("does not end after it starts")
+            if end - start >= timedelta(days=1):
+                raise ValueError("lasts a day or more")
+            rows.append({
+                "Task": properties.get("SUMMARY", ((), ""))[1],
+                "Day": DAYS_OF_WEEK[start.weekday()],
+                "Time From": format_minutes(start.hour * 60 + start.minute),
+                "Time To": format_minutes(end.hour * 60 + end.minute),
+            })
+        except ValueError as error:
+            problems.append(f"event {number}: {error}")
+    if problems:
+        raise BulkImportError(problems)
+    return pd.DataFrame(rows, columns=["Task", "Day", "Time From", "Time To"])
+
+
+# Validation
+
+# "05:30 PM", "5:30 pm" or "17:30" -> minutes since midnight
+def _time_minutes(value):
+    text = str(value).strip().upper()
+    for layout in ("%I:%M %p", "%I:%M%p", "%H:%M", "%H:%M:%S"):
+        try:
+            parsed = datetime.strptime(text, layout)
+            return parsed.hour * 60 + parsed.minute
+        except ValueError:
+            continue
+    raise ValueError(f"bad time {value!r}")
+
+
+def _present(value):
+    return value is not None and not (isinstance(value, float) and pd.isna(value)) and str(value).strip() != ""
+
+
+# Check and normalise imported todos for email; returns the rows to insert
+def validate_todo_rows(email, todo_df):
+    rows, problems = [], []
+    for number, record in enumerate(todo_df.to_dict("records"), start=1):
+        record = {**TODO_DEFAULTS, **{key: value for key, value in record.items() if _present(value)}}
+        try:
+            if not _present(record.get("Task")):
+                raise ValueError("missing Task")
+            if not _present(record.get("Deadline")):
+                raise ValueError("missing Deadline")
+            if record["Status"] not in STATUSES:
+                raise ValueError(f"unknown Status {record['Status']!r}")
+            if record["Priority"] not in PRIORITIES:
+                raise ValueError(f"unknown Priority {record['Priority']!r}")
+            time_needed = int(record["Time Needed"])
+            if time_needed <= 0:
+                raise ValueError("Time Needed must be positive")
+            rows.append({
+                "Email": email,
+                "Task": str(record["Task"]).strip(),
+                "Deadline": pd.Timestamp(record["Deadline"]).date(),
+                "Status": record["Status"],
+                "Time Needed": time_needed,
+                "Priority": record["Priority"],
+                "Reminder": str(record["Reminder"]).strip().lower() in ("true", "1", "yes"),
+            })
+        except (ValueError, TypeError) as error:
+            problems.append(f"row {number}: {error}")
+    if problems:
+        raise BulkImportError(problems)
+    return rows
+
+
+# Check and normalise imported schedule entries for email; returns the rows to insert
+def validate_schedule_rows(email, schedule_df):
+    rows, problems = [], []
+    for number, record in enumerate(schedule_df.to_dict("records"), start=1):
+        try:
+            if not _present(record.get("Task")):
+                raise ValueError("missing Task")
+            day = str(record.get("Day", "")).strip().capitalize()
+            if day not in DAYS_OF_WEEK:
+                raise ValueError(f"unknown Day {record.get('Day')!r}")
+            rows.append({
+                "Email": email,
+                "Task": str(record["Task"]).strip(),
+                "Day": day,
+                "Time From": format_minutes(_time_minutes(record.get("Time From"))),
+                "Time To": format_minutes(_time_minutes(record.get("Time To"))),
+            })
+        except (ValueError, TypeError) as error:
+            problems.append(f"row {number}: {error}")
+    if problems:
+        raise BulkImportError(problems)
+    return rows
+
+
+# Overlaps between new (day, start, end, task) intervals and each other or the
+# existing ones, found in one sweep over everything sorted by (day, start).
+# Overnight intervals are split at midnight first, as DayIntervalIndex does.
+# Returns [(new task, other task, day)]; empty means the batch fits.
+def find_batch_overlaps(existing, new):
+    events = sorted([(piece_day, piece_start, piece_end, task, is_new)
+                     for entries, is_new in ((existing, False), (new, True))
+                     for day, start, end, task in entries
+                     for piece_day, piece_start, piece_end in split_overnight(day, int(start), int(end))
+                     if piece_end > piece_start],
+                    key=lambda event: event[:3])
+    conflicts = []
+    current_day, latest = None, None
+    for day, start, end, task, is_new in events:
+        if day != current_day:
+            current_day, latest = day, None
+        elif start < latest[2]:
+            # The interval reaching furthest so far is still running at this start
+            if is_new:
+                conflicts.append((task, latest[3], day))
+            elif latest[4]:
+                conflicts.append((latest[3], task, day))
+        if latest is None or end > latest[2]:
+            latest = (day, start, end, task, is_new)
+    return conflicts
+
+
+# Exporting
+
+# CSV text chunk by chunk, so large accounts never build one big string
+def export_csv(chunks, columns):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerow(columns)
+    yield buffer.getvalue()
+    for chunk in chunks:
+        yield chunk.to_csv(index=False, header=False, columns=columns)
+
+
+# iCalendar text chunk by chunk: todos as VTODO, schedule entries as weekly VEVENTs
+def export_ics(chunks, kind, today=None):
+    today = date.today() if today is None else today
+    stamp = datetime.now().strftime("%Y%m%dT%H%M%S")
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//Schedule App//EN\r\n"
+    number = 0
+    for chunk in chunks:
+        lines = []
+        for record in chunk.to_dict("records"):
+            number += 1
+            uid = f"UID:{kind}-{number}-{stamp}@schedule-app"
+            if kind == "todo":
+                lines += ["BEGIN:VTODO", uid, f"DTSTAMP:{stamp}", f"SUMMARY:{_escape(record['Task'])}",
+                          f"DUE;VALUE=DATE:{pd.Timestamp(record['Deadline']):%Y%m%d}",
+                          f"STATUS:{STATUS_ICAL.get(record['Status'], 'NEEDS-ACTION')}",
+                          f"PRIORITY:{PRIORITY_ICAL.get(record['Priority'], 0)}",
+                          f"ESTIMATED-DURATION:PT{int(record['Time Needed'])}M"]
+                if str(record["Reminder"]).lower() in ("true", "1"):
+                    lines += ["BEGIN:VALARM", "ACTION:DISPLAY", f"DESCRIPTION:{_escape(record['Task'])}",
+                              "TRIGGER:-P1D", "END:VALARM"]
+                lines.append("END:VTODO")
+            else:
+                # First occurrence of the weekday from today, repeating weekly
+                first = today + timedelta(days=(DAYS_OF_WEEK.index(record["Day"]) - today.weekday()) % 7)
+                start = datetime.combine(first, datetime.min.time()) + timedelta(minutes=_time_minutes(record["Time From"]))
+                end = datetime.combine(first, datetime.min.time()) + timedelta(minutes=_time_minutes(record["Time To"]))
+                if end <= start:
+                    end += timedelta(days=1)
+                lines += ["BEGIN:VEVENT", uid, f"DTSTAMP:{stamp}", f"SUMMARY:{_escape(record['Task'])}",
+                          f"DTSTART:{start:%Y%m%dT%H%M%S}", f"DTEND:{end:%Y%m%dT%H%M%S}", "RRULE:FREQ=WEEKLY",
+                          "END:VEVENT"]
+        yield "".join(line + "\r\n" for line in lines)
+    yield "END:VCALENDAR\r\n"
+
+
+# Streaming export of one user's "todo" or "schedule" rows as "csv" or "ics"
+def export_tasks(storage, kind, email, file_format="csv", chunk_size=1000):
+    chunks = storage.iter_todo_tasks(email, chunk_size) if kind == "todo" else storage.iter_schedule_tasks(email, chunk_size)
+    if file_format == "ics":
+        return export_ics(chunks, kind)
+    return export_csv(chunks, TODO_COLUMNS if kind == "todo" else SCHEDULE_COLUMNS)
+
+
+# Command line entry point: import or export one user's tasks
+def main():
+    import argparse
+    import sys
+    import core
+
+    parser = argparse.ArgumentParser(description="Import or export Schedule App tasks in bulk.")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("kind", choices=["todo", "schedule"])
+    parser.add_argument("--email", required=True)
+    parser.add_argument("--file", help="file to import (.csv or .ics)")
+    parser.add_argument("--format", default="csv", choices=["csv", "ics"], help="export format")
+    args = parser.parse_args()
+
+    if args.action == "export":
+        for text in export_tasks(core.get_storage(), args.kind, args.email, args.format):
+            sys.stdout.write(text)
+        return
+    save = core.save_todo_tasks_bulk if args.kind == "todo" else core.save_schedule_tasks_bulk
+    try:
+        print(f"Imported {save(args.email, args.file)} {args.kind} tasks.")
+    except BulkImportError as error:
+        sys.exit("\n".join(error.problems))
+
+
+if __name__ == "__main__":
+    main()
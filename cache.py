@@ -0,0 +1,122 @@
+import threading
+from collections import OrderedDict
+
+from metrics import metrics
+
+
+# Process-wide LRU cache of parsed per-user task frames.
+#
+# Entries are keyed by (kind, email) and tagged with a version made of a
+# local generation counter (bumped by every write from this process) and the
+# storage backend's own change token (file mtime/size or SQLite generation),
+# so writes from other processes are picked up too. Callers get a copy of
+# the cached frame and may modify it freely.
+class FrameCache:
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # The full version a cached frame is tagged with, for keying results derived from it
+    def version(self, key, storage_version):
+        with self._lock:
+            return self._generations.get(key, 0), storage_version
+
+    def get(self, key, storage_version, loader):
+        with self._lock:
+            version = (self._generations.get(key, 0), storage_version)
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return entry[1].copy()
+            self.misses += 1
+
+        frame = loader()
+        with self._lock:
+            # Only store the result if no write happened while we were loading
+            if self._generations.get(key, 0) == version[0]:
+                self._entries[key] = (version, frame)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return frame.copy()
+
+    # Drop a cached frame after a write and make any in-flight load stale
+    def invalidate(self, key):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            for key in self._entries:
+                self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Process-wide LRU cache of results computed from a user's data, such as
+# schedule suggestions.
+#
+# Each user holds one entry tagged with a key built from the versions of the
+# inputs it was computed from (see FrameCache.version), so a lookup with
+# unchanged inputs is a dictionary hit however often the page reruns, and any
+# write to the inputs recomputes. Results are shared between callers and must not be modified.
+class ResultCache:
+    def __init__(self, max_users=1024):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, email, key, compute):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                self._entries.move_to_end(email)
+                return entry[1]
+            self.misses += 1
+
+        result = compute()
+        with self._lock:
+            self._entries[email] = (key, result)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+# Shared by every Streamlit session in this process
+task_cache = FrameCache()
+suggestion_cache = ResultCache()
+metrics.add_collector("task_cache", task_cache.stats)
+metrics.add_collector("suggestion_cache", suggestion_cache.stats)
@@ -0,0 +1,133 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from metrics import metrics, timed
+
+
+# Drawing functions per chart kind: draw(ax, data) for a pandas Series/DataFrame
+def _draw_status(ax, status_counts):
+    ax.pie(status_counts, labels=status_counts.index, autopct='%1.1f%%', startangle=90)
+    ax.axis('equal')
+
+
+# Drawn on the Axes directly: pandas' .plot() would import pyplot
+def _draw_weekly_working_time(ax, working_time_per_day):
+    ax.bar(working_time_per_day.index, working_time_per_day.values, color="blue")
+    ax.set_xlabel("Days of the Week")
+    ax.set_ylabel("Total Working Time (hours)")
+    ax.set_title("Working Time on Each Day of the Week")
+
+
+def _draw_completion_trend(ax, trend):
+    ax.bar(trend.index, trend["Tasks"], color="lightgray", label="Tasks")
+    ax.bar(trend.index, trend["Completed"], color="green", label="Completed")
+    ax.set_xlabel("Deadline week")
+    ax.set_ylabel("Tasks")
+    ax.legend()
+    ax.figure.autofmt_xdate()
+
+
+CHARTS = {
+    "status": _draw_status,
+    "weekly_working_time": _draw_weekly_working_time,
+    "completion_trend": _draw_completion_trend,
+}
+
+
+# Cache key for a chart: its kind plus a hash of the aggregate it shows
+def chart_key(kind, data):
+    return kind, hashlib.sha1(data.to_json().encode()).hexdigest()
+
+
+# Draw one chart to PNG bytes. The figure is created without pyplot, so it is
+# never registered as an open figure, and it is cleared as soon as it is saved.
+# matplotlib is imported on the first render rather than with this module: it
+# is the slowest import in the app and only the Visualizations page needs it.
+@timed()
+def render_png(kind, data, dpi=100):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure()
+    try:
+        FigureCanvasAgg(fig)
+        CHARTS[kind](fig.subplots(), data)
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format="png", dpi=dpi)
+        return buffer.getvalue()
+    finally:
+        fig.clear()
+
+
+# Renders charts to PNG on a worker pool and keeps the images in an LRU cache
+# keyed by chart_key, so a chart whose data has not changed is never drawn
+# again. Concurrent requests for the same chart share one render.
+class ChartRenderer:
+    def __init__(self, max_entries=256, workers=2):
+        self.max_entries = max_entries
+        self._images = OrderedDict()
+        self._pending = {}
+        # Reentrant: a render that finishes during submit() stores itself right away
+        self._lock = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="chart-render")
+        self.hits = 0
+        self.misses = 0
+
+    # Future resolving to the chart's PNG bytes
+    def submit(self, kind, data):
+        key = chart_key(kind, data)
+        with self._lock:
+            if key in self._images:
+                self.hits += 1
+                self._images.move_to_end(key)
+                return _completed(self._images[key])
+            future = self._pending.get(key)
+            if future is None:
+                self.misses += 1
+                future = self._pool.submit(render_png, kind, data.copy())
+                self._pending[key] = future
+                future.add_done_callback(lambda done: self._store(key, done))
+            return future
+
+    def render(self, kind, data):
+        return self.submit(kind, data).result()
+
+    # Start rendering several (kind, data) charts at once
+    def prefetch(self, charts):
+        for kind, data in charts:
+            self.submit(kind, data)
+
+    def _store(self, key, future):
+        with self._lock:
+            self._pending.pop(key, None)
+            if future.exception() is None:
+                self._images[key] = future.result()
+                self._images.move_to_end(key)
+                while len(self._images) > self.max_entries:
+                    self._images.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+
+    def stats(self):
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "images": len(self._images)}
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+
+# An already-finished future, for cache hits
+def _completed(value):
+    future = Future()
+    future.set_result(value)
+    return future
+
+
+# Shared by every Streamlit session in this process
+chart_renderer = ChartRenderer()
+metrics.add_collector("chart_renderer", chart_renderer.stats)
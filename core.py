@@ -0,0 +1,435 @@
+import os
+import random
+from datetime import datetime, timedelta
+
+from auth import make_hasher, open_user_directory
+from autoscheduler import auto_schedule
+from bulk import BulkImportError, find_batch_overlaps, read_schedule_tasks, read_todo_tasks, validate_schedule_rows, validate_todo_rows
+from cache import suggestion_cache, task_cache
+from intervals import DayIntervalIndex, build_day_indexes, interval_indexes, minutes_to_datetime, split_overnight
+from mailer import open_mail_queue
+from metrics import timed
+from planner import plan_suggestions
+from recurrence import (CalendarIndex, Event, RecurrenceRule, calendar_indexes, events_from_frame, shared_free_time,
+                        weekly_event, weekly_events)
+from records import DAYS_OF_WEEK, parse_minutes, typed_schedule_frame, typed_todo_frame
+from storage import StaleVersionError, UserExistsError, open_storage
+from ttl_store import open_verification_codes
+
+# Scheduling core shared by the Streamlit app, the HTTP service and the
+# command line tools. Nothing here talks to a UI: failures are raised as
+# exceptions for the caller to show.
+
+
+# CSV filenames for storing user, todo, and schedule data
+USERS_FILE = "users.csv"
+TODO_FILE = "todo_tasks.csv"
+SCHEDULE_FILE = "schedule_tasks.csv"
+VERIFICATION_CODE_FILE = "verification_codes.csv"
+
+# Storage backend: "sqlite" (indexed, migrated once from the CSV files above),
+# "partitioned" (one CSV file per user under todo_tasks/ and schedule_tasks/) or "csv"
+STORAGE_BACKEND = os.environ.get("SCHEDULE_APP_STORAGE", "sqlite")
+DATABASE_FILE = os.environ.get("SCHEDULE_APP_DATABASE", "schedule_app.db")
+
+# How far ahead a new recurring event is checked for clashes
+EVENT_CONFLICT_HORIZON = timedelta(days=366)
+
+# Attempts at a group booking while members' calendars keep changing under it
+GROUP_BOOKING_ATTEMPTS = 5
+
+# Suggestions are planned from the current time rounded down to this many
+# minutes, so unchanged data gives the same cached plan within each step
+SUGGESTION_STEP_MINUTES = 15
+
+# Users who can see the cross-user admin views
+ADMIN_EMAILS = {email for email in os.environ.get("SCHEDULE_APP_ADMINS", "").split(",") if email}
+
+# Email configuration for the app's email
+APP_EMAIL = "xyz@email.com"  # Use your app-specific email here
+APP_PASSWORD = "xyz"  # Use your app-specific password here (App Password for Gmail)
+SMTP_SERVER = "smtp.gmail.com"
+SMTP_PORT = 587
+SMTP_STARTTLS = True
+
+# Outgoing mail is queued here and sent by a background worker
+MAIL_QUEUE_FILE = os.environ.get("SCHEDULE_APP_MAIL_QUEUE", "mail_queue.db")
+
+# The reminder daemon records the reminders it has sent here
+REMINDER_STATE_FILE = os.environ.get("SCHEDULE_APP_REMINDER_STATE", "reminder_state.db")
+
+# Password hashing: "scrypt" or "pbkdf2_sha256", with optional cost overrides
+# such as {"n": 2 ** 15} for scrypt or {"iterations": 1_000_000} for PBKDF2.
+# Hashes made with another algorithm or cost are upgraded on the next login.
+PASSWORD_HASHER = os.environ.get("SCHEDULE_APP_PASSWORD_HASHER", "scrypt")
+PASSWORD_HASHER_COST = {}
+
+# Get the in-memory user directory (email index, hashing, verification cache)
+def get_user_directory():
+    return open_user_directory(get_storage(), make_hasher(PASSWORD_HASHER, **PASSWORD_HASHER_COST))
+
+# Get the storage backend holding users, codes, todos and schedules
+def get_storage():
+    return open_storage(STORAGE_BACKEND, USERS_FILE, TODO_FILE, SCHEDULE_FILE, VERIFICATION_CODE_FILE, DATABASE_FILE)
+
+# Get the outgoing mail queue; its worker sends over pooled SMTP connections
+def get_mail_queue():
+    return open_mail_queue(MAIL_QUEUE_FILE, APP_EMAIL, SMTP_SERVER, SMTP_PORT, APP_EMAIL, APP_PASSWORD, SMTP_STARTTLS)
+
+# Get the verification code store; codes expire after 5 minutes
+def get_verification_codes():
+    return open_verification_codes(get_storage())
+
+
+# Raised when a registration cannot be completed
+class RegistrationError(ValueError):
+    pass
+
+
+# Raised when a schedule entry overlaps an existing one
+class ScheduleConflictError(ValueError):
+    pass
+
+
+# Queue the verification code email
+@timed()
+def send_verification_code(email, code):
+    text = f"Hi there,\n\nYour verification code is {code}. Please enter this code in the app to complete your registration. The code is valid for 5 minutes."
+    get_mail_queue().enqueue(email, "Your Verification Code", text)
+
+# Generate a code, email it and store it, replacing any earlier one for this email
+def request_verification_code(email):
+    verification_code = str(random.randint(100000, 999999))
+    send_verification_code(email, verification_code)
+    get_verification_codes().set(email, verification_code)
+
+# Register new user after verification; raises RegistrationError on failure
+@timed()
+def register_user(email, password, code_entered):
+    users = get_user_directory()
+
+    # Check if email already exists in users
+    if users.exists(email):
+        raise RegistrationError("User already exists.")
+
+    # Check the code; the store only returns codes still inside their 5-minute window
+    codes = get_verification_codes()
+    saved_code = codes.get(email)
+    if saved_code is None:
+        raise RegistrationError("No valid verification code found for this email. It may have expired; please request a new one.")
+    if saved_code != code_entered.strip():
+        raise RegistrationError("The verification code you entered is incorrect.")
+
+    # Add the user to the user store and remove the used code; another
+    # session may have registered the email since the check above
+    try:
+        users.add_user(email, password)
+    except UserExistsError:
+        raise RegistrationError("User already exists.") from None
+    codes.pop(email)
+    return True
+
+# Validate user credentials during login
+@timed()
+def validate_user(email, password):
+    # Check if the user exists and the password matches
+    return get_user_directory().authenticate(email, password)
+
+# To-Do List Functions
+@timed(rows=len)
+def load_todo_tasks(email=None):
+    storage = get_storage()
+    if email is None:
+        return typed_todo_frame(storage.load_todo_tasks())
+    # Per-user frames are typed once and served from the process-wide cache until they change
+    return task_cache.get(("todo", email), storage.version("todo", email),
+                          lambda: typed_todo_frame(storage.load_todo_tasks(email)))
+
+@timed()
+def save_todo_task(email, task, deadline, status, time_needed, priority, reminder):
+    get_storage().insert_todo_task({"Email": email, "Task": task, "Deadline": deadline,
+                                    "Status": status, "Time Needed": time_needed,
+                                    "Priority": priority, "Reminder": reminder})
+    task_cache.invalidate(("todo", email))
+    task_cache.invalidate(("stats", email))
+
+@timed()
+def update_task(email, task, new_status, new_time_needed=None):
+    changes = {"Status": new_status}
+    if new_time_needed is not None:
+        changes["Time Needed"] = int(new_time_needed)
+    get_storage().update_todo_task(email, task, changes)
+    task_cache.invalidate(("todo", email))
+    task_cache.invalidate(("stats", email))
+
+@timed()
+def delete_todo_task(email, task):
+    get_storage().delete_todo_task(email, task)
+    task_cache.invalidate(("todo", email))
+    task_cache.invalidate(("stats", email))
+
+# Add many todos from a DataFrame or a CSV/iCalendar file in a single write.
+# Raises BulkImportError listing every invalid row; nothing is saved then.
+@timed(rows=lambda added: added)
+def save_todo_tasks_bulk(email, tasks):
+    rows = validate_todo_rows(email, read_todo_tasks(tasks))
+    if rows:
+        get_storage().insert_todo_tasks(rows)
+        task_cache.invalidate(("todo", email))
+        task_cache.invalidate(("stats", email))
+    return len(rows)
+
+# Schedule Functions
+@timed(rows=len)
+def load_schedule_tasks(email=None, day=None):
+    storage = get_storage()
+    if email is None:
+        return typed_schedule_frame(storage.load_schedule_tasks(day=day))
+    schedule_df = task_cache.get(("schedule", email), storage.version("schedule", email),
+                                 lambda: typed_schedule_frame(storage.load_schedule_tasks(email)))
+    if day is not None:
+        schedule_df = schedule_df[schedule_df["Day"] == day]
+    return schedule_df
+
+# Get a user's visualization aggregates (status counts, weekday minutes,
+# completion per deadline week), cached until their todos or schedule change
+@timed()
+def load_user_stats(email):
+    storage = get_storage()
+    return task_cache.get(("stats", email), (storage.version("todo", email), storage.version("schedule", email)),
+                          lambda: storage.user_stats(email))
+
+# Get the cached interval index of a user's tasks for one day
+def get_day_index(email, day):
+    return interval_indexes.get(email, day, get_storage().version("schedule", email),
+                                lambda: load_schedule_tasks(email))
+
+# Check if a task overlaps with an existing task or, in any week of the next
+# year, a dated event. An end before the start means the task runs past
+# midnight into the next day.
+@timed()
+def check_overlap(email, day, time_from, time_to):
+    start, end = parse_minutes(time_from), parse_minutes(time_to)
+    return (any(get_day_index(email, piece_day).overlaps(piece_start, piece_end)
+                for piece_day, piece_start, piece_end in split_overnight(day, start, end))
+            or bool(_event_clashes(email, [(day, start, end, "")])))
+
+# The new weekly (day, start minute, end minute, task) slots that clash with a
+# dated or recurring event in the next year, as [(task, day)]
+def _event_clashes(email, slots):
+    events_df = load_events(email)
+    if events_df.empty:
+        return []
+    calendar = CalendarIndex(events_from_frame(events_df))
+    now = datetime.now()
+    clashes = []
+    for day, start, end, task in slots:
+        event = weekly_event(task, DAYS_OF_WEEK.index(day) if day in DAYS_OF_WEEK else -1, start, end)
+        if event is not None and any(calendar.overlaps(occurrence_start, occurrence_end) for occurrence_start, occurrence_end, _
+                                     in event.occurrences(now, now + EVENT_CONFLICT_HORIZON)):
+            clashes.append((task, day))
+    return clashes
+
+# Raises ScheduleConflictError if the new task overlaps an existing one
+@timed()
+def save_schedule_task(email, task, day, time_from, time_to):
+    if check_overlap(email, day, time_from, time_to):
+        raise ScheduleConflictError(f"Task overlaps with another task on {day}. Please select a different time.")
+    storage = get_storage()
+    old_version = storage.version("schedule", email)
+    storage.insert_schedule_task({"Email": email, "Task": task, "Day": day,
+                                  "Time From": time_from, "Time To": time_to})
+    task_cache.invalidate(("schedule", email))
+    task_cache.invalidate(("stats", email))
+    interval_indexes.add(email, day, parse_minutes(time_from), parse_minutes(time_to), task,
+                         old_version, storage.version("schedule", email))
+
+@timed()
+def delete_schedule_task(email, task, day):
+    storage = get_storage()
+    old_version = storage.version("schedule", email)
+    storage.delete_schedule_task(email, task, day)
+    task_cache.invalidate(("schedule", email))
+    task_cache.invalidate(("stats", email))
+    interval_indexes.remove(email, day, task, old_version, storage.version("schedule", email))
+
+# Add many schedule entries from a DataFrame or a CSV/iCalendar file in a
+# single write. The whole batch is checked for overlaps (with the existing
+# schedule and within itself) in one sorted sweep, and against the dated
+# events; on any problem a BulkImportError is raised and nothing is saved.
+@timed(rows=lambda added: added)
+def save_schedule_tasks_bulk(email, tasks):
+    rows = validate_schedule_rows(email, read_schedule_tasks(tasks))
+    new = [(row["Day"], parse_minutes(row["Time From"]), parse_minutes(row["Time To"]), row["Task"]) for row in rows]
+    existing = load_schedule_tasks(email)
+    conflicts = [f"'{task}' overlaps '{other}' on {day}" for task, other, day in
+                 find_batch_overlaps(zip(existing["Day"], existing["Start"], existing["End"], existing["Task"]), new)]
+    conflicts += [f"'{task}' overlaps a calendar event on a {day} in the next year"
+                  for task, day in _event_clashes(email, new)]
+    if conflicts:
+        raise BulkImportError(conflicts)
+    if rows:
+        storage = get_storage()
+        old_version = storage.version("schedule", email)
+        storage.insert_schedule_tasks(rows)
+        task_cache.invalidate(("schedule", email))
+        task_cache.invalidate(("stats", email))
+        interval_indexes.add_many(email, new, old_version, storage.version("schedule", email))
+    return len(rows)
+
+
+# Calendar Functions: dated one-off and recurring events on top of the weekly schedule
+@timed(rows=len)
+def load_events(email):
+    storage = get_storage()
+    return task_cache.get(("events", email), storage.version("event", email),
+                          lambda: storage.load_events(email))
+
+# Get the cached calendar index of a user's weekly schedule and dated events
+def get_calendar(email):
+    storage = get_storage()
+    return calendar_indexes.get(email, (storage.version("schedule", email), storage.version("event", email)),
+                                lambda: weekly_events(load_schedule_tasks(email)) + events_from_frame(load_events(email)))
+
+# Calendar indexes of several users at once; the members not cached yet are
+# loaded together with one group read of schedules and one of events
+def get_calendars(emails):
+    storage = get_storage()
+    return calendar_indexes.get_many(
+        {email: (storage.version("schedule", email), storage.version("event", email)) for email in emails},
+        _load_group_events)
+
+def _load_group_events(emails):
+    storage = get_storage()
+    schedule_df = typed_schedule_frame(storage.load_group_schedule_tasks(emails))
+    events_df = storage.load_group_events(emails)
+    events = {email: [] for email in emails}
+    for email, user_df in schedule_df.groupby("Email", observed=True, sort=False):
+        events[email] += weekly_events(user_df)
+    for email, user_df in events_df.groupby("Email", sort=False):
+        events[email] += events_from_frame(user_df)
+    return events
+
+# Occurrences of everything on a user's calendar in [start, end), as (start, end, task)
+def calendar_occurrences(email, start, end):
+    return list(get_calendar(email).occurrences(start, end))
+
+# Add a dated event from start to end (datetimes; end may be past midnight),
+# repeating by an RRULE string such as "FREQ=WEEKLY;BYDAY=MO,WE;UNTIL=20261231".
+# Raises ScheduleConflictError if any occurrence in the next year clashes.
+@timed()
+def save_event(email, task, start, end, rrule=""):
+    event = Event(task, start, end, RecurrenceRule.parse(rrule) if rrule else None)
+    calendar = get_calendar(email)
+    for occurrence_start, occurrence_end, _ in event.occurrences(start, start + EVENT_CONFLICT_HORIZON):
+        if calendar.overlaps(occurrence_start, occurrence_end):
+            raise ScheduleConflictError(f"'{task}' overlaps another task on {occurrence_start:%A %Y-%m-%d}. "
+                                        "Please select a different time.")
+    get_storage().insert_event(event.to_row(email))
+    task_cache.invalidate(("events", email))
+
+# Skip one occurrence of a recurring event (the event is identified by task and first start)
+def cancel_occurrence(email, task, start, day):
+    events_df = load_events(email)
+    match = events_df[(events_df["Task"] == task) & (events_df["Start"] == start)]
+    if match.empty:
+        raise ValueError(f"No event '{task}' starting {start}")
+    exdates = sorted({value for value in match["ExDates"].iloc[0].split(",") if value} | {day.isoformat()})
+    get_storage().update_event(email, task, start, {"ExDates": ",".join(exdates)})
+    task_cache.invalidate(("events", email))
+
+def delete_event(email, task, start):
+    get_storage().delete_event(email, task, start)
+    task_cache.invalidate(("events", email))
+
+# Free (start, end) datetimes of at least `minutes` between two datetimes,
+# within daily working hours (start, end) given in hours if set
+@timed(rows=len)
+def find_free_time(email, start, end, minutes, working_hours=None):
+    window = None if working_hours is None else (working_hours[0] * 60, working_hours[1] * 60)
+    return get_calendar(email).free_time(start, end, minutes, window)
+
+
+# Group Scheduling: shared free time and bookings across several users' calendars
+def _members(emails):
+    members = list(dict.fromkeys(email.strip() for email in emails if email.strip()))
+    if not members:
+        raise ValueError("A group needs at least one member")
+    return members
+
+# Free (start, end) datetimes of at least `minutes` shared by every member (or
+# all but max_busy of them) between two datetimes, within working hours if set
+@timed(rows=len)
+def find_group_free_time(emails, start, end, minutes, working_hours=None, max_busy=0):
+    window = None if working_hours is None else (working_hours[0] * 60, working_hours[1] * 60)
+    return shared_free_time(get_calendars(_members(emails)), start, end, minutes, window, max_busy)
+
+# Add the same event to every member's calendar, all or nothing. Raises
+# ScheduleConflictError naming the members with a clash in the next year. The
+# members' versions are read before their calendars are checked and written
+# back with the rows, so a concurrent write to any of them makes the storage
+# refuse the batch; the check is then repeated on the new data.
+@timed(rows=len)
+def book_group_event(emails, task, start, end, rrule=""):
+    members = _members(emails)
+    event = Event(task, start, end, RecurrenceRule.parse(rrule) if rrule else None)
+    occurrences = [(occurrence_start, occurrence_end)
+                   for occurrence_start, occurrence_end, _ in event.occurrences(start, start + EVENT_CONFLICT_HORIZON)]
+    storage = get_storage()
+    for _ in range(GROUP_BOOKING_ATTEMPTS):
+        expected = {(kind, email): storage.version(kind, email) for email in members for kind in ("schedule", "event")}
+        busy = [email for email, calendar in zip(members, get_calendars(members)) if calendar.overlaps_any(occurrences)]
+        if busy:
+            raise ScheduleConflictError(f"'{task}' overlaps other tasks of {', '.join(busy)}. "
+                                        "Please select a different time.")
+        try:
+            storage.insert_events([event.to_row(email) for email in members], expected)
+        except StaleVersionError:
+            continue
+        for email in members:
+            task_cache.invalidate(("events", email))
+        return members
+    raise ScheduleConflictError("The members' calendars kept changing; please try again.")
+
+
+# Find free time slots in the schedule for a specific day, with an option to prioritize afternoon.
+# Pass schedule_df=None to use the user's cached interval index instead of a frame.
+@timed(rows=len)
+def find_free_time_slots(schedule_df, time_needed, email, day, prefer_afternoon=True):
+    if schedule_df is None:
+        day_index = get_day_index(email, day)
+    else:
+        schedule_df = typed_schedule_frame(schedule_df)
+        day_tasks = schedule_df[(schedule_df["Day"] == day) & (schedule_df["Email"] == email)]
+        day_index = build_day_indexes(day_tasks).get(day, DayIntervalIndex())
+    
+    # Free gaps between the desired start time and the end of the working day (6 PM)
+    start_time = "12:00 PM" if prefer_afternoon else "09:00 AM"
+    gaps = day_index.free_gaps(time_needed, parse_minutes(start_time), parse_minutes("06:00 PM"))
+    return [minutes_to_datetime(gap) for gap in gaps]
+
+# Suggested slots for all of a user's unfinished todos on the coming dates,
+# planned against their calendar: ({row: {"YYYY-MM-DD": [start minutes]}},
+# {row: minutes per day}, {row: task}), keyed by todo row (see plan_suggestions).
+# Memoized per user on the versions of their todos, schedule and events, so
+# repeated calls only plan again after a write (or the next time step).
+@timed(rows=lambda result: len(result[0]))
+def suggest_schedule(email, now=None):
+    now = datetime.now() if now is None else now
+    now = now.replace(minute=now.minute - now.minute % SUGGESTION_STEP_MINUTES, second=0, microsecond=0)
+    storage = get_storage()
+    key = (now,) + tuple(task_cache.version((name, email), storage.version(kind, email))
+                         for name, kind in (("todo", "todo"), ("schedule", "schedule"), ("events", "event")))
+    return suggestion_cache.get(email, key, lambda: plan_suggestions(load_todo_tasks(email), get_calendar(email), now))
+
+# Auto-schedule a user's pending todos into free time on their calendar
+# within daily working hours (start, end) given in hours, the same every day
+@timed(rows=lambda plan: len(plan.blocks))
+def auto_schedule_tasks(email, working_hours=(9, 18), **options):
+    hours = [(working_hours[0] * 60, working_hours[1] * 60)]
+    return auto_schedule(load_todo_tasks(email), load_schedule_tasks(email),
+                         working_hours={day: hours for day in DAYS_OF_WEEK}, calendar=get_calendar(email), **options)
+
+# Totals across every user for the admin views
+def load_stats_rollup():
+    return get_storage().stats_rollup()
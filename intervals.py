@@ -0,0 +1,174 @@
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from datetime import datetime
+
+from records import DAYS_OF_WEEK, MINUTES_PER_DAY
+
+
+# Convert minutes since midnight to the datetime form strptime("%I:%M %p") gives
+def minutes_to_datetime(minutes):
+    return datetime(1900, 1, 1, minutes // 60, minutes % 60)
+
+
+# Pieces of a weekly (day, start, end) slot. A slot that ends before it starts
+# runs past midnight, so it continues from 00:00 on the next day.
+def split_overnight(day, start, end):
+    if end >= start:
+        return [(day, start, end)]
+    next_day = DAYS_OF_WEEK[(DAYS_OF_WEEK.index(day) + 1) % 7]
+    return [(day, start, MINUTES_PER_DAY), (next_day, 0, end)]
+
+
+# Sorted interval index for one user's day.
+#
+# Tasks are kept as (start, end, task) minute triples sorted by start, and the
+# busy time is kept as disjoint merged blocks, so overlap checks and gap
+# searches are binary searches. Intervals whose end is not after their start
+# are ignored; callers split overnight slots with split_overnight first.
+class DayIntervalIndex:
+    def __init__(self, intervals=()):
+        self._intervals = sorted((start, end, task) for start, end, task in intervals if end > start)
+        self._rebuild_blocks()
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def _rebuild_blocks(self):
+        self._block_starts = []
+        self._block_ends = []
+        for start, end, _ in self._intervals:
+            if self._block_ends and start <= self._block_ends[-1]:
+                self._block_ends[-1] = max(self._block_ends[-1], end)
+            else:
+                self._block_starts.append(start)
+                self._block_ends.append(end)
+
+    def add(self, start, end, task):
+        if end <= start:
+            return
+        entry = (start, end, task)
+        self._intervals.insert(bisect_right(self._intervals, entry), entry)
+
+        # Merge the new interval with any blocks it touches
+        first = bisect_left(self._block_ends, start)
+        last = bisect_right(self._block_starts, end)
+        if first < last:
+            start = min(start, self._block_starts[first])
+            end = max(end, self._block_ends[last - 1])
+        self._block_starts[first:last] = [start]
+        self._block_ends[first:last] = [end]
+
+    # Removing can split a merged block, so the blocks are rebuilt; deletes are rare
+    def remove(self, task):
+        remaining = [entry for entry in self._intervals if entry[2] != task]
+        if len(remaining) != len(self._intervals):
+            self._intervals = remaining
+            self._rebuild_blocks()
+
+    def overlaps(self, start, end):
+        # Last block starting before the query end is the only one that can overlap
+        i = bisect_left(self._block_starts, end) - 1
+        return i >= 0 and self._block_ends[i] > start
+
+    # (start, end) of every free gap of at least min_length within [window_start, window_end)
+    def free_intervals(self, min_length, window_start=0, window_end=MINUTES_PER_DAY):
+        gaps = []
+        cursor = window_start
+        i = bisect_right(self._block_ends, window_start)
+        while i < len(self._block_starts) and self._block_starts[i] < window_end:
+            if self._block_starts[i] - cursor >= min_length:
+                gaps.append((cursor, self._block_starts[i]))
+            cursor = max(cursor, self._block_ends[i])
+            i += 1
+        if window_end - cursor >= min_length:
+            gaps.append((cursor, window_end))
+        return gaps
+
+    # Merged busy blocks (start, end) clipped to [window_start, window_end)
+    def blocks(self, window_start=0, window_end=MINUTES_PER_DAY):
+        blocks = []
+        i = bisect_right(self._block_ends, window_start)
+        while i < len(self._block_starts) and self._block_starts[i] < window_end:
+            blocks.append((max(self._block_starts[i], window_start), min(self._block_ends[i], window_end)))
+            i += 1
+        return blocks
+
+    # Start minutes of every free gap of at least min_length within [window_start, window_end)
+    def free_gaps(self, min_length, window_start=0, window_end=MINUTES_PER_DAY):
+        return [start for start, _ in self.free_intervals(min_length, window_start, window_end)]
+
+    def intervals(self):
+        return list(self._intervals)
+
+
+# Build per-day indexes from a typed schedule frame (see records.typed_schedule_frame)
+def build_day_indexes(schedule_df):
+    rows = {}
+    for day, task, start, end in zip(schedule_df["Day"], schedule_df["Task"], schedule_df["Start"], schedule_df["End"]):
+        for piece_day, piece_start, piece_end in split_overnight(day, int(start), int(end)):
+            rows.setdefault(piece_day, []).append((piece_start, piece_end, task))
+    return {day: DayIntervalIndex(intervals) for day, intervals in rows.items()}
+
+
+# Process-wide cache of per-user {day: DayIntervalIndex} maps.
+#
+# Entries are tagged with the storage version they were built from. Writes made
+# through this process patch the index in place and re-tag it with the new
+# version, so the index is only rebuilt when another process changed the data.
+class IntervalIndexCache:
+    def __init__(self, max_users=1024):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email, day, storage_version, loader):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is not None and entry[0] == storage_version:
+                self._entries.move_to_end(email)
+                return entry[1].setdefault(day, DayIntervalIndex())
+        indexes = build_day_indexes(loader())
+        with self._lock:
+            self._entries[email] = (storage_version, indexes)
+            self._entries.move_to_end(email)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+            return indexes.setdefault(day, DayIntervalIndex())
+
+    def add(self, email, day, start, end, task, old_version, new_version):
+        self.add_many(email, [(day, start, end, task)], old_version, new_version)
+
+    # Several (day, start, end, task) entries written in one storage write
+    def add_many(self, email, entries, old_version, new_version):
+        def change(indexes):
+            for day, start, end, task in entries:
+                for piece_day, piece_start, piece_end in split_overnight(day, start, end):
+                    indexes.setdefault(piece_day, DayIntervalIndex()).add(piece_start, piece_end, task)
+        self._patch(email, old_version, new_version, change)
+
+    # An overnight slot also sits in the next day's index, where a task of the
+    # same name may have its own entry, so removals rebuild the user's indexes
+    def remove(self, email, day, task, old_version, new_version):
+        with self._lock:
+            self._entries.pop(email, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # Apply a local write; if the cached index was already stale just drop it
+    def _patch(self, email, old_version, new_version, change):
+        with self._lock:
+            entry = self._entries.get(email)
+            if entry is None:
+                return
+            if entry[0] != old_version:
+                del self._entries[email]
+                return
+            change(entry[1])
+            self._entries[email] = (new_version, entry[1])
+
+
+# Shared by every Streamlit session in this process
+interval_indexes = IntervalIndexCache()
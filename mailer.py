@@ -0,0 +1,428 @@
+import random
+import socketserver
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+
+from metrics import measure, timed
+
+# smtplib and the email package are imported where they are used: most app
+# runs never send mail, so they stay off the startup path
+
+# Retry policy: exponential backoff from RETRY_BASE_DELAY seconds, capped, with jitter
+MAX_ATTEMPTS = 6
+RETRY_BASE_DELAY = 5
+RETRY_MAX_DELAY = 30 * 60
+
+# A message left "sending" this long belongs to a crashed worker and is retried
+CLAIM_TIMEOUT = 5 * 60
+
+# Open queues are kept per process so Streamlit reruns reuse the same worker
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+# Build the plain-text MIME message the app sends
+def build_message(sender, recipient, subject, body):
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
+    message = MIMEMultipart("alternative")
+    message["Subject"] = subject
+    message["From"] = sender
+    message["To"] = recipient
+    message.attach(MIMEText(body, "plain"))
+    return message.as_string()
+
+
+# Pool of logged-in SMTP connections reused across batches
+class SMTPPool:
+    def __init__(self, host, port, username=None, password=None, starttls=True, size=2, idle_timeout=60):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.starttls = starttls
+        self.size = size
+        self.idle_timeout = idle_timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @timed("mailer.smtp_connect")
+    def _connect(self):
+        import smtplib
+
+        server = smtplib.SMTP(self.host, self.port, timeout=30)
+        if self.starttls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        return server
+
+    # Take an idle connection (checking it is still alive) or open a new one
+    def acquire(self):
+        import smtplib
+
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used = self._idle.pop()
+            if time.monotonic() - last_used < self.idle_timeout:
+                try:
+                    if server.noop()[0] == 250:
+                        return server
+                except (smtplib.SMTPException, OSError):
+                    pass
+            self._discard(server)
+        return self._connect()
+
+    def release(self, server):
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append((server, time.monotonic()))
+                return
+        self._discard(server)
+
+    def _discard(self, server):
+        import smtplib
+
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            pass
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _ in idle:
+            self._discard(server)
+
+
+# Persistent outbound mail queue drained by a background worker.
+#
+# enqueue() only writes a row to SQLite and returns. The worker claims due
+# messages in batches, sends each batch over one pooled SMTP connection and
+# reschedules failures with exponential backoff until MAX_ATTEMPTS. Messages
+# the server rejects for good (5xx replies, refused recipients) are marked
+# dead at once instead of being retried.
+class MailQueue:
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, recipient TEXT NOT NULL, '
+        "subject TEXT NOT NULL, body TEXT NOT NULL, status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0, "
+        'next_attempt REAL NOT NULL, claimed_by TEXT, claimed_at REAL, last_error TEXT, created REAL NOT NULL, sent REAL, '
+        'dedupe_key TEXT)',
+        'CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_attempt)',
+    ]
+
+    def __init__(self, queue_file, sender, pool, batch_size=20, poll_interval=5):
+        self.queue_file = queue_file
+        self.sender = sender
+        self.pool = pool
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        conn = self._connection()
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+        # Queues created before dedupe keys existed gain the column
+        if "dedupe_key" not in [row[1] for row in conn.execute("PRAGMA table_info(outbox)")]:
+            conn.execute("ALTER TABLE outbox ADD COLUMN dedupe_key TEXT")
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_outbox_dedupe ON outbox (dedupe_key)")
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.queue_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    # Queue a message and return its id immediately. A message with a
+    # dedupe_key is queued at most once: enqueueing the same key again returns
+    # the first message's id.
+    def enqueue(self, recipient, subject, body, send_at=None, dedupe_key=None):
+        now = time.time()
+        conn = self._connection()
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO outbox (recipient, subject, body, next_attempt, created, dedupe_key) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (recipient, subject, body, now if send_at is None else send_at, now, dedupe_key),
+        )
+        if not cursor.rowcount:
+            return conn.execute("SELECT id FROM outbox WHERE dedupe_key = ?", (dedupe_key,)).fetchone()[0]
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def status(self, message_id):
+        row = self._connection().execute(
+            "SELECT status, attempts, last_error FROM outbox WHERE id = ?", (message_id,)
+        ).fetchone()
+        return None if row is None else {"status": row[0], "attempts": row[1], "last_error": row[2]}
+
+    def counts(self):
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM outbox GROUP BY status").fetchall()
+        return dict(rows)
+
+    # Atomically claim up to batch_size due messages for this worker
+    def _claim(self, worker_id):
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "UPDATE outbox SET status = 'sending', claimed_by = ?, claimed_at = ? WHERE id IN ("
+                "SELECT id FROM outbox WHERE (status = 'queued' AND next_attempt <= ?) "
+                "OR (status = 'sending' AND claimed_at < ?) ORDER BY next_attempt LIMIT ?)",
+                (worker_id, now, now, now - CLAIM_TIMEOUT, self.batch_size),
+            )
+            rows = conn.execute(
+                "SELECT id, recipient, subject, body, attempts FROM outbox WHERE status = 'sending' AND claimed_by = ? "
+                "AND claimed_at = ?", (worker_id, now),
+            ).fetchall()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _mark_sent(self, message_id):
+        self._connection().execute(
+            "UPDATE outbox SET status = 'sent', sent = ?, attempts = attempts + 1, last_error = NULL WHERE id = ?",
+            (time.time(), message_id),
+        )
+
+    def _mark_failed(self, message_id, attempts, error):
+        attempts += 1
+        if attempts >= MAX_ATTEMPTS:
+            status, next_attempt = "failed", time.time()
+        else:
+            delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempts - 1))
+            status, next_attempt = "queued", time.time() + delay * random.uniform(0.8, 1.2)
+        self._connection().execute(
+            "UPDATE outbox SET status = ?, attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+            (status, attempts, next_attempt, str(error), message_id),
+        )
+
+    def _mark_dead(self, message_id, attempts, error):
+        self._connection().execute(
+            "UPDATE outbox SET status = 'dead', attempts = ?, next_attempt = ?, last_error = ? WHERE id = ?",
+            (attempts + 1, time.time(), str(error), message_id),
+        )
+
+    # Send one claimed batch over a single pooled connection; returns messages handled
+    def process_batch(self, worker_id=None):
+        import smtplib
+
+        rows = self._claim(worker_id or uuid.uuid4().hex)
+        if not rows:
+            return 0
+        try:
+            server = self.pool.acquire()
+        except Exception as e:
+            for message_id, _, _, _, attempts in rows:
+                self._mark_failed(message_id, attempts, e)
+            if not isinstance(e, (smtplib.SMTPException, OSError)):
+                traceback.print_exc()
+            return len(rows)
+
+        healthy = True
+        for message_id, recipient, subject, body, attempts in rows:
+            if not healthy:
+                self._mark_failed(message_id, attempts, "connection lost")
+                continue
+            try:
+                message = build_message(self.sender, recipient, subject, body)
+                with measure("mailer.smtp_send") as span:
+                    span.bytes = len(message)
+                    server.sendmail(self.sender, recipient, message)
+                self._mark_sent(message_id)
+            except smtplib.SMTPRecipientsRefused as e:
+                # A bad address does not mean the connection is broken
+                self._mark_dead(message_id, attempts, e)
+            except smtplib.SMTPResponseException as e:
+                # sendmail resets the session after a refusal, so only a 5xx is final
+                if 500 <= e.smtp_code < 600:
+                    self._mark_dead(message_id, attempts, e)
+                else:
+                    self._mark_failed(message_id, attempts, e)
+                    healthy = False
+            except (smtplib.SMTPException, OSError) as e:
+                self._mark_failed(message_id, attempts, e)
+                healthy = False
+            except Exception as e:
+                # Unexpected: retry the message later and do not trust the connection
+                traceback.print_exc()
+                self._mark_failed(message_id, attempts, e)
+                healthy = False
+        if healthy:
+            self.pool.release(server)
+        else:
+            self.pool._discard(server)
+        return len(rows)
+
+    # Drain due messages until none are left
+    def drain(self):
+        worker_id = uuid.uuid4().hex
+        total = 0
+        while True:
+            handled = self.process_batch(worker_id)
+            if not handled:
+                return total
+            total += handled
+
+    # Drain the queue whenever messages are due until stop() is called. The
+    # worker thread runs this; `python mailer.py worker` runs it in the foreground.
+    # Errors are printed and the loop carries on after the poll interval.
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                self.drain()
+            except Exception:
+                traceback.print_exc()
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    # Start the background worker thread once per process
+    def start(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stop.clear()
+                self._worker = threading.Thread(target=self.run_forever, name="mail-queue-worker", daemon=True)
+                self._worker.start()
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+        self.pool.close()
+
+
+# Open (or reuse) the mail queue for this process and make sure its worker runs
+def open_mail_queue(queue_file, sender, host, port, username=None, password=None, starttls=True, start_worker=True):
+    key = (queue_file, sender, host, port, username)
+    with _queues_lock:
+        queue = _queues.get(key)
+        if queue is None:
+            pool = SMTPPool(host, port, username, password, starttls)
+            queue = MailQueue(queue_file, sender, pool)
+            _queues[key] = queue
+    if start_worker:
+        queue.start()
+    return queue
+
+
+# Minimal local SMTP server that records messages instead of delivering them.
+# Accepts any AUTH credentials and no STARTTLS, so point the pool at it with
+# starttls=False. Received messages are in server.messages as (from, [to], data).
+class DebuggingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=1025, echo=False):
+        self.messages = []
+        self.echo = echo
+        self._lock = threading.Lock()
+        super().__init__((host, port), _DebuggingSMTPHandler)
+
+    def record(self, sender, recipients, data):
+        with self._lock:
+            self.messages.append((sender, recipients, data))
+        if self.echo:
+            print(f"---------- MESSAGE FOLLOWS ----------\nFrom: {sender}\nTo: {', '.join(recipients)}\n{data}\n")
+
+    def start(self):
+        thread = threading.Thread(target=self.serve_forever, name="debug-smtp", daemon=True)
+        thread.start()
+        return self
+
+
+class _DebuggingSMTPHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write((line + "\r\n").encode())
+
+    def handle(self):
+        self.reply("220 localhost debugging SMTP ready")
+        sender, recipients = None, []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode(errors="replace").strip()
+            verb = command.split(" ", 1)[0].upper()
+            if verb == "EHLO":
+                self.reply("250-localhost")
+                self.reply("250 AUTH PLAIN")
+            elif verb == "HELO":
+                self.reply("250 localhost")
+            elif verb == "AUTH":
+                # AUTH PLAIN, with or without the initial response; any credentials pass
+                if len(command.split()) < 3:
+                    self.reply("334 ")
+                    self.rfile.readline()
+                self.reply("235 Authentication successful")
+            elif verb == "MAIL":
+                sender, recipients = command.split(":", 1)[1].strip().strip("<>").split(">")[0], []
+                self.reply("250 OK")
+            elif verb == "RCPT":
+                recipients.append(command.split(":", 1)[1].strip().strip("<>").split(">")[0])
+                self.reply("250 OK")
+            elif verb == "DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                lines = []
+                while True:
+                    data_line = self.rfile.readline()
+                    if not data_line or data_line in (b".\r\n", b".\n"):
+                        break
+                    if data_line.startswith(b".."):
+                        data_line = data_line[1:]
+                    lines.append(data_line.decode(errors="replace"))
+                self.server.record(sender, recipients, "".join(lines))
+                self.reply("250 OK: queued")
+            elif verb in ("RSET", "NOOP"):
+                if verb == "RSET":
+                    sender, recipients = None, []
+                self.reply("250 OK")
+            elif verb == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+
+# Command line: run a queue worker or the local debugging SMTP server
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Schedule App outbound mail tools.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker = subparsers.add_parser("worker", help="drain the mail queue in this process")
+    worker.add_argument("--queue", default="mail_queue.db")
+    worker.add_argument("--host", default="smtp.gmail.com")
+    worker.add_argument("--port", type=int, default=587)
+    worker.add_argument("--sender", required=True)
+    worker.add_argument("--password")
+    worker.add_argument("--no-starttls", action="store_true")
+    debug = subparsers.add_parser("debug-server", help="run a local SMTP server that prints messages")
+    debug.add_argument("--host", default="127.0.0.1")
+    debug.add_argument("--port", type=int, default=1025)
+    args = parser.parse_args()
+
+    if args.command == "debug-server":
+        print(f"Debugging SMTP server listening on {args.host}:{args.port}")
+        DebuggingSMTPServer(args.host, args.port, echo=True).serve_forever()
+    else:
+        queue = open_mail_queue(args.queue, args.sender, args.host, args.port, args.sender if args.password else None,
+                                args.password, not args.no_starttls, start_worker=False)
+        queue.run_forever()
+
+
+if __name__ == "__main__":
+    main()
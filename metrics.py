@@ -0,0 +1,156 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+# Set SCHEDULE_APP_METRICS=0 to stop recording (the wrappers then only call through)
+ENABLED = os.environ.get("SCHEDULE_APP_METRICS", "1") != "0"
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+# What a measured block can report besides its duration
+class Span:
+    __slots__ = ("rows", "bytes")
+
+    def __init__(self):
+        self.rows = 0
+        self.bytes = 0
+
+
+# Process-wide timings of instrumented calls.
+#
+# Each name keeps a call count, total and max seconds, a fixed-bucket latency
+# histogram, rows and bytes processed and an error count, so recording is a
+# few additions under a lock. Collectors add point-in-time values such as
+# cache counters to the exports.
+class Metrics:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self._series = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds, rows=0, nbytes=0, error=False):
+        with self._lock:
+            series = self._series.get(name)
+            if series is None:
+                series = self._series[name] = {"calls": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0,
+                                               "bytes": 0, "errors": 0, "buckets": [0] * (len(self.buckets) + 1)}
+            series["calls"] += 1
+            series["seconds"] += seconds
+            series["max_seconds"] = max(series["max_seconds"], seconds)
+            series["rows"] += rows
+            series["bytes"] += nbytes
+            series["errors"] += bool(error)
+            series["buckets"][bisect_left(self.buckets, seconds)] += 1
+
+    # Export collector() -> {key: number} as gauges named "<name>_<key>"
+    def add_collector(self, name, collector):
+        with self._lock:
+            self._collectors[name] = collector
+
+    def snapshot(self):
+        with self._lock:
+            series = {name: {**values, "buckets": list(values["buckets"])} for name, values in self._series.items()}
+            collectors = dict(self._collectors)
+        gauges = {}
+        for name, collector in collectors.items():
+            for key, value in collector().items():
+                if isinstance(value, (int, float)):
+                    gauges[f"{name}_{key}"] = value
+        return series, gauges
+
+    # Upper bound of the bucket holding the q-quantile call (None above the last bucket)
+    def quantile(self, values, q):
+        rank = q * values["calls"]
+        seen = 0
+        for bound, count in zip(self.buckets, values["buckets"]):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def to_json(self):
+        series, gauges = self.snapshot()
+        calls = {name: {key: value for key, value in values.items() if key != "buckets"}
+                 for name, values in series.items()}
+        for name, values in series.items():
+            calls[name]["mean_seconds"] = values["seconds"] / values["calls"]
+            calls[name]["p95_seconds_le"] = self.quantile(values, 0.95)
+        return json.dumps({"calls": calls, "gauges": gauges}, indent=2, sort_keys=True)
+
+    # Prometheus text exposition format
+    def to_prometheus(self, prefix="schedule_app"):
+        series, gauges = self.snapshot()
+        lines = [f"# HELP {prefix}_call_seconds Time spent in instrumented calls.",
+                 f"# TYPE {prefix}_call_seconds histogram"]
+        for name, values in sorted(series.items()):
+            label = _label(name)
+            cumulative = 0
+            for bound, count in zip(self.buckets, values["buckets"]):
+                cumulative += count
+                lines.append(f'{prefix}_call_seconds_bucket{{name="{label}",le="{bound}"}} {cumulative}')
+            lines.append(f'{prefix}_call_seconds_bucket{{name="{label}",le="+Inf"}} {values["calls"]}')
+            lines.append(f'{prefix}_call_seconds_sum{{name="{label}"}} {values["seconds"]:.6f}')
+            lines.append(f'{prefix}_call_seconds_count{{name="{label}"}} {values["calls"]}')
+        for counter, help_text in (("rows", "Rows read or written by instrumented calls."),
+                                   ("bytes", "Bytes read by instrumented calls."),
+                                   ("errors", "Instrumented calls that raised.")):
+            lines += [f"# HELP {prefix}_call_{counter}_total {help_text}", f"# TYPE {prefix}_call_{counter}_total counter"]
+            lines += [f'{prefix}_call_{counter}_total{{name="{_label(name)}"}} {values[counter]}'
+                      for name, values in sorted(series.items())]
+        for name, value in sorted(gauges.items()):
+            lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value}"]
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+
+def _label(name):
+    return name.replace("\\", "\\\\").replace('"', '\\"')
+
+
+# Time a block under `name`; the block may set span.rows and span.bytes
+@contextmanager
+def measure(name):
+    span = Span()
+    started = time.perf_counter()
+    error = False
+    try:
+        yield span
+    except BaseException:
+        error = True
+        raise
+    finally:
+        if ENABLED:
+            metrics.record(name, time.perf_counter() - started, span.rows, span.bytes, error)
+
+
+# Decorator timing every call of a function under `name` (default
+# "module.function"); rows(result) is recorded as the rows processed
+def timed(name=None, rows=None):
+    def decorate(func):
+        label = name or f"{func.__module__}.{func.__name__}"
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            with measure(label) as span:
+                result = func(*args, **kwargs)
+                if rows is not None:
+                    span.rows = rows(result)
+                return result
+        return wrapper
+    return decorate
+
+
+# Shared by everything in this process
+metrics = Metrics()
@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from records import typed_todo_frame
+
+# Suggestion windows in minutes since midnight: afternoon first, then from the morning
+AFTERNOON_START = 12 * 60
+MORNING_START = 9 * 60
+END_OF_DAY = 18 * 60
+
+# How many dates ahead suggestions are offered for
+SUGGESTION_DAYS = 7
+
+# Shortest daily share worth offering a slot for
+MIN_SLOT_MINUTES = 15
+
+
+# Start minutes and lengths of the free gaps of one date's DayIntervalIndex
+# inside [window_start, window_end)
+def calendar_gaps(day_index, window_start, window_end):
+    intervals = day_index.free_intervals(1, window_start, window_end) if window_start < window_end else []
+    starts = np.array([start for start, _ in intervals], dtype=np.int64)
+    return starts, np.array([end for _, end in intervals], dtype=np.int64) - starts
+
+
+# Minutes per day for every todo at once: Time Needed spread over the days
+# until the deadline, keeping the last two days free for review. Each day gets
+# at least MIN_SLOT_MINUTES (or all of Time Needed, if that is less).
+def time_per_day(todo_df, now=None):
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    todo_df = typed_todo_frame(todo_df)
+    time_needed = todo_df["Time Needed"].to_numpy(dtype=np.int64)
+    days_until_deadline = (todo_df["Deadline"] - now).dt.days.to_numpy()
+    spread = np.maximum(days_until_deadline - 2, 1)
+    share = np.where(days_until_deadline > 2, time_needed // spread, time_needed)
+    return np.minimum(np.maximum(share, MIN_SLOT_MINUTES), time_needed)
+
+
+# Suggest free slots for all of a user's unfinished todos on real dates in one pass.
+#
+# Each task is offered the dates over which time_per_day spreads its work,
+# from today up to its deadline, at most `days` ahead. For each date the
+# afternoon and morning gaps are read once from the calendar index (see
+# recurrence.CalendarIndex), then every task takes the fitting gap starts as
+# its options and reserves its first option, so default suggestions for
+# different tasks never collide. Todos are keyed by their row in the todo
+# frame, so two todos with the same name each get their own suggestions;
+# todos with no time needed get none.
+# Returns ({row: {"YYYY-MM-DD": [start minutes]}}, {row: minutes}, {row: task}).
+def plan_suggestions(todo_df, calendar, now=None, days=SUGGESTION_DAYS):
+    now = pd.Timestamp.now() if now is None else pd.Timestamp(now)
+    todo_df = typed_todo_frame(todo_df)
+    todo_df = todo_df[(todo_df["Status"] != "Completed") & (todo_df["Time Needed"] > 0)]
+    if todo_df.empty:
+        return {}, {}, {}
+    rows = todo_df.index.tolist()
+    minutes = time_per_day(todo_df, now)
+    last_offsets = np.maximum((todo_df["Deadline"] - now).dt.days.to_numpy() - 2, 1) - 1
+
+    suggestions = {row: {} for row in rows}
+    for offset in range(min(days, int(last_offsets.max()) + 1)):
+        date = now.date() + timedelta(days=offset)
+        earliest = now.hour * 60 + now.minute if offset == 0 else 0
+        day_index = calendar.day(date)
+        afternoon = list(calendar_gaps(day_index, max(AFTERNOON_START, earliest), END_OF_DAY))
+        morning = list(calendar_gaps(day_index, max(MORNING_START, earliest), END_OF_DAY))
+        for row, needed, last_offset in zip(rows, minutes, last_offsets):
+            if offset > last_offset:
+                continue
+            gaps = afternoon if (afternoon[1] >= needed).any() else morning
+            options = gaps[0][gaps[1] >= needed]
+            suggestions[row][date.isoformat()] = options.tolist()
+            if len(options):
+                _reserve(afternoon, options[0], needed)
+                _reserve(morning, options[0], needed)
+
+    return suggestions, {row: int(needed) for row, needed in zip(rows, minutes)}, dict(zip(rows, todo_df["Task"]))
+
+
+# Take [start, start + length) out of whichever gap contains start, splitting it
+def _reserve(gaps, start, length):
+    starts, lengths = gaps
+    i = np.searchsorted(starts, start, side="right") - 1
+    if i < 0 or start >= starts[i] + lengths[i]:
+        return
+    end = min(start + length, starts[i] + lengths[i])
+    pieces = [(starts[i], start - starts[i]), (end, starts[i] + lengths[i] - end)]
+    pieces = [(s, n) for s, n in pieces if n > 0]
+    gaps[0] = np.concatenate((starts[:i], np.array([s for s, _ in pieces], dtype=starts.dtype), starts[i + 1:]))
+    gaps[1] = np.concatenate((lengths[:i], np.array([n for _, n in pieces], dtype=lengths.dtype), lengths[i + 1:]))
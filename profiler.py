@@ -0,0 +1,82 @@
+import glob
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+# Seconds between stack samples
+SAMPLE_INTERVAL = 0.005
+
+# Profiles kept per directory; older ones are deleted
+KEEP_PROFILES = 50
+
+
+# Sampling profiler for one thread.
+#
+# A daemon thread reads the target thread's current stack every interval and
+# counts each distinct stack, so the profiled code runs untouched (no tracing
+# hooks) and the overhead is a few microseconds per sample. The result is in
+# the collapsed "root;caller;callee count" format read by flamegraph.pl and
+# speedscope.
+class SamplingProfiler:
+    def __init__(self, interval=SAMPLE_INTERVAL, thread_id=None):
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def folded(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+# Profile the block into "<directory>/<label>-<time>-<pid>.folded". Does
+# nothing when directory is None, so callers can wrap unconditionally.
+@contextmanager
+def profile(directory, label="rerun", interval=SAMPLE_INTERVAL):
+    if not directory:
+        yield None
+        return
+    profiler = SamplingProfiler(interval).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        os.makedirs(directory, exist_ok=True)
+        filename = os.path.join(directory, f"{label}-{time.strftime('%Y%m%d-%H%M%S')}-{time.time_ns() % 10 ** 9:09d}-{os.getpid()}.folded")
+        with open(filename, "w") as handle:
+            handle.write(profiler.folded())
+        for old in recent_profiles(directory)[KEEP_PROFILES:]:
+            os.unlink(old)
+
+
+# Profile files in a directory, newest first
+def recent_profiles(directory):
+    return sorted(glob.glob(os.path.join(directory, "*.folded")), key=os.path.getmtime, reverse=True)
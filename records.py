@@ -0,0 +1,114 @@
+from datetime import datetime
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from metrics import timed
+
+MINUTES_PER_DAY = 24 * 60
+DAYS_OF_WEEK = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+STATUSES = ["Pending", "In Progress", "Completed"]
+PRIORITIES = ["High", "Medium", "Low"]
+
+# Small fixed vocabularies are stored as categorical codes (one byte per row)
+DAY_DTYPE = pd.CategoricalDtype(DAYS_OF_WEEK, ordered=True)
+STATUS_DTYPE = pd.CategoricalDtype(STATUSES)
+PRIORITY_DTYPE = pd.CategoricalDtype(PRIORITIES, ordered=True)
+
+# Deadlines are whole days
+DEADLINE_DTYPE = "datetime64[s]"
+
+# Typed column layout of the in-memory frames
+TYPED_TODO_COLUMNS = ["Email", "Task", "Deadline", "Status", "Time Needed", "Priority", "Reminder"]
+TYPED_SCHEDULE_COLUMNS = ["Email", "Task", "Day", "Start", "End"]
+
+
+# Convert a "05:30 PM" string to minutes since midnight (parsed once per distinct string)
+@lru_cache(maxsize=4096)
+def parse_minutes(time_string):
+    parsed = datetime.strptime(time_string, "%I:%M %p")
+    return parsed.hour * 60 + parsed.minute
+
+
+# Convert minutes since midnight back to a "05:30 PM" string
+def format_minutes(minutes):
+    minutes %= MINUTES_PER_DAY
+    hour, minute = divmod(minutes, 60)
+    return f"{(hour % 12) or 12:02d}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+# Minutes since midnight (int16) for a column of "05:30 PM" strings; each
+# distinct string is parsed once
+def minutes_column(times):
+    codes, uniques = pd.factorize(pd.Series(times, dtype=object))
+    minutes = np.array([parse_minutes(time) for time in uniques], dtype=np.int16)
+    return minutes[codes]
+
+
+# Reminder flags arrive as bools, "True"/"False" strings or 0/1
+FLAG_VALUES = ("true", "1")
+
+
+def is_flag_set(value):
+    return str(value).lower() in FLAG_VALUES
+
+
+def flag_column(values):
+    return pd.Series(values, dtype=object).astype(str).str.lower().isin(FLAG_VALUES).to_numpy()
+
+
+# Time Needed arrives as ints, floats or numeric strings; missing or
+# unreadable values count as no time
+def needed_minutes(value):
+    minutes = pd.to_numeric(value, errors="coerce")
+    return 0 if pd.isna(minutes) else int(minutes)
+
+
+def needed_minutes_column(values):
+    return pd.to_numeric(pd.Series(values), errors="coerce").fillna(0).to_numpy(dtype=np.int32)
+
+
+# Convert a todo frame as stored (strings everywhere) to the typed layout:
+# categorical Email/Status/Priority, day-precision Deadline, int32 Time Needed
+# and bool Reminder. Frames that are already typed are returned unchanged.
+@timed(rows=len)
+def typed_todo_frame(todo_df):
+    if isinstance(todo_df["Status"].dtype, pd.CategoricalDtype):
+        return todo_df
+    return pd.DataFrame({
+        "Email": pd.Categorical(todo_df["Email"]),
+        "Task": todo_df["Task"].to_numpy(dtype=object),
+        "Deadline": pd.to_datetime(todo_df["Deadline"]).dt.normalize().astype(DEADLINE_DTYPE).to_numpy(),
+        "Status": pd.Categorical(todo_df["Status"], dtype=STATUS_DTYPE),
+        "Time Needed": needed_minutes_column(todo_df["Time Needed"]),
+        "Priority": pd.Categorical(todo_df["Priority"], dtype=PRIORITY_DTYPE),
+        "Reminder": flag_column(todo_df["Reminder"]),
+    }, index=todo_df.index)
+
+
+# Convert a schedule frame as stored ("Time From"/"Time To" strings) to the
+# typed layout with categorical Email/Day and int16 Start/End minutes.
+# Frames that are already typed are returned unchanged.
+@timed(rows=len)
+def typed_schedule_frame(schedule_df):
+    if "Start" in schedule_df.columns:
+        return schedule_df
+    return pd.DataFrame({
+        "Email": pd.Categorical(schedule_df["Email"]),
+        "Task": schedule_df["Task"].to_numpy(dtype=object),
+        "Day": pd.Categorical(schedule_df["Day"], dtype=DAY_DTYPE),
+        "Start": minutes_column(schedule_df["Time From"]),
+        "End": minutes_column(schedule_df["Time To"]),
+    }, index=schedule_df.index)
+
+
+# Back to the stored layout, with "05:30 PM" time strings (for display and export)
+def format_schedule_frame(schedule_df):
+    return pd.DataFrame({
+        "Email": schedule_df["Email"].astype(object),
+        "Task": schedule_df["Task"],
+        "Day": schedule_df["Day"].astype(object),
+        "Time From": [format_minutes(int(minutes)) for minutes in schedule_df["Start"]],
+        "Time To": [format_minutes(int(minutes)) for minutes in schedule_df["End"]],
+    }, index=schedule_df.index)
@@ -0,0 +1,341 @@
+import heapq
+import threading
+from collections import OrderedDict
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+
+from intervals import DayIntervalIndex
+from records import MINUTES_PER_DAY, typed_schedule_frame
+
+# Stored layout of a dated schedule entry: first occurrence Start/End as
+# "YYYY-MM-DD HH:MM", an optional RRULE and comma-separated cancelled dates
+EVENT_TIME_FORMAT = "%Y-%m-%d %H:%M"
+
+WEEKDAY_CODES = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+
+# Weekly schedule rows (a weekday name, no date) recur every week from this Monday on
+WEEKLY_EPOCH = date(2000, 1, 3)
+
+# Days of occurrences expanded at once when a calendar index fills a gap
+FILL_DAYS = 31
+
+
+# The supported subset of an iCalendar RRULE: FREQ=DAILY or WEEKLY, with
+# INTERVAL, BYDAY (weekly only), COUNT and UNTIL (a date, inclusive)
+class RecurrenceRule:
+    def __init__(self, freq, interval=1, by_day=None, count=None, until=None):
+        if freq not in ("DAILY", "WEEKLY"):
+            raise ValueError(f"Unsupported FREQ {freq!r}; use DAILY or WEEKLY")
+        if interval < 1 or (count is not None and count < 1):
+            raise ValueError("INTERVAL and COUNT must be positive")
+        self.freq = freq
+        self.interval = interval
+        self.by_day = sorted(set(by_day)) if by_day else None
+        self.count = count
+        self.until = until
+
+    @classmethod
+    def parse(cls, text):
+        parts = {}
+        for part in text.strip().removeprefix("RRULE:").split(";"):
+            name, _, value = part.partition("=")
+            if not value:
+                raise ValueError(f"Malformed RRULE part {part!r}")
+            parts[name.strip().upper()] = value.strip().upper()
+        try:
+            by_day = [WEEKDAY_CODES.index(code) for code in parts["BYDAY"].split(",")] if "BYDAY" in parts else None
+            return cls(parts.get("FREQ"), int(parts.get("INTERVAL", 1)), by_day,
+                       int(parts["COUNT"]) if "COUNT" in parts else None,
+                       datetime.strptime(parts["UNTIL"][:8], "%Y%m%d").date() if "UNTIL" in parts else None)
+        except ValueError as error:
+            raise ValueError(f"Invalid RRULE {text!r}: {error}") from None
+
+    def __str__(self):
+        parts = [f"FREQ={self.freq}"]
+        if self.interval != 1:
+            parts.append(f"INTERVAL={self.interval}")
+        if self.by_day:
+            parts.append("BYDAY=" + ",".join(WEEKDAY_CODES[day] for day in self.by_day))
+        if self.count is not None:
+            parts.append(f"COUNT={self.count}")
+        if self.until is not None:
+            parts.append(f"UNTIL={self.until:%Y%m%d}")
+        return ";".join(parts)
+
+    # Occurrence dates from first on, in order. Without COUNT the expansion
+    # jumps straight to the period containing `after`, so far-future ranges
+    # of long-running rules cost the same as near ones.
+    def dates(self, first, after=None):
+        if self.freq == "DAILY":
+            period, offsets, anchor = self.interval, [0], first
+        else:
+            period = 7 * self.interval
+            anchor = first - timedelta(days=first.weekday())
+            offsets = self.by_day or [first.weekday()]
+        k = 0
+        if self.count is None and after is not None and after > anchor:
+            k = (after - anchor).days // period
+        produced = 0
+        while True:
+            base = anchor + timedelta(days=k * period)
+            for offset in offsets:
+                day = base + timedelta(days=offset)
+                if day < first:
+                    continue
+                if self.until is not None and day > self.until:
+                    return
+                yield day
+                produced += 1
+                if self.count is not None and produced >= self.count:
+                    return
+            k += 1
+
+
+# A schedule entry on real dates: the first occurrence runs from start to end
+# (possibly past midnight), repeating by rule with the cancelled dates skipped.
+# A moved occurrence is a cancelled date plus a one-off event.
+class Event:
+    def __init__(self, task, start, end, rule=None, exdates=()):
+        if end <= start:
+            raise ValueError("An event must end after it starts")
+        self.task = task
+        self.start = start
+        self.end = end
+        self.rule = rule
+        self.exdates = frozenset(exdates)
+
+    @property
+    def duration(self):
+        return self.end - self.start
+
+    # (start, end, task) of every occurrence overlapping [range_start, range_end), in order
+    def occurrences(self, range_start, range_end):
+        if self.rule is None:
+            if self.start < range_end and self.end > range_start and self.start.date() not in self.exdates:
+                yield self.start, self.end, self.task
+            return
+        duration = self.duration
+        for day in self.rule.dates(self.start.date(), (range_start - duration).date()):
+            start = datetime.combine(day, self.start.time())
+            if start >= range_end:
+                return
+            if day not in self.exdates and start + duration > range_start:
+                yield start, start + duration, self.task
+
+    @classmethod
+    def from_row(cls, row):
+        rule, exdates = _text(row.get("RRule")), _text(row.get("ExDates"))
+        return cls(row["Task"], datetime.strptime(row["Start"], EVENT_TIME_FORMAT),
+                   datetime.strptime(row["End"], EVENT_TIME_FORMAT),
+                   RecurrenceRule.parse(rule) if rule else None,
+                   [date.fromisoformat(day) for day in exdates.split(",") if day])
+
+    def to_row(self, email):
+        return {"Email": email, "Task": self.task, "Start": self.start.strftime(EVENT_TIME_FORMAT),
+                "End": self.end.strftime(EVENT_TIME_FORMAT), "RRule": "" if self.rule is None else str(self.rule),
+                "ExDates": ",".join(day.isoformat() for day in sorted(self.exdates))}
+
+
+# Empty CSV cells come back as NaN
+def _text(value):
+    return "" if value is None or pd.isna(value) else str(value)
+
+
+# Events for a frame of stored event rows (column lists rather than
+# to_dict, which costs about a millisecond per frame even when it is empty)
+def events_from_frame(events_df):
+    columns = list(events_df.columns)
+    return [Event.from_row(dict(zip(columns, values)))
+            for values in zip(*(events_df[column].tolist() for column in columns))]
+
+
+# One weekly slot (weekday number, Monday = 0, and start/end minutes) as an
+# event repeating every week; None for an unknown day or an empty slot
+def weekly_event(task, day, start, end):
+    minutes = (int(end) - int(start)) % MINUTES_PER_DAY
+    if day < 0 or not minutes:
+        return None
+    first = datetime.combine(WEEKLY_EPOCH + timedelta(days=int(day)), time()) + timedelta(minutes=int(start))
+    return Event(task, first, first + timedelta(minutes=minutes), RecurrenceRule("WEEKLY"))
+
+# The weekly schedule (weekday rows) as events repeating every week
+def weekly_events(schedule_df):
+    schedule_df = typed_schedule_frame(schedule_df)
+    events = (weekly_event(task, day, start, end)
+              for task, day, start, end in zip(schedule_df["Task"], schedule_df["Day"].cat.codes,
+                                               schedule_df["Start"], schedule_df["End"]))
+    return [event for event in events if event is not None]
+
+
+# Every occurrence of several events in [range_start, range_end), merged into
+# start order lazily: nothing beyond what the caller consumes is expanded
+def expand(events, range_start, range_end):
+    return heapq.merge(*(event.occurrences(range_start, range_end) for event in events))
+
+
+def _midnight(day):
+    return datetime.combine(day, time())
+
+
+# The per-date pieces of [start, end) as (date, start minute, end minute)
+def _pieces(start, end):
+    day = start.date()
+    while _midnight(day) < end:
+        piece_start = max(start, _midnight(day)) - _midnight(day)
+        piece_end = min(end, _midnight(day + timedelta(days=1))) - _midnight(day)
+        yield day, piece_start // timedelta(minutes=1), piece_end // timedelta(minutes=1)
+        day += timedelta(days=1)
+
+
+# Busy time of one user on real dates, for overlap and free-time queries.
+#
+# Occurrences are expanded lazily into one DayIntervalIndex per date, FILL_DAYS
+# at a time, and kept, so repeated queries over the same weeks are binary
+# searches. An occurrence that runs past midnight is split across both dates.
+class CalendarIndex:
+    def __init__(self, events):
+        self.events = list(events)
+        self._days = {}
+        self._lock = threading.Lock()
+
+    def occurrences(self, range_start, range_end):
+        return expand(self.events, range_start, range_end)
+
+    # DayIntervalIndex of the busy minutes on one date
+    def day(self, day):
+        with self._lock:
+            index = self._days.get(day)
+            if index is None:
+                self._fill(day, day + timedelta(days=FILL_DAYS))
+                index = self._days[day]
+            return index
+
+    # Index the dates in [first, last) that are not indexed yet (caller holds the lock)
+    def _fill(self, first, last):
+        missing = [first + timedelta(days=k) for k in range((last - first).days)]
+        missing = {day: [] for day in missing if day not in self._days}
+        if not missing:
+            return
+        for start, end, task in self.occurrences(_midnight(min(missing)), _midnight(max(missing) + timedelta(days=1))):
+            for day, piece_start, piece_end in _pieces(start, end):
+                if day in missing:
+                    missing[day].append((piece_start, piece_end, task))
+        for day, intervals in missing.items():
+            self._days[day] = DayIntervalIndex(intervals)
+
+    def overlaps(self, start, end):
+        return any(self.day(day).overlaps(piece_start, piece_end) for day, piece_start, piece_end in _pieces(start, end))
+
+    # Whether any of the (start, end) intervals, sorted by start, overlaps an
+    # occurrence. One merged pass over both streams without indexing the dates
+    # in between, for checking a long run of occurrences (a year of a weekly
+    # booking) against many calendars.
+    def overlaps_any(self, intervals):
+        if not intervals:
+            return False
+        busy = ((start, end, True) for start, end, _ in self.occurrences(intervals[0][0], intervals[-1][1]))
+        busy_until = asked_until = datetime.min
+        for start, end, is_busy in heapq.merge(busy, ((start, end, False) for start, end in intervals)):
+            if start < (asked_until if is_busy else busy_until):
+                return True
+            if is_busy:
+                busy_until = max(busy_until, end)
+            else:
+                asked_until = max(asked_until, end)
+        return False
+
+    # Free (start, end) datetimes of at least `minutes` within [range_start, range_end),
+    # only inside the daily (start, end) minute window if working_hours is given
+    def free_time(self, range_start, range_end, minutes, working_hours=None):
+        return shared_free_time([self], range_start, range_end, minutes, working_hours)
+
+
+# Minutes of [low, high) where at most max_busy of the given day indexes are
+# busy, as (start, end) gaps. Each index contributes its merged blocks as
+# sorted +1/-1 boundaries; the boundaries of all members are merged lazily
+# into one sweep, so a day costs O(B log N) for B blocks across N members.
+def _shared_gaps(day_indexes, low, high, max_busy=0):
+    boundaries = heapq.merge(*([(boundary, delta) for start, end in index.blocks(low, high)
+                                for boundary, delta in ((start, 1), (end, -1))] for index in day_indexes))
+    gaps = []
+    busy = 0
+    free_from = low
+    # At equal minutes ends (-1) sort before starts (+1), so back-to-back
+    # bookings of different members leave no sliver of shared free time
+    for minute, delta in boundaries:
+        was_free = busy <= max_busy
+        busy += delta
+        if was_free and busy > max_busy:
+            if minute > free_from:
+                gaps.append((free_from, minute))
+        elif not was_free and busy <= max_busy:
+            free_from = minute
+    if busy <= max_busy and high > free_from:
+        gaps.append((free_from, high))
+    return gaps
+
+
+# Free (start, end) datetimes of at least `minutes` that several calendars
+# share within [range_start, range_end), only inside the daily (start, end)
+# minute window if working_hours is given. With max_busy > 0 a window only
+# needs all but that many members to be free.
+def shared_free_time(calendars, range_start, range_end, minutes, working_hours=None, max_busy=0):
+    window_start, window_end = working_hours or (0, MINUTES_PER_DAY)
+    free = []
+    for day, piece_start, piece_end in _pieces(range_start, range_end):
+        low, high = max(piece_start, window_start), min(piece_end, window_end)
+        if low >= high:
+            continue
+        for gap_start, gap_end in _shared_gaps([calendar.day(day) for calendar in calendars], low, high, max_busy):
+            gap_start, gap_end = _midnight(day) + timedelta(minutes=gap_start), _midnight(day) + timedelta(minutes=gap_end)
+            # Free time running through midnight is one gap
+            if free and free[-1][1] == gap_start:
+                free[-1] = (free[-1][0], gap_end)
+            else:
+                free.append((gap_start, gap_end))
+    return [(start, end) for start, end in free if end - start >= timedelta(minutes=minutes)]
+
+
+# Process-wide cache of per-user calendar indexes, tagged with the storage
+# versions they were built from; a write anywhere makes the next get rebuild
+class CalendarCache:
+    def __init__(self, max_users=1024):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email, version, loader):
+        return self.get_many({email: version}, lambda emails: {email: loader()})[0]
+
+    # Calendars of several users given {email: version}, in that order. The
+    # missing or stale ones are built from one loader(emails) -> {email: events}
+    # call, so a group is loaded in a few queries rather than a few per member.
+    def get_many(self, versions, loader):
+        calendars = {}
+        with self._lock:
+            for email, version in versions.items():
+                entry = self._entries.get(email)
+                if entry is not None and entry[0] == version:
+                    self._entries.move_to_end(email)
+                    calendars[email] = entry[1]
+        missing = [email for email in versions if email not in calendars]
+        if missing:
+            events = loader(missing)
+            built = {email: CalendarIndex(events.get(email, ())) for email in missing}
+            with self._lock:
+                for email, calendar in built.items():
+                    self._entries[email] = (versions[email], calendar)
+                    self._entries.move_to_end(email)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+            calendars.update(built)
+        return [calendars[email] for email in versions]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+# Shared by every Streamlit session in this process
+calendar_indexes = CalendarCache()
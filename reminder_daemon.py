@@ -0,0 +1,178 @@
+import heapq
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from records import flag_column
+
+# Default time before the deadline at which the reminder is sent
+DEFAULT_LEAD_TIME = timedelta(days=1)
+
+# How often the storage change feed is checked for edited todos
+DEFAULT_POLL_INTERVAL = 30
+
+
+# Reminder email text for a todo
+def reminder_message(task, deadline):
+    subject = f"Reminder: Task '{task}' deadline approaching"
+    body = f"Hi,\n\nThis is a reminder that your task '{task}' is due on {deadline}. Please complete it soon."
+    return subject, body
+
+
+# Outbox dedupe key of the reminder for a todo key (see ReminderDaemon)
+def reminder_key(key):
+    email, task, deadline, copy = key
+    return f"reminder\n{email}\n{task}\n{deadline.date()}\n{copy}"
+
+
+# Sends deadline reminders for every todo with Reminder=True.
+#
+# Upcoming (deadline - lead time) events for all users are kept in a min-heap.
+# The daemon sleeps until the next event or the next change-feed check, and on
+# a change only reloads the users whose todos were written. Heap entries are
+# invalidated lazily: an entry only fires if it still matches the user's
+# current todo. Reminders that come due late (a todo added on its deadline
+# day, a daemon that was down) still go out until the deadline day is over.
+# Sent reminders are recorded in the reminders_sent table of state_file (a
+# file of its own, not the mail queue's) so a restart does not send them
+# twice; the message is queued under the same key first, so a crash between
+# the two writes neither loses nor repeats it.
+#
+# Todos have no id in storage, so each one is keyed by (email, task, deadline,
+# copy), where copy counts the user's earlier todos with the same task and
+# deadline. Todos sharing a name get a reminder each, and the key survives
+# edits to the user's other todos, which a row position would not.
+class ReminderDaemon:
+    def __init__(self, storage, mail_queue, state_file, lead_time=DEFAULT_LEAD_TIME,
+                 poll_interval=DEFAULT_POLL_INTERVAL):
+        self.storage = storage
+        self.mail_queue = mail_queue
+        self.lead_time = lead_time
+        self.poll_interval = poll_interval
+        self._heap = []
+        self._pending = {}
+        self._by_user = {}
+        self._cursor = None
+        self._stop = threading.Event()
+        self._state = sqlite3.connect(state_file, timeout=30, isolation_level=None, check_same_thread=False)
+        self._state.execute(
+            'CREATE TABLE IF NOT EXISTS reminders_sent ("Email" TEXT NOT NULL, "Task" TEXT NOT NULL, '
+            '"Deadline" TEXT NOT NULL, "Copy" INTEGER NOT NULL, "Sent" TEXT NOT NULL, '
+            'PRIMARY KEY ("Email", "Task", "Deadline", "Copy"))'
+        )
+
+    def __len__(self):
+        return len(self._pending)
+
+    # Replace the pending reminders for the users present in todo_df
+    def _schedule(self, todo_df, emails):
+        for email in emails:
+            for key in self._by_user.pop(email, ()):
+                self._pending.pop(key, None)
+
+        wanted = (flag_column(todo_df["Reminder"]) & (todo_df["Status"] != "Completed").to_numpy()).tolist()
+        # Copies are counted over all of a user's todos, so completing one
+        # duplicate does not change the key of another
+        copies = {}
+        for email, task, deadline, wants in zip(todo_df["Email"], todo_df["Task"],
+                                                pd.to_datetime(todo_df["Deadline"]), wanted):
+            deadline = deadline.to_pydatetime()
+            key = (email, task, deadline, copies.get((email, task, deadline), 0))
+            copies[key[:3]] = key[3] + 1
+            if not wants:
+                continue
+            fire_at = deadline - self.lead_time
+            self._pending[key] = fire_at
+            self._by_user.setdefault(email, set()).add(key)
+            heapq.heappush(self._heap, (fire_at, key))
+
+    # Pick up todo edits since the last check; the first call loads everything
+    def refresh(self):
+        cursor, changed = self.storage.changes_since("todo", self._cursor)
+        if changed is None:
+            todo_df = self.storage.load_todo_tasks()
+            self._heap, self._pending, self._by_user = [], {}, {}
+            self._schedule(todo_df, [])
+        else:
+            for email in changed:
+                self._schedule(self.storage.load_todo_tasks(email), [email])
+        self._cursor = cursor
+
+        # Drop stale heap entries once they outnumber the live ones
+        if len(self._heap) > 2 * len(self._pending) + 1024:
+            self._heap = [(fire_at, key) for key, fire_at in self._pending.items()]
+            heapq.heapify(self._heap)
+
+    # Send every reminder that is due at now; returns how many were queued
+    def fire_due(self, now=None):
+        now = datetime.now() if now is None else now
+        sent = 0
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, key = heapq.heappop(self._heap)
+            if self._pending.get(key) != fire_at:
+                continue
+            email, task, deadline, copy = key
+            del self._pending[key]
+            self._by_user.get(email, set()).discard(key)
+            if now >= deadline + timedelta(days=1) or self._already_sent(key):
+                continue
+            subject, body = reminder_message(task, deadline.date())
+            self.mail_queue.enqueue(email, subject, body, dedupe_key=reminder_key(key))
+            self._state.execute(
+                'INSERT OR IGNORE INTO reminders_sent ("Email", "Task", "Deadline", "Copy", "Sent") VALUES (?, ?, ?, ?, ?)',
+                (email, task, str(deadline.date()), copy, str(now)),
+            )
+            sent += 1
+        return sent
+
+    def _already_sent(self, key):
+        email, task, deadline, copy = key
+        return self._state.execute(
+            'SELECT 1 FROM reminders_sent WHERE "Email" = ? AND "Task" = ? AND "Deadline" = ? AND "Copy" = ?',
+            (email, task, str(deadline.date()), copy),
+        ).fetchone() is not None
+
+    # Seconds until the next live event, capped at the poll interval
+    def next_wakeup(self, now=None):
+        now = datetime.now() if now is None else now
+        while self._heap and self._pending.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        if not self._heap:
+            return self.poll_interval
+        return max(0.0, min(self.poll_interval, (self._heap[0][0] - now).total_seconds()))
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            self.refresh()
+            self.fire_due()
+            self._stop.wait(self.next_wakeup())
+
+    def stop(self):
+        self._stop.set()
+
+
+# Command line entry point: run the reminder daemon against the app's storage
+def main():
+    import argparse
+    import core
+
+    parser = argparse.ArgumentParser(description="Send Schedule App deadline reminders.")
+    parser.add_argument("--lead-hours", type=float, default=DEFAULT_LEAD_TIME.total_seconds() / 3600,
+                        help="hours before the deadline to send the reminder")
+    parser.add_argument("--poll-interval", type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="seconds between checks for edited todos")
+    parser.add_argument("--state", default=core.REMINDER_STATE_FILE, help="SQLite file recording sent reminders")
+    args = parser.parse_args()
+
+    daemon = ReminderDaemon(core.get_storage(), core.get_mail_queue(), args.state,
+                            timedelta(hours=args.lead_hours), args.poll_interval)
+    try:
+        daemon.run_forever()
+    except KeyboardInterrupt:
+        daemon.stop()
+
+
+if __name__ == "__main__":
+    main()
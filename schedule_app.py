@@ -1,112 +1,61 @@
 import streamlit as st
-import pandas as pd
-from datetime import datetime, timedelta
-import hashlib
+from datetime import date, datetime, time, timedelta
 import os
-import random
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import matplotlib.pyplot as plt
 import re
-
-
-# CSV filenames for storing user, todo, and schedule data
-USERS_FILE = "users.csv"
-TODO_FILE = "todo_tasks.csv"
-SCHEDULE_FILE = "schedule_tasks.csv"
-VERIFICATION_CODE_FILE = "verification_codes.csv"
-
-# Email configuration for the app's email
-APP_EMAIL = "xyz@email.com"  # Use your app-specific email here
-APP_PASSWORD = "xyz"  # Use your app-specific password here (App Password for Gmail)
-SMTP_SERVER = "smtp.gmail.com"
-SMTP_PORT = 587
-
-# Hash password for secure storage
-def hash_password(password):
-    return hashlib.sha256(password.encode()).hexdigest()
-
-# Ensure the necessary CSV files exist
-def ensure_csv_exists(filename, columns):
-    if not os.path.exists(filename):
-        pd.DataFrame(columns=columns).to_csv(filename, index=False)
-
-# Ensure the user accounts CSV file exists
-def ensure_users_file():
-    ensure_csv_exists(USERS_FILE, ["Email", "Password"])
-
-# Ensure the verification codes CSV file exists
-def ensure_verification_code_file():
-    ensure_csv_exists(VERIFICATION_CODE_FILE, ["Email", "VerificationCode", "Timestamp"])
-
-# Send verification code to email
-def send_verification_code(email, code):
+import core
+from core import (ADMIN_EMAILS, ScheduleConflictError, auto_schedule_tasks, book_group_event, calendar_occurrences,
+                  cancel_occurrence, delete_event, delete_schedule_task, delete_todo_task, find_free_time, find_group_free_time,
+                  get_storage, load_events, load_schedule_tasks, load_stats_rollup,
+                  load_todo_tasks, load_user_stats, save_schedule_tasks_bulk, save_todo_task, save_todo_tasks_bulk,
+                  suggest_schedule, update_task, validate_user)
+from bulk import BulkImportError, export_tasks
+from cache import task_cache
+from charts import chart_renderer
+from intervals import DayIntervalIndex
+from metrics import measure, metrics, timed
+from profiler import profile, recent_profiles
+from records import DAYS_OF_WEEK, PRIORITIES, STATUSES, format_minutes, format_schedule_frame, parse_minutes
+
+# Storage, mail and auth settings live in core.py
+
+# Show internal diagnostics (cache counters etc.) in the sidebar
+DEBUG = os.environ.get("SCHEDULE_APP_DEBUG", "") not in ("", "0")
+
+# Charts: "image" (matplotlib PNGs, cached and rendered off-thread) or
+# "native" (Streamlit's built-in charts, no rendering on the server)
+CHART_BACKEND = os.environ.get("SCHEDULE_APP_CHARTS", "image")
+
+# Optional HTTP service (service.py) that runs the suggestion and analytics
+# calls instead of this process; it must share SCHEDULE_APP_SERVICE_SECRET
+SERVICE_URL = os.environ.get("SCHEDULE_APP_SERVICE_URL")
+
+# Write a sampling profile of every rerun (collapsed stacks for flame graphs) here
+PROFILE_DIR = os.environ.get("SCHEDULE_APP_PROFILE_DIR")
+
+# Client for the remote service, or None to compute everything locally
+def get_service_client():
+    if not SERVICE_URL:
+        return None
+    from service import ServiceClient
+    return ServiceClient(SERVICE_URL)
+
+# Email a new verification code, replacing any earlier one for this email
+def request_verification_code(email):
     try:
-        # Create message
-        message = MIMEMultipart("alternative")
-        message["Subject"] = "Your Verification Code"
-        message["From"] = APP_EMAIL
-        message["To"] = email
-
-        text = f"Hi there,\n\nYour verification code is {code}. Please enter this code in the app to complete your registration. The code is valid for 5 minutes."
-        part1 = MIMEText(text, "plain")
-        message.attach(part1)
-
-        # Send email
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(APP_EMAIL, APP_PASSWORD)
-            server.sendmail(APP_EMAIL, email, message.as_string())
-
-        st.success(f"Verification code sent to {email}")
+        core.request_verification_code(email)
+        st.success(f"Verification code queued for {email}")
     except Exception as e:
         st.error(f"Error sending verification code: {e}")
 
 # Register new user after verification
 def register_user(email, password, code_entered):
-    ensure_users_file()
-    ensure_verification_code_file()
-
-    users_df = pd.read_csv(USERS_FILE)
-    codes_df = pd.read_csv(VERIFICATION_CODE_FILE)
-    hashed_password = hash_password(password)
-
-    # Check if email already exists in users
-    if email in users_df["Email"].values:
-        st.error("User already exists.")
-        return False
-
-    # Check if the verification code matches and is still valid (within 5 minutes)
-    code_entry = codes_df[codes_df["Email"] == email]
-    
-    if not code_entry.empty:
-        saved_code = str(code_entry["VerificationCode"].iloc[0]).strip()
-        timestamp = pd.to_datetime(code_entry["Timestamp"].iloc[0])
-        current_time = datetime.now()
-        code_entered_cleaned = code_entered.strip()
-
-        if saved_code == code_entered_cleaned and current_time <= timestamp + timedelta(minutes=5):
-            # Add the user to the users CSV
-            new_user = pd.DataFrame({"Email": [email], "Password": [hashed_password]})
-            users_df = pd.concat([users_df, new_user], ignore_index=True)
-            users_df.to_csv(USERS_FILE, index=False)
-
-            # Remove the verification code after successful registration
-            codes_df = codes_df[codes_df["Email"] != email]
-            codes_df.to_csv(VERIFICATION_CODE_FILE, index=False)
-
-            st.success("User account created!")
-            return True
-        else:
-            if saved_code != code_entered_cleaned:
-                st.error("The verification code you entered is incorrect.")
-            elif current_time > timestamp + timedelta(minutes=5):
-                st.error("The verification code has expired.")
-            return False
-    else:
-        st.error("No verification code found for this email.")
+    try:
+        core.register_user(email, password, code_entered)
+    except core.RegistrationError as e:
+        st.error(str(e))
         return False
+    st.success("User account created!")
+    return True
 
 # Registration Page with Email Verification
 def registration_page():
@@ -116,25 +65,7 @@ def registration_page():
 
     if st.button("Send Verification Code"):
         if email and password:
-            ensure_verification_code_file()
-            codes_df = pd.read_csv(VERIFICATION_CODE_FILE)
-
-            # Generate a verification code
-            verification_code = str(random.randint(100000, 999999))
-            send_verification_code(email, verification_code)
-
-            # Check if the email already exists in the verification codes file
-            existing_code = codes_df[codes_df["Email"] == email]
-            if not existing_code.empty:
-                # If the email already has a code, update it
-                codes_df.loc[codes_df["Email"] == email, "VerificationCode"] = verification_code
-                codes_df.loc[codes_df["Email"] == email, "Timestamp"] = datetime.now()
-            else:
-                # Otherwise, add a new entry
-                new_entry = pd.DataFrame({"Email": [email], "VerificationCode": [verification_code], "Timestamp": [datetime.now()]})
-                codes_df = pd.concat([codes_df, new_entry], ignore_index=True)
-
-            codes_df.to_csv(VERIFICATION_CODE_FILE, index=False)
+            request_verification_code(email)
         else:
             st.error("Please enter your email and password.")
 
@@ -147,181 +78,67 @@ def registration_page():
         else:
             st.error("Please fill out all fields.")
 
-# To-Do List Functions
-def load_todo_tasks():
-    ensure_csv_exists(TODO_FILE, ["Email", "Task", "Deadline", "Status", "Time Needed", "Priority", "Reminder"])
-    return pd.read_csv(TODO_FILE)
-
-def save_todo_task(email, task, deadline, status, time_needed, priority, reminder):
-    todo_df = load_todo_tasks()
-    new_task = pd.DataFrame({"Email": [email], "Task": [task], "Deadline": [deadline], 
-                             "Status": [status], "Time Needed": [time_needed], 
-                             "Priority": [priority], "Reminder": [reminder]})
-    todo_df = pd.concat([todo_df, new_task], ignore_index=True)
-    todo_df.to_csv(TODO_FILE, index=False)
-
-def update_task(email, task, new_status, new_time_needed=None):
-    todo_df = load_todo_tasks()
-    if new_time_needed is not None:
-        todo_df.loc[(todo_df['Email'] == email) & (todo_df['Task'] == task), ['Status', 'Time Needed']] = [new_status, new_time_needed]
-    else:
-        todo_df.loc[(todo_df['Email'] == email) & (todo_df['Task'] == task), 'Status'] = new_status
-    todo_df.to_csv(TODO_FILE, index=False)
-
-def delete_todo_task(email, task):
-    todo_df = load_todo_tasks()
-    todo_df = todo_df[(todo_df['Email'] != email) | (todo_df['Task'] != task)]
-    todo_df.to_csv(TODO_FILE, index=False)
-
-# Send email reminders for tasks
-def send_email_reminder(email, task, deadline):
+def save_schedule_task(email, task, day, time_from, time_to):
     try:
-        # Create message
-        message = MIMEMultipart("alternative")
-        message["Subject"] = f"Reminder: Task '{task}' deadline approaching"
-        message["From"] = APP_EMAIL
-        message["To"] = email
-
-        text = f"Hi,\n\nThis is a reminder that your task '{task}' is due on {deadline}. Please complete it soon."
-        part1 = MIMEText(text, "plain")
-        message.attach(part1)
-
-        # Send email
-        with smtplib.SMTP(SMTP_SERVER, SMTP_PORT) as server:
-            server.starttls()
-            server.login(APP_EMAIL, APP_PASSWORD)
-            server.sendmail(APP_EMAIL, email, message.as_string())
-
-        st.success(f"Reminder email sent to {email}")
-    except Exception as e:
-        st.error(f"Error sending reminder email: {e}")
-
-# Schedule Functions
-def load_schedule_tasks():
-    ensure_csv_exists(SCHEDULE_FILE, ["Email", "Task", "Day", "Time From", "Time To"])
-    return pd.read_csv(SCHEDULE_FILE)
-
-# Check if a task overlaps with an existing task
-def check_overlap(email, day, time_from, time_to):
-    schedule_df = load_schedule_tasks()
-    day_tasks = schedule_df[(schedule_df["Day"] == day) & (schedule_df["Email"] == email)]
-    time_from_dt = datetime.strptime(time_from, "%I:%M %p")
-    time_to_dt = datetime.strptime(time_to, "%I:%M %p")
-    for _, task in day_tasks.iterrows():
-        task_start = datetime.strptime(task["Time From"], "%I:%M %p")
-        task_end = datetime.strptime(task["Time To"], "%I:%M %p")
-        if not (time_to_dt <= task_start or time_from_dt >= task_end):
-            return True
-    return False
+        core.save_schedule_task(email, task, day, time_from, time_to)
+    except ScheduleConflictError as e:
+        st.error(str(e))
 
-def save_schedule_task(email, task, day, time_from, time_to):
-    if check_overlap(email, day, time_from, time_to):
-        st.error(f"Task overlaps with another task on {day}. Please select a different time.")
-    else:
-        schedule_df = load_schedule_tasks()
-        new_task = pd.DataFrame({"Email": [email], "Task": [task], "Day": [day], 
-                                 "Time From": [time_from], "Time To": [time_to]})
-        schedule_df = pd.concat([schedule_df, new_task], ignore_index=True)
-        schedule_df.to_csv(SCHEDULE_FILE, index=False)
-
-def delete_schedule_task(email, task, day):
-    schedule_df = load_schedule_tasks()
-    schedule_df = schedule_df[(schedule_df['Email'] != email) | (schedule_df['Task'] != task) | (schedule_df['Day'] != day)]
-    schedule_df.to_csv(SCHEDULE_FILE, index=False)
-
-# Suggested Schedule: Add To-Do List tasks to available time slots in daily schedule
+# Add a dated (optionally recurring) event; returns False and shows why if it clashes
+def save_event(email, task, start, end, rrule=""):
+    try:
+        core.save_event(email, task, start, end, rrule)
+    except ValueError as e:
+        st.error(str(e))
+        return False
+    return True
+
+# Start and end datetimes of a "05:30 PM - 06:30 PM" slot on a date; an end
+# before the start runs past midnight
+def slot_datetimes(day, slot):
+    time_from, time_to = slot.split(" - ")
+    start = datetime.combine(day, time()) + timedelta(minutes=parse_minutes(time_from))
+    end = datetime.combine(day, time()) + timedelta(minutes=parse_minutes(time_to))
+    return start, end if end >= start else end + timedelta(days=1)
+
+# Suggested Schedule: Add To-Do List tasks to available time slots on the coming dates
+@timed("schedule_app.add_todo_tasks_to_schedule")
 def add_todo_tasks_to_schedule(email):
-    todo_df = load_todo_tasks()
-    schedule_df = load_schedule_tasks()
-    user_tasks = todo_df[todo_df["Email"] == email]
-    
-    suggested_schedule = {}
-    time_per_day_per_task = {}
-
-    # Iterate through each task
-    for index, row in user_tasks.iterrows():
-        task = row["Task"]
-        time_needed = row["Time Needed"]
-        deadline = pd.to_datetime(row["Deadline"])
-        days_until_deadline = (deadline - pd.Timestamp.now()).days
-        
-        # Divide time needed by (days until deadline - 2) for review
-        if days_until_deadline > 2:
-            time_per_day = time_needed // (days_until_deadline - 2)
-        else:
-            time_per_day = time_needed
-        
-        time_per_day_per_task[task] = time_per_day
-
-        # Find free time slots for each day of the week (prioritize afternoon)
-        available_slots = {}
-        for day in ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]:
-            afternoon_slots = find_free_time_slots(schedule_df, time_per_day, email, day, prefer_afternoon=True)
-            if afternoon_slots:
-                available_slots[day] = afternoon_slots
-            else:
-                morning_slots = find_free_time_slots(schedule_df, time_per_day, email, day, prefer_afternoon=False)
-                available_slots[day] = morning_slots
-        
-        # Store the suggested schedule for each task
-        suggested_schedule[task] = available_slots
+    # Plan slots for every task at once against the user's calendar
+    client = get_service_client()
+    suggested_schedule, time_per_day_per_task, task_names = client.suggestions(email) if client else suggest_schedule(email)
     
     # Display the suggested schedule to the user with selectable boxes
     st.subheader("Suggested Schedule")
     selected_slots = {}
     used_time_slots = {}
 
-    for task, day_slots in suggested_schedule.items():
+    for row, day_slots in suggested_schedule.items():
+        task = task_names[row]
         st.write(f"Task: {task}")
-        selected_slots[task] = {}
+        selected_slots[row] = {}
+        minutes = time_per_day_per_task[row]
         for day, slots in day_slots.items():
-            if slots:
-                # Create time options and avoid previously selected times
-                available_slots = [f"{slot.strftime('%I:%M %p')} - {(slot + timedelta(minutes=time_per_day_per_task[task])).strftime('%I:%M %p')}" for slot in slots if slot not in used_time_slots]
-                selected_slot = st.selectbox(f"Select time for {task} on {day}", available_slots, key=f"{task}_{day}")
-                selected_slots[task][day] = selected_slot
+            # Avoid times that overlap slots already selected for earlier tasks
+            used = used_time_slots.setdefault(day, DayIntervalIndex())
+            available_slots = [f"{format_minutes(slot)} - {format_minutes(slot + minutes)}" for slot in slots if not used.overlaps(slot, slot + minutes)]
+            if available_slots:
+                label = date.fromisoformat(day).strftime("%A %d %b")
+                selected_slot = st.selectbox(f"Select time for {task} on {label}", available_slots, key=f"suggestion_{row}_{day}")
+                selected_slots[row][day] = selected_slot
                 # Track the selected time slots to prevent overlap
-                used_time_slots[selected_slot] = (task, day)
+                slot_start = parse_minutes(selected_slot.split(" - ")[0])
+                used.add(slot_start, slot_start + minutes, task)
 
-    # Button to add the selected tasks to the schedule
+    # Button to add the selected tasks to the weekly schedule on the weekday of each slot's date
     if st.button("Add Selected Tasks to Daily Schedule"):
-        for task, day_slots in selected_slots.items():
-            for day, time in day_slots.items():
-                time_from_str, time_to_str = time.split(" - ")
-                time_from = datetime.strptime(time_from_str, '%I:%M %p')
-                time_to = datetime.strptime(time_to_str, '%I:%M %p')
-                save_schedule_task(email, task, day, time_from.strftime("%I:%M %p"), time_to.strftime("%I:%M %p"))
+        for row, day_slots in selected_slots.items():
+            for day, slot in day_slots.items():
+                time_from, time_to = slot.split(" - ")
+                save_schedule_task(email, task_names[row], date.fromisoformat(day).strftime("%A"), time_from, time_to)
+        st.session_state["show_suggestions"] = False
         st.success("Selected tasks have been added to your schedule!")
 
-# Find free time slots in the schedule for a specific day, with an option to prioritize afternoon
-def find_free_time_slots(schedule_df, time_needed, email, day, prefer_afternoon=True):
-    day_tasks = schedule_df[(schedule_df["Day"] == day) & (schedule_df["Email"] == email)]
-    
-    # If no tasks are scheduled for this day, return a free slot starting from the desired time
-    start_time = "12:00 PM" if prefer_afternoon else "09:00 AM"
-    if day_tasks.empty:
-        return [datetime.strptime(start_time, "%I:%M %p")]
-    
-    free_time_slots = []
-    end_of_previous_task = datetime.strptime(start_time, "%I:%M %p")
-    
-    # Sort tasks by start time
-    day_tasks = day_tasks.sort_values("Time From")
-    
-    for _, task in day_tasks.iterrows():
-        start_of_next_task = datetime.strptime(task["Time From"], "%I:%M %p")
-        free_time = (start_of_next_task - end_of_previous_task).total_seconds() / 60
-        if free_time >= time_needed:
-            free_time_slots.append(end_of_previous_task)
-        end_of_previous_task = datetime.strptime(task["Time To"], "%I:%M %p")
-    
-    # Check if there is free time after the last task of the day
-    end_of_day = datetime.strptime("06:00 PM", "%I:%M %p")
-    free_time_after_last_task = (end_of_day - end_of_previous_task).total_seconds() / 60
-    if free_time_after_last_task >= time_needed:
-        free_time_slots.append(end_of_previous_task)
-    
-    return free_time_slots
 
 # Convert minutes to hours and minutes for display
 def format_time(minutes):
@@ -339,45 +156,162 @@ def parse_time_needed(time_string):
     else:
         return 0  # Default to 0 if parsing fails
 
+# Start rendering a page's non-empty charts in parallel before they are shown
+def prefetch_charts(charts):
+    if CHART_BACKEND != "native":
+        chart_renderer.prefetch([(kind, data) for kind, data in charts if not data.empty])
+
+# Draw a chart: a cached PNG rendered off-thread, or Streamlit's native charts
+def show_chart(kind, data):
+    if CHART_BACKEND == "native":
+        if kind == "completion_trend":
+            st.bar_chart(data[["Tasks", "Completed"]])
+        else:
+            st.bar_chart(data)
+    else:
+        st.image(chart_renderer.render(kind, data))
+
 # Visualization functions
-def visualize_status(tasks, title):
+def visualize_status(status_counts, title):
     st.subheader(f"{title} Task Status Distribution")
-    if not tasks.empty:
-        status_counts = tasks["Status"].value_counts()
-        fig, ax = plt.subplots()
-        ax.pie(status_counts, labels=status_counts.index, autopct='%1.1f%%', startangle=90)
-        ax.axis('equal')
-        st.pyplot(fig)
-
-# Visualization of working time per day of the week
-def visualize_weekly_working_time(schedule_tasks):
+    if not status_counts.empty:
+        show_chart("status", status_counts)
+
+# Visualization of working time per day of the week, from hours per weekday
+def visualize_weekly_working_time(working_time_per_day):
     st.subheader("Weekly Working Time Overview")
 
     # Ensure the schedule is not empty
-    if schedule_tasks.empty:
+    if working_time_per_day.empty:
         st.write("No tasks scheduled for the week.")
         return
 
-    # Convert "Time From" and "Time To" to datetime objects to calculate time duration
-    schedule_tasks['Time From'] = pd.to_datetime(schedule_tasks['Time From'], format='%I:%M %p')
-    schedule_tasks['Time To'] = pd.to_datetime(schedule_tasks['Time To'], format='%I:%M %p')
-
-    # Calculate the duration of each task in hours
-    schedule_tasks['Task Duration'] = (schedule_tasks['Time To'] - schedule_tasks['Time From']).dt.total_seconds() / 3600
-
-    # Group by day of the week and sum the task durations to get total working time per day
-    working_time_per_day = schedule_tasks.groupby('Day')['Task Duration'].sum()
-
     # Plot the working time for each day of the week
-    fig, ax = plt.subplots()
-    working_time_per_day.plot(kind="bar", color="blue", ax=ax)
+    show_chart("weekly_working_time", working_time_per_day)
 
-    ax.set_xlabel("Days of the Week")
-    ax.set_ylabel("Total Working Time (hours)")
-    ax.set_title("Working Time on Each Day of the Week")
-    
-    st.pyplot(fig)
+# Share of tasks completed, grouped by the week of their deadline
+def visualize_completion_trend(trend):
+    st.subheader("Completion by Deadline Week")
+    if not trend.empty:
+        show_chart("completion_trend", trend)
     
+# Bulk import from a CSV/iCalendar upload and export of all of a user's
+# "todo" or "schedule" tasks
+def import_export_section(email, kind):
+    label = "Tasks" if kind == "todo" else "Schedule"
+    st.header(f"Import / Export {label}")
+    uploaded = st.file_uploader(f"Import {label.lower()} (CSV or iCalendar)", type=["csv", "ics"], key=f"{kind}_import")
+    if uploaded is not None and st.button(f"Import {label}", key=f"{kind}_import_button"):
+        save_bulk = save_todo_tasks_bulk if kind == "todo" else save_schedule_tasks_bulk
+        try:
+            st.success(f"Imported {save_bulk(email, uploaded)} entries.")
+            st.experimental_set_query_params(**{f"{'tasks' if kind == 'todo' else 'schedule'}_updated": "true"})
+        except BulkImportError as e:
+            for problem in e.problems:
+                st.error(problem)
+
+    # The export is built only when asked for, then offered for download
+    export_format = st.selectbox("Export format", ["csv", "ics"], key=f"{kind}_export_format")
+    if st.button(f"Prepare {label} Export", key=f"{kind}_export_button"):
+        st.session_state[f"{kind}_export"] = (export_format, "".join(export_tasks(get_storage(), kind, email, export_format)))
+    if f"{kind}_export" in st.session_state:
+        export_format, data = st.session_state[f"{kind}_export"]
+        st.download_button(f"Download {label}", data, file_name=f"{kind}_tasks.{export_format}", key=f"{kind}_download")
+
+# Repeat options for dated events, as RRULEs
+REPEAT_RULES = {
+    "Does not repeat": "",
+    "Daily": "FREQ=DAILY",
+    "Every weekday": "FREQ=WEEKLY;BYDAY=MO,TU,WE,TH,FR",
+    "Weekly": "FREQ=WEEKLY",
+    "Every two weeks": "FREQ=WEEKLY;INTERVAL=2",
+}
+
+# Dated and recurring events on top of the weekly schedule: the coming two
+# weeks, adding/cancelling events and free-time lookups over a date range
+def calendar_section(email):
+    st.header("Calendar")
+    today = datetime.now().date()
+    window_start = datetime.combine(today, time())
+    occurrences = calendar_occurrences(email, window_start, window_start + timedelta(days=14))
+    if occurrences:
+        st.write([{"Task": task, "Start": start.strftime("%a %d %b %I:%M %p"), "End": end.strftime("%a %d %b %I:%M %p")}
+                  for start, end, task in occurrences])
+
+    # A start and end time with the end before the start runs past midnight
+    task = st.text_input("Event", key="event_task")
+    event_date = st.date_input("Date", today, key="event_date")
+    time_from = st.time_input("Start Time", key="event_time_from")
+    time_to = st.time_input("End Time", key="event_time_to")
+    repeat = st.selectbox("Repeat", list(REPEAT_RULES), key="event_repeat")
+    until = st.date_input("Repeat until (optional)", None, key="event_until") if REPEAT_RULES[repeat] else None
+    if st.button("Add Event") and task:
+        rrule = REPEAT_RULES[repeat] + (f";UNTIL={until:%Y%m%d}" if until else "")
+        slot = f"{time_from.strftime('%I:%M %p')} - {time_to.strftime('%I:%M %p')}"
+        if save_event(email, task, *slot_datetimes(event_date, slot), rrule):
+            st.success(f"Event '{task}' added.")
+
+    # Skip one date of a recurring event, or remove it altogether
+    events = load_events(email)
+    if not events.empty:
+        labels = {f"{task} (from {start})": (task, start) for task, start in zip(events["Task"], events["Start"])}
+        selected = st.selectbox("Event to change", list(labels), key="event_selected")
+        skip_date = st.date_input("Occurrence date", today, key="event_skip_date")
+        if st.button("Cancel This Occurrence"):
+            cancel_occurrence(email, *labels[selected], skip_date)
+            st.success(f"Cancelled {selected} on {skip_date}.")
+        if st.button("Delete Event"):
+            delete_event(email, *labels[selected])
+            st.success(f"Deleted {selected}.")
+
+    # Free time between two dates within working hours
+    range_end = st.date_input("Find free time until", today + timedelta(days=7), key="free_until")
+    free_minutes = st.number_input("At least (minutes)", min_value=15, value=60, step=15, key="free_minutes")
+    if st.button("Find Free Time"):
+        slots = find_free_time(email, datetime.now(), datetime.combine(range_end, time()) + timedelta(days=1),
+                               free_minutes, working_hours=(9, 18))
+        st.write([f"{start:%a %d %b %I:%M %p} - {end:%I:%M %p}" for start, end in slots] or "No free time in that range.")
+
+    group_section(email)
+
+# Group scheduling: shared free time of several users and one booking for all of them.
+# Found windows are kept in session state so choosing one does not lose them on rerun.
+def group_section(email):
+    st.subheader("Group Availability")
+    others = re.split(r"[,\s]+", st.text_area("Other members' emails", key="group_members"))
+    members = [email] + [member for member in others if member and member != email]
+    group_date = st.date_input("From", datetime.now().date(), key="group_date")
+    span = st.selectbox("Look at", ["That day", "That week"], key="group_span")
+    group_minutes = st.number_input("Meeting length (minutes)", min_value=15, value=60, step=15, key="group_minutes")
+    group_hours = st.slider("Working hours", 0, 24, (9, 18), key="group_hours")
+    if st.button("Find Shared Free Time"):
+        range_start = datetime.combine(group_date, time())
+        range_end = range_start + timedelta(days=7 if span == "That week" else 1)
+        try:
+            windows = find_group_free_time(members, max(range_start, datetime.now()), range_end, group_minutes, group_hours)
+        except ValueError as e:
+            st.error(str(e))
+            windows = []
+        st.session_state["group_windows"] = (members, group_minutes, windows)
+
+    found = st.session_state.get("group_windows")
+    if found and found[0] == members:
+        _, minutes, windows = found
+        if not windows:
+            st.write("No time when everyone is free.")
+            return
+        labels = {f"{start:%a %d %b %I:%M %p} - {end:%I:%M %p}": start for start, end in windows}
+        start = labels[st.selectbox("Shared free time", list(labels), key="group_window")]
+        group_task = st.text_input("Shared task", key="group_task")
+        if st.button("Book for Everyone") and group_task:
+            try:
+                booked = book_group_event(members, group_task, start, start + timedelta(minutes=minutes))
+            except ValueError as e:
+                st.error(str(e))
+            else:
+                del st.session_state["group_windows"]
+                st.success(f"'{group_task}' added to {len(booked)} calendars.")
+
 # To-Do List Page
 def todo_page():
     email = st.session_state.get("email")
@@ -388,9 +322,9 @@ def todo_page():
     
     task = st.text_input("Task")
     deadline = st.date_input("Deadline")
-    status = st.selectbox("Status", ["Pending", "In Progress", "Completed"])
+    status = st.selectbox("Status", STATUSES)
     time_needed = st.number_input("Time Needed (in minutes)", min_value=15, step=15)
-    priority = st.selectbox("Priority", ["High", "Medium", "Low"])
+    priority = st.selectbox("Priority", PRIORITIES)
     reminder = st.checkbox("Set Email Reminder")
 
     if st.button("Add Task"):
@@ -401,16 +335,15 @@ def todo_page():
             st.success("Task Added")
             st.experimental_set_query_params(tasks_updated="true")
             
-            # Schedule the reminder email if set
+            # The reminder daemon emails the user ahead of the deadline (its --lead-hours)
             if reminder:
-                send_email_reminder(email, task, deadline)
+                st.info("You will get an email reminder before the deadline.")
 
     st.header("Current To-Do Tasks")
-    todo_tasks = load_todo_tasks()
-
-    user_tasks = todo_tasks[todo_tasks["Email"] == email].drop(columns=['Email'])
+    user_tasks = load_todo_tasks(email).drop(columns=['Email'])
     
     if not user_tasks.empty:
+        user_tasks["Deadline"] = user_tasks["Deadline"].dt.date
         user_tasks["Time Needed"] = user_tasks["Time Needed"].apply(format_time)
         user_tasks.index = user_tasks.index + 1
         st.write(user_tasks)
@@ -419,7 +352,7 @@ def todo_page():
         
         # Ensure the selected task exists before updating or deleting it
         if not user_tasks[user_tasks["Task"] == task_to_update].empty:
-            new_status = st.selectbox("New Status", ["Pending", "In Progress", "Completed"])
+            new_status = st.selectbox("New Status", STATUSES)
             current_time_needed = parse_time_needed(user_tasks[user_tasks["Task"] == task_to_update]["Time Needed"].iloc[0])
             additional_time_needed = st.number_input("New Time Needed (in minutes)", min_value=15, step=15, value=max(15, current_time_needed))
             if st.button("Update Task"):
@@ -433,6 +366,8 @@ def todo_page():
             st.success(f"Task '{task_to_delete}' Deleted.")
             st.experimental_set_query_params(tasks_updated="true")
 
+    import_export_section(email, "todo")
+
 # Schedule Page
 def schedule_page():
     email = st.session_state.get("email")
@@ -441,28 +376,25 @@ def schedule_page():
         return
     st.title("Daily Schedule")
     
-    days_of_week = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    days_of_week = DAYS_OF_WEEK
+    
+    # Read this user's schedule once and split it per day
+    schedule_tasks = load_schedule_tasks(email)
     
     for day in days_of_week:
         st.subheader(f"Schedule for {day}")
         
-        schedule_tasks = load_schedule_tasks()
-        user_schedule = schedule_tasks[(schedule_tasks["Email"] == email) & (schedule_tasks["Day"] == day)]
+        user_schedule = schedule_tasks[schedule_tasks["Day"] == day]
         
-        # Sort the tasks by 'Time From' in ascending order (handling times in AM/PM format)
+        # Sort the tasks by start time
         if not user_schedule.empty:
-            user_schedule['Time From'] = pd.to_datetime(user_schedule['Time From'], format="%I:%M %p")
-            user_schedule = user_schedule.sort_values(by="Time From")
+            user_schedule = user_schedule.sort_values(by="Start")
             
             # Reset index starting from 1
             user_schedule.index = range(1, len(user_schedule) + 1)
             
-            # Convert 'Time From' back to 12-hour AM/PM format for display
-            user_schedule['Time From'] = user_schedule['Time From'].dt.strftime("%I:%M %p")
-            
-            # Remove the 'Email' column before displaying
-            user_schedule = user_schedule.drop(columns=['Email'])
-            st.write(user_schedule)
+            # Show the times in 12-hour AM/PM format and remove the 'Email' column
+            st.write(format_schedule_frame(user_schedule).drop(columns=['Email']))
         
         # Input fields for adding tasks
         task = st.text_input(f"Task for {day}", key=f"task_{day}")
@@ -484,11 +416,46 @@ def schedule_page():
             st.success(f"Task '{task_to_delete}' deleted for {day}.")
             st.experimental_set_query_params(schedule_updated="true")
 
-    # Suggested schedule to add tasks
+    calendar_section(email)
+
+    import_export_section(email, "schedule")
+
+    # Suggested schedule to add tasks. The panel stays open in session state,
+    # so picking slots (each pick reruns the script) does not close it.
     st.header("Suggested Schedule")
     if st.button("Suggest and Add To-Do List Tasks to Free Time"):
-        add_todo_tasks_to_schedule(email)
+        st.session_state["show_suggestions"] = True
         st.experimental_set_query_params(schedule_updated="true")
+    if st.session_state.get("show_suggestions"):
+        if st.button("Close Suggestions"):
+            st.session_state["show_suggestions"] = False
+        else:
+            add_todo_tasks_to_schedule(email)
+
+    # Auto-schedule every pending task into free working time before its deadline
+    st.header("Auto-Schedule")
+    working_hours = st.slider("Working hours", 0, 24, (9, 18), key="auto_working_hours")
+    # A daily cap per task spreads work over several days; when the greedy
+    # pass cannot fit everything under it, an exact solver (PuLP, if installed) is tried
+    max_minutes = st.number_input("Max minutes per task per day (0 = no limit)", min_value=0, step=30,
+                                  key="auto_max_minutes")
+    if st.button("Auto-Schedule Pending Tasks"):
+        st.session_state["auto_schedule"] = auto_schedule_tasks(email, working_hours,
+                                                                max_minutes_per_day=int(max_minutes) or None, exact=True)
+
+    plan = st.session_state.get("auto_schedule")
+    if plan is not None:
+        st.write(f"Objective score: {plan.score:.0%} of priority-weighted work fits before the deadlines ({plan.method}).")
+        st.write(plan.to_frame())
+        if plan.unscheduled:
+            st.warning("Not enough free time for: " + ", ".join(f"{plan.tasks[row]} ({format_time(minutes)})" for row, minutes in plan.unscheduled.items()))
+        if st.button("Add This Week's Blocks to Daily Schedule"):
+            week_end = datetime.now().date() + timedelta(days=7)
+            for block in plan.blocks:
+                if block["Date"] < week_end:
+                    save_schedule_task(email, block["Task"], block["Day"], block["Time From"], block["Time To"])
+            del st.session_state["auto_schedule"]
+            st.experimental_set_query_params(schedule_updated="true")
 
 # Visualization Page
 def visualization_page():
@@ -498,16 +465,77 @@ def visualization_page():
         return
     st.title("Task Progress Visualizations")
     
-    todo_tasks = load_todo_tasks()
-    
-    user_tasks = todo_tasks[todo_tasks["Email"] == email].drop(columns=['Email'])
-    if not user_tasks.empty:
-        visualize_status(user_tasks, "To-Do")
-
-    schedule_tasks = load_schedule_tasks()
-    user_schedule = schedule_tasks[schedule_tasks["Email"] == email].drop(columns=['Email'])
-    if not user_schedule.empty:
-        visualize_weekly_working_time(user_schedule)
+    # Charts are drawn from the user's precomputed aggregates, all rendering at once
+    client = get_service_client()
+    stats = client.stats(email) if client else load_user_stats(email)
+    status_counts = stats.status_counts()
+    trend = stats.completion_trend()
+    working_time_per_day = stats.weekday_hours()
+    prefetch_charts([("status", status_counts), ("completion_trend", trend), ("weekly_working_time", working_time_per_day)])
+
+    if not status_counts.empty:
+        visualize_status(status_counts, "To-Do")
+        visualize_completion_trend(trend)
+
+    if not working_time_per_day.empty:
+        visualize_weekly_working_time(working_time_per_day)
+
+# Admin Page: totals across all users
+def admin_page():
+    if st.session_state.get("email") not in ADMIN_EMAILS:
+        st.error("You need to be an admin to see this page.")
+        return
+    st.title("Admin Overview")
+
+    stats = load_stats_rollup()
+    status_counts = stats.status_counts()
+    trend = stats.completion_trend()
+    working_time_per_day = stats.weekday_hours()
+    prefetch_charts([("status", status_counts), ("completion_trend", trend), ("weekly_working_time", working_time_per_day)])
+
+    st.write(f"{stats.users} users, {status_counts.sum()} to-do tasks, "
+             f"{sum(stats.weekday_minutes.values()) / 60:.1f} scheduled hours per week")
+    visualize_status(status_counts, "All Users'")
+    visualize_completion_trend(trend)
+    visualize_weekly_working_time(working_time_per_day)
+
+# Diagnostics Page: timings of the instrumented calls, cache counters and profiles (admins only)
+def diagnostics_page():
+    if st.session_state.get("email") not in ADMIN_EMAILS:
+        st.error("You need to be an admin to see this page.")
+        return
+    st.title("Diagnostics")
+
+    series, gauges = metrics.snapshot()
+    st.subheader("Instrumented calls (this process)")
+    if series:
+        rows = []
+        for name, values in series.items():
+            p95 = metrics.quantile(values, 0.95)
+            rows.append({"Name": name, "Calls": values["calls"],
+                         "Mean (ms)": round(values["seconds"] / values["calls"] * 1000, 2),
+                         "p95 ≤ (ms)": None if p95 is None else p95 * 1000,
+                         "Max (ms)": round(values["max_seconds"] * 1000, 2), "Total (s)": round(values["seconds"], 3),
+                         "Rows": values["rows"], "Bytes": values["bytes"], "Errors": values["errors"]})
+        st.dataframe(sorted(rows, key=lambda row: -row["Total (s)"]))
+    st.subheader("Caches")
+    st.write(gauges)
+
+    st.download_button("Download Prometheus metrics", metrics.to_prometheus(), file_name="metrics.prom")
+    st.download_button("Download JSON metrics", metrics.to_json(), file_name="metrics.json")
+    if st.button("Reset Timings"):
+        metrics.reset()
+
+    st.subheader("Rerun profiles")
+    if not PROFILE_DIR:
+        st.write("Set SCHEDULE_APP_PROFILE_DIR to record a sampling profile of every rerun.")
+    else:
+        profiles = recent_profiles(PROFILE_DIR)
+        st.write(f"{len(profiles)} profiles in {PROFILE_DIR} (collapsed stacks for flamegraph.pl or speedscope).")
+        for filename in profiles[:5]:
+            with open(filename) as handle:
+                st.download_button(os.path.basename(filename), handle.read(), file_name=os.path.basename(filename),
+                                   key=f"profile_{filename}")
 
 # Login Page
 def login_page():
@@ -523,18 +551,6 @@ def login_page():
         else:
             st.error("Invalid email or password.")
 
-# Validate user credentials during login
-def validate_user(email, password):
-    ensure_users_file()
-    users_df = pd.read_csv(USERS_FILE)
-    hashed_password = hash_password(password)
-
-    # Check if the user exists
-    user = users_df[(users_df["Email"] == email) & (users_df["Password"] == hashed_password)]
-    if not user.empty:
-        return True
-    return False
-
 # Main app navigation
 def main():
     if "email" not in st.session_state:
@@ -545,14 +561,27 @@ def main():
             registration_page()
     else:
         st.sidebar.title("Navigation")
-        page = st.sidebar.selectbox("Go to", ["To-Do List", "Daily Schedule", "Visualizations"])
-        if page == "To-Do List":
-            todo_page()
-        elif page == "Daily Schedule":
-            schedule_page()
-        elif page == "Visualizations":
-            visualization_page()
+        pages = ["To-Do List", "Daily Schedule", "Visualizations"]
+        if st.session_state["email"] in ADMIN_EMAILS:
+            pages += ["Admin", "Diagnostics"]
+        page = st.sidebar.selectbox("Go to", pages)
+        if DEBUG:
+            stats = task_cache.stats()
+            st.sidebar.caption(f"Task cache: {stats['hits']} hits, {stats['misses']} misses "
+                               f"({stats['hit_rate']:.0%} hit rate)")
+        with measure(f"page.{page}"):
+            if page == "To-Do List":
+                todo_page()
+            elif page == "Daily Schedule":
+                schedule_page()
+            elif page == "Visualizations":
+                visualization_page()
+            elif page == "Admin":
+                admin_page()
+            elif page == "Diagnostics":
+                diagnostics_page()
 
 if __name__ == "__main__":
-    main()
+    with profile(PROFILE_DIR):
+        main()
 
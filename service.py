@@ -0,0 +1,594 @@
+import argparse
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date, datetime
+from urllib.parse import parse_qsl, quote, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import core
+from analytics import UserStats
+from bulk import BulkImportError, validate_schedule_rows
+from metrics import measure, metrics
+from records import format_schedule_frame
+from recurrence import EVENT_TIME_FORMAT
+
+# Tokens are signed with this secret. Every service instance (and the
+# Streamlit app, when it calls the service) must share it, so the service and
+# its client refuse to start without one.
+SERVICE_SECRET = os.environ.get("SCHEDULE_APP_SERVICE_SECRET", "")
+TOKEN_TTL = 12 * 60 * 60
+
+# Connection limits
+MAX_BODY_BYTES = 10 * 1024 * 1024
+IDLE_TIMEOUT = 30
+
+STATUS_TEXT = {200: "OK", 201: "Created", 202: "Accepted", 400: "Bad Request", 401: "Unauthorized",
+               403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+# Raised by handlers to answer with an HTTP error
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(status, message)
+        self.status = status
+        self.message = message
+
+
+# Tokens: base64("email\nexpiry") + "." + HMAC-SHA256 signature
+def issue_token(email, ttl=TOKEN_TTL):
+    payload = base64.urlsafe_b64encode(f"{email}\n{int(time.time() + ttl)}".encode()).decode().rstrip("=")
+    signature = hmac.new(SERVICE_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()
+    return f"{payload}.{signature}"
+
+
+# The email a token was issued for, or None if it is forged, malformed or expired
+def verify_token(token):
+    payload, _, signature = token.rpartition(".")
+    try:
+        expected = hmac.new(SERVICE_SECRET.encode(), payload.encode(), hashlib.sha256).hexdigest()
+        if not payload or not hmac.compare_digest(signature.encode(), expected.encode()):
+            return None
+        email, _, expires = base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)).decode().rpartition("\n")
+        return email if int(expires) >= time.time() else None
+    except ValueError:
+        return None
+
+
+def _require_secret():
+    if not SERVICE_SECRET:
+        raise RuntimeError("SCHEDULE_APP_SERVICE_SECRET is not set; the service and the app must share a token secret")
+
+
+# JSON forms of the core's results
+
+def _todo_records(todo_df):
+    return [{"Task": task, "Deadline": deadline.date().isoformat(), "Status": str(status), "Time Needed": int(minutes),
+             "Priority": str(priority), "Reminder": bool(reminder)}
+            for task, deadline, status, minutes, priority, reminder in zip(
+                todo_df["Task"], todo_df["Deadline"], todo_df["Status"], todo_df["Time Needed"],
+                todo_df["Priority"], todo_df["Reminder"])]
+
+
+def _schedule_records(schedule_df):
+    return format_schedule_frame(schedule_df.sort_values(["Day", "Start"])).drop(columns=["Email"]).to_dict("records")
+
+
+def stats_to_json(stats):
+    return {"todo_counts": [[status, week, n] for (status, week), n in stats.todo_counts.items()],
+            "weekday_minutes": stats.weekday_minutes, "users": stats.users}
+
+
+def stats_from_json(data):
+    return UserStats.from_rows(data["todo_counts"], data["weekday_minutes"].items(), data.get("users"))
+
+
+def _require(params, *names):
+    missing = [name for name in names if params.get(name) in (None, "")]
+    if missing:
+        raise HttpError(400, "Missing " + ", ".join(missing))
+    return [params[name] for name in names]
+
+
+def _flag(value):
+    return str(value).lower() in ("true", "1", "yes")
+
+
+# Handlers: handler(email, params) -> JSON-able result. email is None on public routes.
+
+def _health(email, params):
+    return {"status": "ok"}
+
+
+def _request_code(email, params):
+    core.request_verification_code(*_require(params, "Email"))
+    return {"queued": True}
+
+
+def _register(email, params):
+    core.register_user(*_require(params, "Email", "Password", "Code"))
+    return {"registered": True}
+
+
+def _login(email, params):
+    email, password = _require(params, "Email", "Password")
+    if not core.validate_user(email, password):
+        raise HttpError(401, "Invalid email or password.")
+    return {"token": issue_token(email), "expires_in": TOKEN_TTL}
+
+
+def _list_todos(email, params):
+    return _todo_records(core.load_todo_tasks(email))
+
+
+def _add_todo(email, params):
+    return {"added": core.save_todo_tasks_bulk(email, pd.DataFrame([params]))}
+
+
+def _add_todos_bulk(email, params):
+    return {"added": core.save_todo_tasks_bulk(email, pd.DataFrame(*_require(params, "rows")))}
+
+
+def _update_todo(email, params):
+    task, status = _require(params, "task", "Status")
+    time_needed = params.get("Time Needed")
+    core.update_task(email, task, status, None if time_needed is None else int(time_needed))
+    return {"updated": True}
+
+
+def _delete_todo(email, params):
+    core.delete_todo_task(email, *_require(params, "task"))
+    return {"deleted": True}
+
+
+def _list_schedule(email, params):
+    return _schedule_records(core.load_schedule_tasks(email, params.get("day")))
+
+
+def _add_schedule(email, params):
+    row, = validate_schedule_rows(email, pd.DataFrame([params]))
+    core.save_schedule_task(email, row["Task"], row["Day"], row["Time From"], row["Time To"])
+    return {"added": 1}
+
+
+def _add_schedule_bulk(email, params):
+    return {"added": core.save_schedule_tasks_bulk(email, pd.DataFrame(*_require(params, "rows")))}
+
+
+def _delete_schedule(email, params):
+    day, task = _require(params, "day", "task")
+    core.delete_schedule_task(email, task, day)
+    return {"deleted": True}
+
+
+def _check_overlap(email, params):
+    day, time_from, time_to = _require(params, "day", "time_from", "time_to")
+    return {"overlaps": bool(core.check_overlap(email, day, time_from, time_to))}
+
+
+def _free_slots(email, params):
+    day, minutes = _require(params, "day", "minutes")
+    slots = core.find_free_time_slots(None, int(minutes), email, day, _flag(params.get("prefer_afternoon", True)))
+    return [slot.strftime("%I:%M %p") for slot in slots]
+
+
+# Datetimes arrive as "YYYY-MM-DD HH:MM" (or a bare date for midnight)
+def _datetime(value):
+    try:
+        return datetime.strptime(value, EVENT_TIME_FORMAT)
+    except ValueError:
+        return datetime.combine(date.fromisoformat(value), datetime.min.time())
+
+
+def _calendar(email, params):
+    start, end = map(_datetime, _require(params, "start", "end"))
+    return [{"Task": task, "Start": f"{occurrence_start:{EVENT_TIME_FORMAT}}", "End": f"{occurrence_end:{EVENT_TIME_FORMAT}}"}
+            for occurrence_start, occurrence_end, task in core.calendar_occurrences(email, start, end)]
+
+
+def _list_events(email, params):
+    return core.load_events(email).drop(columns=["Email"]).to_dict("records")
+
+
+def _add_event(email, params):
+    task, start, end = _require(params, "Task", "Start", "End")
+    core.save_event(email, task, _datetime(start), _datetime(end), params.get("RRule", ""))
+    return {"added": 1}
+
+
+def _cancel_occurrence(email, params):
+    task, start, day = _require(params, "Task", "Start", "Date")
+    core.cancel_occurrence(email, task, start, date.fromisoformat(day))
+    return {"cancelled": True}
+
+
+def _delete_event(email, params):
+    core.delete_event(email, *_require(params, "task", "start"))
+    return {"deleted": True}
+
+
+def _free_time(email, params):
+    start, end, minutes = _require(params, "start", "end", "minutes")
+    hours = (int(params["from_hour"]), int(params["to_hour"])) if "from_hour" in params and "to_hour" in params else None
+    slots = core.find_free_time(email, _datetime(start), _datetime(end), int(minutes), hours)
+    return [{"Start": f"{slot_start:{EVENT_TIME_FORMAT}}", "End": f"{slot_end:{EVENT_TIME_FORMAT}}"} for slot_start, slot_end in slots]
+
+
+# Group members as a list or a comma-separated string; the caller is always one of them
+def _group(email, params):
+    members = params.get("emails", "")
+    members = members.split(",") if isinstance(members, str) else list(members)
+    return [email] + [member for member in members if member.strip() and member.strip() != email]
+
+
+def _group_free_time(email, params):
+    start, end, minutes = _require(params, "start", "end", "minutes")
+    hours = (int(params["from_hour"]), int(params["to_hour"])) if "from_hour" in params and "to_hour" in params else None
+    slots = core.find_group_free_time(_group(email, params), _datetime(start), _datetime(end), int(minutes), hours,
+                                      int(params.get("max_busy", 0)))
+    return [{"Start": f"{slot_start:{EVENT_TIME_FORMAT}}", "End": f"{slot_end:{EVENT_TIME_FORMAT}}"} for slot_start, slot_end in slots]
+
+
+def _book_group_event(email, params):
+    task, start, end = _require(params, "Task", "Start", "End")
+    members = core.book_group_event(_group(email, params), task, _datetime(start), _datetime(end), params.get("RRule", ""))
+    return {"booked": members}
+
+
+def _suggestions(email, params):
+    suggestions, minutes, tasks = core.suggest_schedule(email)
+    return {"suggestions": suggestions, "minutes": minutes, "tasks": tasks}
+
+
+def _auto_schedule(email, params):
+    start, end = params.get("working_hours", (9, 18))
+    options = {name: params[name] for name in ("slot_minutes", "review_days", "max_minutes_per_day", "exact", "time_budget")
+               if name in params}
+    plan = core.auto_schedule_tasks(email, (int(start), int(end)), **options)
+    blocks = [{**block, "Date": block["Date"].isoformat()} for block in plan.blocks]
+    unscheduled = [{"Task": plan.tasks[row], "Minutes": minutes} for row, minutes in plan.unscheduled.items()]
+    return {"blocks": blocks, "unscheduled": unscheduled, "score": plan.score, "method": plan.method}
+
+
+def _stats(email, params):
+    return stats_to_json(core.load_user_stats(email))
+
+
+def _admin_stats(email, params):
+    if email not in core.ADMIN_EMAILS:
+        raise HttpError(403, "Admins only.")
+    return stats_to_json(core.load_stats_rollup())
+
+
+# Timings of this process: Prometheus text, or JSON with ?format=json. Heavy
+# calls are timed here around the pool, so process-pool work is included.
+# Route names and call counts reveal usage, so scrapers need a token too.
+def _metrics(email, params):
+    if params.get("format") == "json":
+        return json.loads(metrics.to_json())
+    return metrics.to_prometheus()
+
+
+# (method, path pattern, handler, needs a token, heavy, success status).
+# Heavy routes run on the process pool so they scale with cores.
+ROUTES = [
+    ("GET", r"/health", _health, False, False, 200),
+    ("GET", r"/metrics", _metrics, True, False, 200),
+    ("POST", r"/verification-codes", _request_code, False, False, 202),
+    ("POST", r"/users", _register, False, False, 201),
+    ("POST", r"/sessions", _login, False, False, 200),
+    ("GET", r"/todos", _list_todos, True, False, 200),
+    ("POST", r"/todos", _add_todo, True, False, 201),
+    ("POST", r"/todos/bulk", _add_todos_bulk, True, False, 201),
+    ("PATCH", r"/todos/(?P<task>[^/]+)", _update_todo, True, False, 200),
+    ("DELETE", r"/todos/(?P<task>[^/]+)", _delete_todo, True, False, 200),
+    ("GET", r"/schedule", _list_schedule, True, False, 200),
+    ("POST", r"/schedule", _add_schedule, True, False, 201),
+    ("POST", r"/schedule/bulk", _add_schedule_bulk, True, False, 201),
+    ("GET", r"/schedule/overlap", _check_overlap, True, False, 200),
+    ("GET", r"/schedule/free-slots", _free_slots, True, False, 200),
+    ("DELETE", r"/schedule/(?P<day>[^/]+)/(?P<task>[^/]+)", _delete_schedule, True, False, 200),
+    ("GET", r"/calendar", _calendar, True, False, 200),
+    ("GET", r"/calendar/free-time", _free_time, True, False, 200),
+    ("GET", r"/events", _list_events, True, False, 200),
+    ("POST", r"/events", _add_event, True, False, 201),
+    ("POST", r"/events/exceptions", _cancel_occurrence, True, False, 201),
+    ("DELETE", r"/events/(?P<task>[^/]+)", _delete_event, True, False, 200),
+    ("GET", r"/group/free-time", _group_free_time, True, False, 200),
+    ("POST", r"/group/events", _book_group_event, True, False, 201),
+    ("GET", r"/suggestions", _suggestions, True, True, 200),
+    ("POST", r"/auto-schedule", _auto_schedule, True, True, 200),
+    ("GET", r"/stats", _stats, True, True, 200),
+    ("GET", r"/admin/stats", _admin_stats, True, True, 200),
+]
+HANDLERS = {handler.__name__: handler for _, _, handler, _, _, _ in ROUTES}
+_COMPILED = [(method, re.compile(pattern + "$"), handler, auth, heavy, status)
+             for method, pattern, handler, auth, heavy, status in ROUTES]
+
+
+# Run a handler in a worker and turn every outcome into (status, body), so
+# nothing but plain data crosses the process boundary
+def _call(handler_name, email, params):
+    try:
+        return None, HANDLERS[handler_name](email, params)
+    except HttpError as error:
+        return error.status, {"error": error.message}
+    except BulkImportError as error:
+        return 400, {"error": str(error), "problems": error.problems}
+    except core.RegistrationError as error:
+        return 400, {"error": str(error)}
+    except core.ScheduleConflictError as error:
+        return 409, {"error": str(error)}
+    except (ValueError, TypeError) as error:
+        return 400, {"error": str(error)}
+    except Exception as error:
+        return 500, {"error": f"{type(error).__name__}: {error}"}
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+# Read one HTTP/1.1 request; None when the client closed the connection
+async def _read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HttpError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0) or 0)
+    if length > MAX_BODY_BYTES:
+        raise HttpError(413, "Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target, version, headers, body
+
+
+# Text bodies (the metrics export) go out as plain text, everything else as JSON
+def _response(status, body, keep_alive):
+    if isinstance(body, str):
+        payload, content_type = body.encode(), "text/plain; version=0.0.4; charset=utf-8"
+    else:
+        payload, content_type = json.dumps(body, default=_json_default).encode(), "application/json"
+    head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode() + payload
+
+
+# Asyncio HTTP/JSON front for the scheduling core.
+#
+# The event loop only parses requests and writes responses; every handler
+# runs in a pool so slow calls never block other connections. Light calls
+# (CRUD, overlap checks) use a thread pool; heavy ones (suggestions,
+# auto-scheduling, analytics) use a process pool sized to the cores. The
+# service keeps no state of its own beyond the shared storage, so more
+# instances can be started behind a load balancer.
+class Service:
+    def __init__(self, workers=None, threads=16):
+        _require_secret()
+        workers = os.cpu_count() if workers is None else workers
+        self.light_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="service")
+        self.heavy_pool = ProcessPoolExecutor(max_workers=workers) if workers > 0 else self.light_pool
+
+    async def dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        path = url.path.rstrip("/") or "/"
+        matches = [(route, match) for route in _COMPILED if (match := route[1].match(path))]
+        if not matches:
+            return 404, {"error": "Not found"}
+        route = next((route for route, match in matches if route[0] == method), None)
+        if route is None:
+            return 405, {"error": "Method not allowed"}
+        match = next(match for candidate, match in matches if candidate is route)
+        _, _, handler, needs_token, heavy, success = route
+
+        params = dict(parse_qsl(url.query))
+        params.update({name: unquote(value) for name, value in match.groupdict().items()})
+        if body:
+            try:
+                data = json.loads(body)
+            except ValueError:
+                return 400, {"error": "Body is not valid JSON"}
+            params.update(data if isinstance(data, dict) else {"rows": data})
+
+        email = None
+        if needs_token:
+            scheme, _, token = headers.get("authorization", "").partition(" ")
+            email = verify_token(token) if scheme.lower() == "bearer" else None
+            if email is None:
+                return 401, {"error": "Missing or invalid token"}
+
+        pool = self.heavy_pool if heavy else self.light_pool
+        with measure(f"service{handler.__name__.replace('_', '.', 1)}"):
+            status, result = await asyncio.get_running_loop().run_in_executor(pool, _call, handler.__name__, email, params)
+        return status or success, result
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(_read_request(reader), IDLE_TIMEOUT)
+                except HttpError as error:
+                    writer.write(_response(error.status, {"error": error.message}, False))
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                status, result = await self.dispatch(method, target, headers, body)
+                keep_alive = headers.get("connection", "").lower() != "close" and version != "HTTP/1.0"
+                writer.write(_response(status, result, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        print(f"Schedule App service listening on http://{host}:{port}", file=sys.stderr)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.light_pool.shutdown()
+        self.heavy_pool.shutdown()
+
+
+# Blocking client used by the Streamlit app to hand heavy calls to the service.
+# It signs its own tokens, so it needs the service's SCHEDULE_APP_SERVICE_SECRET.
+class ServiceClient:
+    def __init__(self, base_url, timeout=30):
+        _require_secret()
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+
+    def request(self, method, path, email=None, body=None):
+        request = urllib.request.Request(self.base_url + path, method=method,
+                                         data=None if body is None else json.dumps(body).encode())
+        request.add_header("Content-Type", "application/json")
+        if email is not None:
+            request.add_header("Authorization", "Bearer " + issue_token(email))
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as error:
+            raise HttpError(error.code, json.load(error).get("error", error.reason))
+
+    def suggestions(self, email):
+        data = self.request("GET", "/suggestions", email)
+        return data["suggestions"], data["minutes"], data["tasks"]
+
+    def stats(self, email):
+        return stats_from_json(self.request("GET", "/stats", email))
+
+
+# Minimal keep-alive HTTP/1.1 client for the load test
+class _AsyncConnection:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, token=None, body=None):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        payload = b"" if body is None else json.dumps(body).encode()
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(payload)}\r\n"
+        if token:
+            head += f"Authorization: Bearer {token}\r\n"
+        self.writer.write(head.encode() + b"\r\n" + payload)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        await self.reader.readexactly(length)
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+# Fire `total` requests over `concurrency` keep-alive connections, cycling
+# through routes ("GET /suggestions" etc.); returns latency percentiles per route
+async def load_test(url, email, password, routes, concurrency=10, total=1000):
+    parts = urlsplit(url)
+    token = ServiceClient(url).request("POST", "/sessions", body={"Email": email, "Password": password})["token"]
+
+    counter = iter(range(total))
+    timings = {route: [] for route in routes}
+    errors = {route: 0 for route in routes}
+
+    async def worker():
+        connection = _AsyncConnection(parts.hostname, parts.port or 80)
+        try:
+            for i in counter:
+                route = routes[i % len(routes)]
+                method, path = route.split(" ", 1)
+                started = time.perf_counter()
+                status = await connection.request(method, quote(path, safe="/?=&"), token)
+                timings[route].append((time.perf_counter() - started) * 1000)
+                if status >= 400:
+                    errors[route] += 1
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    seconds = time.perf_counter() - started
+
+    report = {"requests": total, "concurrency": concurrency, "seconds": round(seconds, 3),
+              "requests_per_second": round(total / seconds, 1), "routes": {}}
+    for route, values in timings.items():
+        if values:
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            report["routes"][route] = {"requests": len(values), "errors": errors[route], "p50_ms": round(float(p50), 2),
+                                       "p95_ms": round(float(p95), 2), "p99_ms": round(float(p99), 2)}
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Schedule App HTTP/JSON service.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="run the service")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8080)
+    serve.add_argument("--workers", type=int, default=None, help="processes for heavy calls (0 = use threads)")
+    serve.add_argument("--threads", type=int, default=16, help="threads for light calls")
+    test = commands.add_parser("loadtest", help="load-test a running service")
+    test.add_argument("--url", default="http://127.0.0.1:8080")
+    test.add_argument("--email", required=True)
+    test.add_argument("--password", required=True)
+    test.add_argument("--routes", default="GET /todos,GET /suggestions,GET /stats",
+                      help="comma-separated \"METHOD /path\" list to cycle through")
+    test.add_argument("--concurrency", type=int, default=10)
+    test.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        try:
+            service = Service(args.workers, args.threads)
+        except RuntimeError as error:
+            parser.error(str(error))
+        try:
+            asyncio.run(service.serve(args.host, args.port))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            service.close()
+    else:
+        report = asyncio.run(load_test(args.url, args.email, args.password, args.routes.split(","),
+                                       args.concurrency, args.requests))
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
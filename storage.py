@@ -0,0 +1,953 @@
+import glob
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import ExitStack, contextmanager
+
+import pandas as pd
+
+from analytics import UserStats, deadline_weeks, scheduled_minutes
+from metrics import measure
+from records import MINUTES_PER_DAY, is_flag_set, minutes_column, needed_minutes
+
+
+# Column layouts shared by every storage backend
+USER_COLUMNS = ["Email", "Password"]
+VERIFICATION_CODE_COLUMNS = ["Email", "VerificationCode", "Timestamp"]
+TODO_COLUMNS = ["Email", "Task", "Deadline", "Status", "Time Needed", "Priority", "Reminder"]
+SCHEDULE_COLUMNS = ["Email", "Task", "Day", "Time From", "Time To"]
+# Dated schedule entries; see recurrence.Event for the Start/End/RRule/ExDates format
+EVENT_COLUMNS = ["Email", "Task", "Start", "End", "RRule", "ExDates"]
+
+# Open backends are kept per process so Streamlit reruns reuse connections
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+# Advisory file locking: fcntl on POSIX, msvcrt on Windows
+try:
+    import fcntl
+
+    def _lock_handle(handle, shared):
+        fcntl.flock(handle.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+
+    def _unlock_handle(handle):
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+except ImportError:
+    import msvcrt
+
+    def _lock_handle(handle, shared):
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+
+    def _unlock_handle(handle):
+        handle.seek(0)
+        msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Hold an advisory lock on "<filename>.lock" (shared for readers, exclusive for writers).
+# The lock lives in a sidecar file because rewrites replace the data file itself.
+@contextmanager
+def file_lock(filename, shared=False):
+    directory = os.path.dirname(filename)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(filename + ".lock", "a+") as handle:
+        _lock_handle(handle, shared)
+        try:
+            yield
+        finally:
+            _unlock_handle(handle)
+
+
+# Cheap change token for a file: (mtime, size), or None if it does not exist
+def _file_version(filename):
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# Quote a column name for use in SQL ("Time Needed" etc. contain spaces)
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+# Normalise a record so every backend stores the same value types
+def _clean_todo(row):
+    return {
+        "Email": row["Email"],
+        "Task": row["Task"],
+        "Deadline": str(row["Deadline"]),
+        "Status": row["Status"],
+        "Time Needed": needed_minutes(row["Time Needed"]),
+        "Priority": row["Priority"],
+        "Reminder": is_flag_set(row["Reminder"]),
+    }
+
+
+def _clean_schedule(row):
+    return {column: row[column] for column in SCHEDULE_COLUMNS}
+
+
+def _clean_event(row):
+    return {column: "" if pd.isna(row.get(column)) else str(row.get(column)) for column in EVENT_COLUMNS}
+
+
+# Event frames read back from CSV have NaN for empty RRule/ExDates cells
+def _event_frame(events_df):
+    return events_df.fillna({"RRule": "", "ExDates": ""}).astype({"RRule": str, "ExDates": str})
+
+
+# {email: [rows]} for a batch of records, keeping their order
+def _group_by_email(rows):
+    groups = {}
+    for row in rows:
+        groups.setdefault(row["Email"], []).append(row)
+    return groups
+
+
+# Raised by a conditional write when rows it depends on changed since they
+# were read; nothing has been written and the caller can re-read and retry
+class StaleVersionError(RuntimeError):
+    def __init__(self, emails):
+        super().__init__("Changed by another writer: " + ", ".join(emails))
+        self.emails = emails
+
+
+# Raised by insert_user when the email already has an account, e.g. one
+# another session registered after the caller checked
+class UserExistsError(ValueError):
+    def __init__(self, email):
+        super().__init__(f"User already exists: {email}")
+        self.email = email
+
+
+# Compare {(kind, email): version} with the current versions (caller holds the write lock)
+def _check_versions(storage, expected):
+    stale = sorted({email for (kind, email), version in expected.items() if storage.version(kind, email) != version})
+    if stale:
+        raise StaleVersionError(stale)
+
+
+# Storage backend keeping the original whole-file CSV layout.
+#
+# Every read-modify-write runs under an exclusive advisory lock on a sidecar
+# "<file>.lock", and rewrites go to a temporary file that is renamed over the
+# original, so concurrent sessions and processes never lose each other's rows
+# and readers never see a half-written file. New rows are appended in place.
+class CsvStorage:
+    def __init__(self, users_file, todo_file, schedule_file, verification_code_file):
+        self.users_file = users_file
+        self.todo_file = todo_file
+        self.schedule_file = schedule_file
+        self.verification_code_file = verification_code_file
+        # Dated events sit next to the weekly schedule file
+        self.event_file = os.path.splitext(schedule_file)[0] + "_events.csv"
+
+    def _read(self, filename, columns):
+        with file_lock(filename, shared=True), measure("storage.csv_read") as span:
+            if not os.path.exists(filename):
+                return pd.DataFrame(columns=columns)
+            df = pd.read_csv(filename)
+            span.rows, span.bytes = len(df), os.path.getsize(filename)
+            return df
+
+    # Atomically replace a file with the frame's contents (caller holds the lock)
+    def _write(self, filename, df):
+        directory = os.path.dirname(filename) or "."
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".csv")
+        try:
+            with os.fdopen(fd, "w", newline="") as handle:
+                df.to_csv(handle, index=False)
+            os.replace(temp_path, filename)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    # Read, change and rewrite a file while holding its lock
+    def _modify(self, filename, columns, change):
+        with file_lock(filename), measure("storage.csv_rewrite") as span:
+            df = pd.read_csv(filename) if os.path.exists(filename) else pd.DataFrame(columns=columns)
+            df = change(df)
+            self._write(filename, df)
+            span.rows, span.bytes = len(df), os.path.getsize(filename)
+
+    # Append rows without rewriting the file
+    def _append(self, filename, columns, *rows):
+        with file_lock(filename):
+            self._append_locked(filename, columns, rows)
+
+    def _append_locked(self, filename, columns, rows):
+        with measure("storage.csv_append") as span:
+            span.rows = len(rows)
+            if not os.path.exists(filename):
+                self._write(filename, pd.DataFrame(columns=columns))
+            with open(filename, "a", newline="") as handle:
+                pd.DataFrame(list(rows), columns=columns).to_csv(handle, index=False, header=False)
+
+    # Stream a user's rows in chunks while holding the file's shared lock
+    def _iter_rows(self, filename, columns, email, chunk_size):
+        with file_lock(filename, shared=True):
+            if not os.path.exists(filename):
+                return
+            for chunk in pd.read_csv(filename, chunksize=chunk_size):
+                chunk = chunk[chunk["Email"] == email]
+                if not chunk.empty:
+                    yield chunk
+
+    def _kind_file(self, kind):
+        return {"users": self.users_file, "todo": self.todo_file, "schedule": self.schedule_file,
+                "event": self.event_file}[kind]
+
+    # File holding one user's rows of a kind
+    def _user_file(self, kind, email):
+        return self._kind_file(kind)
+
+    # Change token for one user's "users" (account), "todo", "schedule" or "event" rows
+    def version(self, kind, email):
+        return _file_version(self._user_file(kind, email))
+
+    # Change feed: returns (new cursor, emails changed since cursor). A flat
+    # file cannot say which users changed, so any change returns None ("all").
+    def changes_since(self, kind, cursor=None):
+        current = _file_version(self._kind_file(kind))
+        return current, (set() if cursor == current else None)
+
+    # Users
+    def get_user_password(self, email):
+        users_df = self._read(self.users_file, USER_COLUMNS)
+        match = users_df.loc[users_df["Email"] == email, "Password"]
+        return None if match.empty else match.iloc[0]
+
+    # The check and the append happen under one lock, so racing registrations cannot both succeed
+    def insert_user(self, email, password):
+        with file_lock(self.users_file):
+            if os.path.exists(self.users_file) and (pd.read_csv(self.users_file)["Email"] == email).any():
+                raise UserExistsError(email)
+            self._append_locked(self.users_file, USER_COLUMNS, [{"Email": email, "Password": password}])
+
+    def update_user_password(self, email, password):
+        def change(users_df):
+            users_df.loc[users_df["Email"] == email, "Password"] = password
+            return users_df
+        self._modify(self.users_file, USER_COLUMNS, change)
+
+    # All (email, password hash) pairs, for building an in-memory index
+    def load_users(self):
+        users_df = self._read(self.users_file, USER_COLUMNS)
+        return list(zip(users_df["Email"], users_df["Password"]))
+
+    # Verification codes
+    def get_verification_code(self, email):
+        codes_df = self._read(self.verification_code_file, VERIFICATION_CODE_COLUMNS)
+        match = codes_df[codes_df["Email"] == email]
+        if match.empty:
+            return None
+        return match["VerificationCode"].iloc[0], match["Timestamp"].iloc[0]
+
+    def upsert_verification_code(self, email, code, timestamp):
+        new_entry = pd.DataFrame({"Email": [email], "VerificationCode": [code], "Timestamp": [str(timestamp)]})
+        self._modify(self.verification_code_file, VERIFICATION_CODE_COLUMNS,
+                     lambda codes_df: pd.concat([codes_df[codes_df["Email"] != email], new_entry], ignore_index=True))
+
+    def delete_verification_code(self, email):
+        self._modify(self.verification_code_file, VERIFICATION_CODE_COLUMNS,
+                     lambda codes_df: codes_df[codes_df["Email"] != email])
+
+    # All (email, code, timestamp) rows, for building an in-memory expiry index
+    def load_verification_codes(self):
+        codes_df = self._read(self.verification_code_file, VERIFICATION_CODE_COLUMNS)
+        return list(zip(codes_df["Email"], codes_df["VerificationCode"], codes_df["Timestamp"]))
+
+    # Delete expired codes given as (email, timestamp) pairs in one rewrite.
+    # Matching on the timestamp keeps a code re-sent in the meantime.
+    def delete_verification_codes(self, entries):
+        expired = {(email, str(timestamp)) for email, timestamp in entries}
+        self._modify(self.verification_code_file, VERIFICATION_CODE_COLUMNS,
+                     lambda codes_df: codes_df.loc[[(email, str(timestamp)) not in expired for email, timestamp
+                                                    in zip(codes_df["Email"], codes_df["Timestamp"])]])
+
+    # To-do tasks
+    def load_todo_tasks(self, email=None):
+        todo_df = self._read(self.todo_file, TODO_COLUMNS)
+        if email is not None:
+            todo_df = todo_df[todo_df["Email"] == email]
+        return todo_df
+
+    def insert_todo_task(self, row):
+        self._append(self.todo_file, TODO_COLUMNS, _clean_todo(row))
+
+    # Add many rows with a single append
+    def insert_todo_tasks(self, rows):
+        self._append(self.todo_file, TODO_COLUMNS, *[_clean_todo(row) for row in rows])
+
+    def iter_todo_tasks(self, email, chunk_size=1000):
+        return self._iter_rows(self.todo_file, TODO_COLUMNS, email, chunk_size)
+
+    def update_todo_task(self, email, task, changes):
+        def change(todo_df):
+            mask = (todo_df["Email"] == email) & (todo_df["Task"] == task)
+            todo_df.loc[mask, list(changes)] = list(changes.values())
+            return todo_df
+        self._modify(self.todo_file, TODO_COLUMNS, change)
+
+    def delete_todo_task(self, email, task):
+        self._modify(self.todo_file, TODO_COLUMNS,
+                     lambda todo_df: todo_df[(todo_df["Email"] != email) | (todo_df["Task"] != task)])
+
+    # Schedule tasks
+    def load_schedule_tasks(self, email=None, day=None):
+        schedule_df = self._read(self.schedule_file, SCHEDULE_COLUMNS)
+        if email is not None:
+            schedule_df = schedule_df[schedule_df["Email"] == email]
+        if day is not None:
+            schedule_df = schedule_df[schedule_df["Day"] == day]
+        return schedule_df
+
+    def insert_schedule_task(self, row):
+        self._append(self.schedule_file, SCHEDULE_COLUMNS, _clean_schedule(row))
+
+    def insert_schedule_tasks(self, rows):
+        self._append(self.schedule_file, SCHEDULE_COLUMNS, *[_clean_schedule(row) for row in rows])
+
+    def iter_schedule_tasks(self, email, chunk_size=1000):
+        return self._iter_rows(self.schedule_file, SCHEDULE_COLUMNS, email, chunk_size)
+
+    # Several users' rows in one read, for group scheduling
+    def load_group_schedule_tasks(self, emails):
+        schedule_df = self._read(self.schedule_file, SCHEDULE_COLUMNS)
+        return schedule_df[schedule_df["Email"].isin(emails)]
+
+    def delete_schedule_task(self, email, task, day):
+        self._modify(self.schedule_file, SCHEDULE_COLUMNS, lambda schedule_df: schedule_df[
+            (schedule_df["Email"] != email) | (schedule_df["Task"] != task) | (schedule_df["Day"] != day)])
+
+    # Dated events, identified by (Email, Task, Start)
+    def load_events(self, email=None):
+        events_df = _event_frame(self._read(self.event_file, EVENT_COLUMNS))
+        if email is not None:
+            events_df = events_df[events_df["Email"] == email]
+        return events_df
+
+    def load_group_events(self, emails):
+        events_df = self.load_events()
+        return events_df[events_df["Email"].isin(emails)]
+
+    def insert_event(self, row):
+        self._append(self.event_file, EVENT_COLUMNS, _clean_event(row))
+
+    # Insert events for several users together. Every file involved is locked
+    # (in path order, so concurrent callers cannot deadlock) before the
+    # expected {(kind, email): version} are checked, so no other write can
+    # land between the check and the append; StaleVersionError writes nothing.
+    def insert_events(self, rows, expected=None):
+        expected = expected or {}
+        by_file = {}
+        for row in rows:
+            by_file.setdefault(self._user_file("event", row["Email"]), []).append(_clean_event(row))
+        with ExitStack() as locks:
+            for filename in sorted(set(by_file) | {self._user_file(kind, email) for kind, email in expected}):
+                locks.enter_context(file_lock(filename))
+            _check_versions(self, expected)
+            for filename, file_rows in by_file.items():
+                self._append_locked(filename, EVENT_COLUMNS, file_rows)
+
+    def update_event(self, email, task, start, changes):
+        def change(events_df):
+            events_df = _event_frame(events_df)
+            mask = (events_df["Email"] == email) & (events_df["Task"] == task) & (events_df["Start"] == start)
+            events_df.loc[mask, list(changes)] = list(changes.values())
+            return events_df
+        self._modify(self.event_file, EVENT_COLUMNS, change)
+
+    def delete_event(self, email, task, start):
+        self._modify(self.event_file, EVENT_COLUMNS, lambda events_df: events_df[
+            (events_df["Email"] != email) | (events_df["Task"] != task) | (events_df["Start"] != start)])
+
+    # Visualization aggregates. Flat files keep no materialized counts, so
+    # these scan the rows; callers cache the result per storage version.
+    def user_stats(self, email):
+        return UserStats.from_frames(self.load_todo_tasks(email), self.load_schedule_tasks(email))
+
+    def stats_rollup(self):
+        return UserStats.from_frames(self.load_todo_tasks(), self.load_schedule_tasks(), len(self.load_users()))
+
+
+# CSV storage with todos and schedules split into one file per user, so a
+# user's reads and writes only touch (and only lock) that user's rows
+class PartitionedCsvStorage(CsvStorage):
+    def __init__(self, users_file, todo_file, schedule_file, verification_code_file):
+        super().__init__(users_file, todo_file, schedule_file, verification_code_file)
+        self.todo_dir = os.path.splitext(todo_file)[0]
+        self.schedule_dir = os.path.splitext(schedule_file)[0]
+        self.event_dir = os.path.splitext(self.event_file)[0]
+        self._split_legacy_file(todo_file, self.todo_dir)
+        self._split_legacy_file(schedule_file, self.schedule_dir)
+        self._split_legacy_file(self.event_file, self.event_dir)
+
+    # Partition path for a user: <dir>/<first two hash chars>/<sha1 of email>.csv
+    def _partition(self, directory, email):
+        digest = hashlib.sha1(email.encode()).hexdigest()
+        return os.path.join(directory, digest[:2], digest + ".csv")
+
+    # One-shot split of a flat CSV file into per-user partitions
+    def _split_legacy_file(self, filename, directory):
+        with file_lock(filename):
+            if os.path.exists(directory) or not os.path.exists(filename):
+                return
+            df = pd.read_csv(filename)
+            for email, user_df in df.groupby("Email", sort=False):
+                self._write(self._partition(directory, email), user_df)
+            os.makedirs(directory, exist_ok=True)
+
+    def _kind_dir(self, kind):
+        return {"todo": self.todo_dir, "schedule": self.schedule_dir, "event": self.event_dir}[kind]
+
+    # Accounts stay in the flat users file
+    def _user_file(self, kind, email):
+        if kind == "users":
+            return self.users_file
+        return self._partition(self._kind_dir(kind), email)
+
+    def changes_since(self, kind, cursor=None):
+        directory = self._kind_dir(kind)
+        current = frozenset((path, _file_version(path)) for path in glob.glob(os.path.join(directory, "*", "*.csv")))
+        return current, (set() if cursor == current else None)
+
+    def _read_all(self, directory, columns):
+        return self._read_files(sorted(glob.glob(os.path.join(directory, "*", "*.csv"))), columns)
+
+    def _read_files(self, paths, columns):
+        frames = [self._read(path, columns) for path in paths if os.path.exists(path)]
+        frames = [df for df in frames if not df.empty]
+        if not frames:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+    # To-do tasks
+    def load_todo_tasks(self, email=None):
+        if email is None:
+            return self._read_all(self.todo_dir, TODO_COLUMNS)
+        return self._read(self._partition(self.todo_dir, email), TODO_COLUMNS)
+
+    def insert_todo_task(self, row):
+        self._append(self._partition(self.todo_dir, row["Email"]), TODO_COLUMNS, _clean_todo(row))
+
+    # One append per user partition touched by the batch
+    def insert_todo_tasks(self, rows):
+        for email, user_rows in _group_by_email(rows).items():
+            self._append(self._partition(self.todo_dir, email), TODO_COLUMNS, *[_clean_todo(row) for row in user_rows])
+
+    def iter_todo_tasks(self, email, chunk_size=1000):
+        return self._iter_rows(self._partition(self.todo_dir, email), TODO_COLUMNS, email, chunk_size)
+
+    def update_todo_task(self, email, task, changes):
+        def change(todo_df):
+            todo_df.loc[todo_df["Task"] == task, list(changes)] = list(changes.values())
+            return todo_df
+        self._modify(self._partition(self.todo_dir, email), TODO_COLUMNS, change)
+
+    def delete_todo_task(self, email, task):
+        self._modify(self._partition(self.todo_dir, email), TODO_COLUMNS,
+                     lambda todo_df: todo_df[todo_df["Task"] != task])
+
+    # Schedule tasks
+    def load_schedule_tasks(self, email=None, day=None):
+        if email is None:
+            schedule_df = self._read_all(self.schedule_dir, SCHEDULE_COLUMNS)
+        else:
+            schedule_df = self._read(self._partition(self.schedule_dir, email), SCHEDULE_COLUMNS)
+        if day is not None:
+            schedule_df = schedule_df[schedule_df["Day"] == day]
+        return schedule_df
+
+    def insert_schedule_task(self, row):
+        self._append(self._partition(self.schedule_dir, row["Email"]), SCHEDULE_COLUMNS, _clean_schedule(row))
+
+    def insert_schedule_tasks(self, rows):
+        for email, user_rows in _group_by_email(rows).items():
+            self._append(self._partition(self.schedule_dir, email), SCHEDULE_COLUMNS,
+                         *[_clean_schedule(row) for row in user_rows])
+
+    def iter_schedule_tasks(self, email, chunk_size=1000):
+        return self._iter_rows(self._partition(self.schedule_dir, email), SCHEDULE_COLUMNS, email, chunk_size)
+
+    def load_group_schedule_tasks(self, emails):
+        return self._read_files([self._partition(self.schedule_dir, email) for email in emails], SCHEDULE_COLUMNS)
+
+    def delete_schedule_task(self, email, task, day):
+        self._modify(self._partition(self.schedule_dir, email), SCHEDULE_COLUMNS,
+                     lambda schedule_df: schedule_df[(schedule_df["Task"] != task) | (schedule_df["Day"] != day)])
+
+    # Dated events
+    def load_events(self, email=None):
+        if email is None:
+            return _event_frame(self._read_all(self.event_dir, EVENT_COLUMNS))
+        return _event_frame(self._read(self._partition(self.event_dir, email), EVENT_COLUMNS))
+
+    def load_group_events(self, emails):
+        return _event_frame(self._read_files([self._partition(self.event_dir, email) for email in emails], EVENT_COLUMNS))
+
+    def insert_event(self, row):
+        self._append(self._partition(self.event_dir, row["Email"]), EVENT_COLUMNS, _clean_event(row))
+
+    def update_event(self, email, task, start, changes):
+        def change(events_df):
+            events_df = _event_frame(events_df)
+            events_df.loc[(events_df["Task"] == task) & (events_df["Start"] == start), list(changes)] = list(changes.values())
+            return events_df
+        self._modify(self._partition(self.event_dir, email), EVENT_COLUMNS, change)
+
+    def delete_event(self, email, task, start):
+        self._modify(self._partition(self.event_dir, email), EVENT_COLUMNS,
+                     lambda events_df: events_df[(events_df["Task"] != task) | (events_df["Start"] != start)])
+
+
+# Storage backend using an indexed SQLite database in WAL mode
+class SQLiteStorage:
+    SCHEMA = [
+        'CREATE TABLE IF NOT EXISTS users ("Email" TEXT PRIMARY KEY, "Password" TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS verification_codes ("Email" TEXT PRIMARY KEY, "VerificationCode" TEXT NOT NULL, "Timestamp" TEXT NOT NULL)',
+        'CREATE TABLE IF NOT EXISTS todo_tasks ("Email" TEXT NOT NULL, "Task" TEXT NOT NULL, "Deadline" TEXT, "Status" TEXT, '
+        '"Time Needed" INTEGER, "Priority" TEXT, "Reminder" INTEGER NOT NULL DEFAULT 0)',
+        'CREATE TABLE IF NOT EXISTS schedule_tasks ("Email" TEXT NOT NULL, "Task" TEXT NOT NULL, "Day" TEXT NOT NULL, '
+        '"Time From" TEXT NOT NULL, "Time To" TEXT NOT NULL)',
+        'CREATE INDEX IF NOT EXISTS idx_todo_email_task ON todo_tasks ("Email", "Task")',
+        'CREATE INDEX IF NOT EXISTS idx_schedule_email_day ON schedule_tasks ("Email", "Day")',
+        'CREATE INDEX IF NOT EXISTS idx_schedule_email_task ON schedule_tasks ("Email", "Task")',
+        'CREATE TABLE IF NOT EXISTS schedule_events ("Email" TEXT NOT NULL, "Task" TEXT NOT NULL, "Start" TEXT NOT NULL, '
+        '"End" TEXT NOT NULL, "RRule" TEXT NOT NULL DEFAULT \'\', "ExDates" TEXT NOT NULL DEFAULT \'\')',
+        'CREATE INDEX IF NOT EXISTS idx_events_email_task ON schedule_events ("Email", "Task", "Start")',
+        'CREATE TABLE IF NOT EXISTS meta ("Key" TEXT PRIMARY KEY, "Value" TEXT)',
+        'CREATE TABLE IF NOT EXISTS generations ("Kind" TEXT NOT NULL, "Email" TEXT NOT NULL, '
+        '"Generation" INTEGER NOT NULL, "Seq" INTEGER NOT NULL DEFAULT 0, PRIMARY KEY ("Kind", "Email"))',
+        'CREATE TABLE IF NOT EXISTS todo_stats ("Email" TEXT NOT NULL, "Status" TEXT NOT NULL, "Week" TEXT NOT NULL, '
+        '"Tasks" INTEGER NOT NULL, PRIMARY KEY ("Email", "Status", "Week"))',
+        'CREATE TABLE IF NOT EXISTS schedule_stats ("Email" TEXT NOT NULL, "Day" TEXT NOT NULL, '
+        '"Minutes" INTEGER NOT NULL, PRIMARY KEY ("Email", "Day"))',
+    ]
+
+    # Stats rows under this email hold the totals across all users
+    ALL_USERS = ""
+
+    # Bumped whenever the way stats are counted changes, so they are rebuilt
+    STATS_VERSION = "2"
+
+    # Kept well under SQLite's bound-parameter limit
+    EMAILS_PER_QUERY = 500
+
+    def __init__(self, database_file):
+        self.database_file = database_file
+        self._local = threading.local()
+        with self._transaction() as conn:
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            # Databases created before the change feed lack the "Seq" column
+            if "Seq" not in [row[1] for row in conn.execute("PRAGMA table_info(generations)")]:
+                conn.execute('ALTER TABLE generations ADD COLUMN "Seq" INTEGER NOT NULL DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_generations_seq ON generations ("Kind", "Seq")')
+            # Databases created before the stats tables (or before the last
+            # counting change) get them filled once
+            if not conn.execute('SELECT 1 FROM meta WHERE "Key" = ? AND "Value" = ?',
+                                ("stats_built", self.STATS_VERSION)).fetchone():
+                self._rebuild_stats(conn)
+
+    # SQLite connections cannot be shared across threads, so keep one per thread
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.database_file, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _transaction(self):
+        return _Transaction(self._connection())
+
+    def _query(self, sql, params=()):
+        with measure("storage.sqlite_query") as span:
+            df = pd.read_sql_query(sql, self._connection(), params=params)
+            span.rows = len(df)
+            return df
+
+    # Every write bumps a per-user generation so other processes can see the
+    # change, and stamps it with a global sequence number for changes_since()
+    def _bump(self, conn, kind, email):
+        seq = conn.execute('SELECT COALESCE(MAX("Seq"), 0) + 1 FROM generations WHERE "Kind" = ?', (kind,)).fetchone()[0]
+        conn.execute(
+            'INSERT INTO generations ("Kind", "Email", "Generation", "Seq") VALUES (?, ?, 1, ?) '
+            'ON CONFLICT ("Kind", "Email") DO UPDATE SET "Generation" = "Generation" + 1, "Seq" = excluded."Seq"',
+            (kind, email, seq),
+        )
+
+    # Change feed: returns (new cursor, set of emails written since cursor)
+    def changes_since(self, kind, cursor=None):
+        conn = self._connection()
+        if cursor is None:
+            latest = conn.execute('SELECT COALESCE(MAX("Seq"), 0) FROM generations WHERE "Kind" = ?', (kind,)).fetchone()[0]
+            return latest, None
+        rows = conn.execute(
+            'SELECT "Email", "Seq" FROM generations WHERE "Kind" = ? AND "Seq" > ?', (kind, cursor)
+        ).fetchall()
+        return max([cursor] + [seq for _, seq in rows]), {email for email, _ in rows}
+
+    # Apply a +1/-1 change for written rows to the materialized stats of
+    # their user and of the all-users totals
+    def _count(self, conn, kind, rows, sign):
+        if not rows:
+            return
+        if kind == "todo":
+            weeks = deadline_weeks([row["Deadline"] for row in rows])
+            deltas = [(email, str(row["Status"]), week, sign)
+                      for row, week in zip(rows, weeks) for email in (row["Email"], self.ALL_USERS)]
+            conn.executemany(
+                'INSERT INTO todo_stats ("Email", "Status", "Week", "Tasks") VALUES (?, ?, ?, ?) '
+                'ON CONFLICT ("Email", "Status", "Week") DO UPDATE SET "Tasks" = "Tasks" + excluded."Tasks"', deltas)
+            conn.execute('DELETE FROM todo_stats WHERE "Tasks" = 0 AND "Email" IN (?, ?)',
+                         (rows[0]["Email"], self.ALL_USERS))
+        elif kind == "schedule":
+            deltas = [(email, row["Day"], sign * scheduled_minutes(row["Time From"], row["Time To"]))
+                      for row in rows for email in (row["Email"], self.ALL_USERS)]
+            conn.executemany(
+                'INSERT INTO schedule_stats ("Email", "Day", "Minutes") VALUES (?, ?, ?) '
+                'ON CONFLICT ("Email", "Day") DO UPDATE SET "Minutes" = "Minutes" + excluded."Minutes"', deltas)
+
+    # Rows matching a WHERE clause, as dicts, for adjusting the stats before a write
+    def _select_rows(self, conn, table, columns, where, params):
+        select = ", ".join(_quote(c) for c in columns)
+        return [dict(zip(columns, row)) for row in conn.execute(f"SELECT {select} FROM {table} WHERE {where}", params)]
+
+    # Recompute the materialized stats from the task tables (one full scan)
+    def _rebuild_stats(self, conn):
+        conn.execute("DELETE FROM todo_stats")
+        conn.execute("DELETE FROM schedule_stats")
+        # One vectorized group-by per table for every user and the totals
+        todo_df = pd.read_sql_query('SELECT "Email", "Status", "Deadline" FROM todo_tasks', conn)
+        if not todo_df.empty:
+            todo_df = pd.DataFrame({"Email": todo_df["Email"], "Status": todo_df["Status"].astype(str),
+                                    "Week": deadline_weeks(todo_df["Deadline"])})
+            counts = pd.concat([todo_df.groupby(["Email", "Status", "Week"]).size(),
+                                todo_df.assign(Email=self.ALL_USERS).groupby(["Email", "Status", "Week"]).size()])
+            conn.executemany('INSERT INTO todo_stats ("Email", "Status", "Week", "Tasks") VALUES (?, ?, ?, ?)',
+                             [(email, status, week, int(n)) for (email, status, week), n in counts.items()])
+        schedule_df = pd.read_sql_query('SELECT "Email", "Day", "Time From", "Time To" FROM schedule_tasks', conn)
+        if not schedule_df.empty:
+            schedule_df = pd.DataFrame({"Email": schedule_df["Email"], "Day": schedule_df["Day"],
+                                        "Minutes": (minutes_column(schedule_df["Time To"]).astype(int)
+                                                    - minutes_column(schedule_df["Time From"]).astype(int)) % MINUTES_PER_DAY})
+            totals = pd.concat([schedule_df.groupby(["Email", "Day"])["Minutes"].sum(),
+                                schedule_df.assign(Email=self.ALL_USERS).groupby(["Email", "Day"])["Minutes"].sum()])
+            conn.executemany('INSERT INTO schedule_stats ("Email", "Day", "Minutes") VALUES (?, ?, ?)',
+                             [(email, day, int(n)) for (email, day), n in totals.items()])
+        conn.execute('INSERT OR REPLACE INTO meta ("Key", "Value") VALUES (?, ?)', ("stats_built", self.STATS_VERSION))
+
+    # Visualization aggregates, read from the materialized stats tables
+    def user_stats(self, email):
+        conn = self._connection()
+        return UserStats.from_rows(
+            conn.execute('SELECT "Status", "Week", "Tasks" FROM todo_stats WHERE "Email" = ?', (email,)).fetchall(),
+            conn.execute('SELECT "Day", "Minutes" FROM schedule_stats WHERE "Email" = ?', (email,)).fetchall(),
+        )
+
+    # Totals across every user, without scanning the task tables
+    def stats_rollup(self):
+        stats = self.user_stats(self.ALL_USERS)
+        stats.users = self._connection().execute("SELECT COUNT(*) FROM users").fetchone()[0]
+        return stats
+
+    def version(self, kind, email):
+        row = self._connection().execute(
+            'SELECT "Generation" FROM generations WHERE "Kind" = ? AND "Email" = ?', (kind, email)
+        ).fetchone()
+        return 0 if row is None else row[0]
+
+    # Users
+    def get_user_password(self, email):
+        row = self._connection().execute('SELECT "Password" FROM users WHERE "Email" = ?', (email,)).fetchone()
+        return None if row is None else row[0]
+
+    def insert_user(self, email, password):
+        try:
+            with self._transaction() as conn:
+                conn.execute('INSERT INTO users ("Email", "Password") VALUES (?, ?)', (email, password))
+                self._bump(conn, "users", email)
+        except sqlite3.IntegrityError:
+            raise UserExistsError(email) from None
+
+    def update_user_password(self, email, password):
+        with self._transaction() as conn:
+            conn.execute('UPDATE users SET "Password" = ? WHERE "Email" = ?', (password, email))
+            self._bump(conn, "users", email)
+
+    def load_users(self):
+        return self._connection().execute('SELECT "Email", "Password" FROM users').fetchall()
+
+    # Verification codes
+    def get_verification_code(self, email):
+        row = self._connection().execute(
+            'SELECT "VerificationCode", "Timestamp" FROM verification_codes WHERE "Email" = ?', (email,)
+        ).fetchone()
+        return None if row is None else (row[0], row[1])
+
+    def upsert_verification_code(self, email, code, timestamp):
+        with self._transaction() as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO verification_codes ("Email", "VerificationCode", "Timestamp") VALUES (?, ?, ?)',
+                (email, str(code), str(timestamp)),
+            )
+
+    def delete_verification_code(self, email):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM verification_codes WHERE "Email" = ?', (email,))
+
+    def load_verification_codes(self):
+        return self._connection().execute(
+            'SELECT "Email", "VerificationCode", "Timestamp" FROM verification_codes'
+        ).fetchall()
+
+    def delete_verification_codes(self, entries):
+        with self._transaction() as conn:
+            conn.executemany('DELETE FROM verification_codes WHERE "Email" = ? AND "Timestamp" = ?',
+                             [(email, str(timestamp)) for email, timestamp in entries])
+
+    # To-do tasks
+    def load_todo_tasks(self, email=None):
+        select = "SELECT " + ", ".join(_quote(c) for c in TODO_COLUMNS) + " FROM todo_tasks"
+        if email is None:
+            todo_df = self._query(select + " ORDER BY rowid")
+        else:
+            todo_df = self._query(select + ' WHERE "Email" = ? ORDER BY rowid', (email,))
+        todo_df["Reminder"] = todo_df["Reminder"].astype(bool)
+        return todo_df
+
+    def insert_todo_task(self, row):
+        self._insert("todo", "todo_tasks", TODO_COLUMNS, _clean_todo(row))
+
+    def insert_todo_tasks(self, rows):
+        self._insert_batch("todo", "todo_tasks", TODO_COLUMNS, [_clean_todo(row) for row in rows])
+
+    def iter_todo_tasks(self, email, chunk_size=1000):
+        for chunk in self._iter_rows("todo_tasks", TODO_COLUMNS, email, chunk_size):
+            chunk["Reminder"] = chunk["Reminder"].astype(bool)
+            yield chunk
+
+    def update_todo_task(self, email, task, changes):
+        assignments = ", ".join(f"{_quote(column)} = ?" for column in changes)
+        where, params = '"Email" = ? AND "Task" = ?', (email, task)
+        with self._transaction() as conn:
+            self._count(conn, "todo", self._select_rows(conn, "todo_tasks", TODO_COLUMNS, where, params), -1)
+            conn.execute(f"UPDATE todo_tasks SET {assignments} WHERE {where}", (*changes.values(), *params))
+            self._count(conn, "todo", self._select_rows(conn, "todo_tasks", TODO_COLUMNS, where, params), 1)
+            self._bump(conn, "todo", email)
+
+    def delete_todo_task(self, email, task):
+        where, params = '"Email" = ? AND "Task" = ?', (email, task)
+        with self._transaction() as conn:
+            self._count(conn, "todo", self._select_rows(conn, "todo_tasks", TODO_COLUMNS, where, params), -1)
+            conn.execute(f"DELETE FROM todo_tasks WHERE {where}", params)
+            self._bump(conn, "todo", email)
+
+    # Schedule tasks
+    def load_schedule_tasks(self, email=None, day=None):
+        sql = "SELECT " + ", ".join(_quote(c) for c in SCHEDULE_COLUMNS) + " FROM schedule_tasks"
+        clauses, params = [], []
+        if email is not None:
+            clauses.append('"Email" = ?')
+            params.append(email)
+        if day is not None:
+            clauses.append('"Day" = ?')
+            params.append(day)
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        return self._query(sql + " ORDER BY rowid", tuple(params))
+
+    def insert_schedule_task(self, row):
+        self._insert("schedule", "schedule_tasks", SCHEDULE_COLUMNS, _clean_schedule(row))
+
+    def insert_schedule_tasks(self, rows):
+        self._insert_batch("schedule", "schedule_tasks", SCHEDULE_COLUMNS, [_clean_schedule(row) for row in rows])
+
+    def iter_schedule_tasks(self, email, chunk_size=1000):
+        return self._iter_rows("schedule_tasks", SCHEDULE_COLUMNS, email, chunk_size)
+
+    def load_group_schedule_tasks(self, emails):
+        return self._select_for_emails("schedule_tasks", SCHEDULE_COLUMNS, emails)
+
+    def delete_schedule_task(self, email, task, day):
+        where, params = '"Email" = ? AND "Task" = ? AND "Day" = ?', (email, task, day)
+        with self._transaction() as conn:
+            self._count(conn, "schedule", self._select_rows(conn, "schedule_tasks", SCHEDULE_COLUMNS, where, params), -1)
+            conn.execute(f"DELETE FROM schedule_tasks WHERE {where}", params)
+            self._bump(conn, "schedule", email)
+
+    # Dated events
+    def load_events(self, email=None):
+        sql = "SELECT " + ", ".join(_quote(c) for c in EVENT_COLUMNS) + " FROM schedule_events"
+        if email is None:
+            return self._query(sql + " ORDER BY rowid")
+        return self._query(sql + ' WHERE "Email" = ? ORDER BY rowid', (email,))
+
+    def load_group_events(self, emails):
+        return self._select_for_emails("schedule_events", EVENT_COLUMNS, emails)
+
+    def insert_event(self, row):
+        self._insert("event", "schedule_events", EVENT_COLUMNS, _clean_event(row))
+
+    # Insert events for several users in one transaction, after checking the
+    # expected {(kind, email): version} under the write lock
+    def insert_events(self, rows, expected=None):
+        rows = [_clean_event(row) for row in rows]
+        with self._transaction() as conn:
+            _check_versions(self, expected or {})
+            self._insert_many(conn, "schedule_events", EVENT_COLUMNS, rows)
+            for email in _group_by_email(rows):
+                self._bump(conn, "event", email)
+
+    def update_event(self, email, task, start, changes):
+        assignments = ", ".join(f"{_quote(column)} = ?" for column in changes)
+        with self._transaction() as conn:
+            conn.execute(f'UPDATE schedule_events SET {assignments} WHERE "Email" = ? AND "Task" = ? AND "Start" = ?',
+                         (*changes.values(), email, task, start))
+            self._bump(conn, "event", email)
+
+    def delete_event(self, email, task, start):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM schedule_events WHERE "Email" = ? AND "Task" = ? AND "Start" = ?', (email, task, start))
+            self._bump(conn, "event", email)
+
+    def _insert(self, kind, table, columns, row):
+        placeholders = ", ".join("?" for _ in columns)
+        with self._transaction() as conn:
+            conn.execute(
+                f"INSERT INTO {table} ({', '.join(_quote(c) for c in columns)}) VALUES ({placeholders})",
+                tuple(row[c] for c in columns),
+            )
+            self._count(conn, kind, [row], 1)
+            self._bump(conn, kind, row["Email"])
+
+    # Insert a batch of rows in one transaction
+    def _insert_batch(self, kind, table, columns, rows):
+        with self._transaction() as conn:
+            self._insert_many(conn, table, columns, rows)
+            for email, user_rows in _group_by_email(rows).items():
+                self._count(conn, kind, user_rows, 1)
+                self._bump(conn, kind, email)
+
+    # Rows of several users, one indexed IN query per EMAILS_PER_QUERY users
+    def _select_for_emails(self, table, columns, emails):
+        select = f"SELECT {', '.join(_quote(c) for c in columns)} FROM {table}"
+        frames = []
+        for i in range(0, len(emails), self.EMAILS_PER_QUERY):
+            chunk = list(emails[i:i + self.EMAILS_PER_QUERY])
+            frames.append(self._query(f'{select} WHERE "Email" IN ({", ".join("?" for _ in chunk)}) ORDER BY rowid',
+                                      tuple(chunk)))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+    # Stream a user's rows in chunks from one read cursor
+    def _iter_rows(self, table, columns, email, chunk_size):
+        select = ", ".join(_quote(c) for c in columns)
+        cursor = self._connection().execute(f'SELECT {select} FROM {table} WHERE "Email" = ? ORDER BY rowid', (email,))
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return
+            yield pd.DataFrame(rows, columns=columns)
+
+    # Bulk-load rows in a single transaction (used by the CSV migration)
+    def _insert_many(self, conn, table, columns, rows):
+        placeholders = ", ".join("?" for _ in columns)
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(_quote(c) for c in columns)}) VALUES ({placeholders})",
+            [tuple(row[c] for c in columns) for row in rows],
+        )
+
+    # One-shot import of the legacy CSV files; later calls are no-ops
+    def migrate_from_csv(self, csv_storage):
+        with self._transaction() as conn:
+            if conn.execute('SELECT 1 FROM meta WHERE "Key" = ?', ("csv_migrated",)).fetchone():
+                return False
+            for filename, table, columns, clean in [
+                (csv_storage.users_file, "users", USER_COLUMNS, None),
+                (csv_storage.verification_code_file, "verification_codes", VERIFICATION_CODE_COLUMNS, None),
+                (csv_storage.todo_file, "todo_tasks", TODO_COLUMNS, _clean_todo),
+                (csv_storage.schedule_file, "schedule_tasks", SCHEDULE_COLUMNS, _clean_schedule),
+                (csv_storage.event_file, "schedule_events", EVENT_COLUMNS, _clean_event),
+            ]:
+                if not os.path.exists(filename):
+                    continue
+                rows = pd.read_csv(filename, dtype={"VerificationCode": str}).to_dict("records")
+                if clean is not None:
+                    rows = [clean(row) for row in rows]
+                if table in ("users", "verification_codes"):
+                    # Later rows win, matching how the CSV code overwrote entries
+                    rows = list({row["Email"]: row for row in rows}.values())
+                self._insert_many(conn, table, columns, rows)
+            self._rebuild_stats(conn)
+            conn.execute('INSERT INTO meta ("Key", "Value") VALUES (?, ?)', ("csv_migrated", "1"))
+        return True
+
+
+# Explicit BEGIN IMMEDIATE/COMMIT so writers serialise instead of failing mid-transaction
+class _Transaction:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+        return False
+
+
+# Open (or reuse) the configured storage backend
+def open_storage(backend, users_file, todo_file, schedule_file, verification_code_file, database_file):
+    key = (backend, users_file, todo_file, schedule_file, verification_code_file, database_file)
+    with _instances_lock:
+        storage = _instances.get(key)
+        if storage is None:
+            csv_storage = CsvStorage(users_file, todo_file, schedule_file, verification_code_file)
+            if backend == "csv":
+                storage = csv_storage
+            elif backend == "partitioned":
+                storage = PartitionedCsvStorage(users_file, todo_file, schedule_file, verification_code_file)
+            elif backend == "sqlite":
+                storage = SQLiteStorage(database_file)
+                storage.migrate_from_csv(csv_storage)
+            else:
+                raise ValueError(f"Unknown storage backend: {backend}")
+            _instances[key] = storage
+        return storage
+
+
+# Command line entry point for running the CSV migration by hand
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Migrate the Schedule App CSV files into SQLite.")
+    parser.add_argument("--database", default="schedule_app.db")
+    parser.add_argument("--users", default="users.csv")
+    parser.add_argument("--todo", default="todo_tasks.csv")
+    parser.add_argument("--schedule", default="schedule_tasks.csv")
+    parser.add_argument("--codes", default="verification_codes.csv")
+    args = parser.parse_args()
+
+    csv_storage = CsvStorage(args.users, args.todo, args.schedule, args.codes)
+    if SQLiteStorage(args.database).migrate_from_csv(csv_storage):
+        print(f"Migrated CSV data into {args.database}")
+    else:
+        print(f"{args.database} was already migrated")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pytest
+
+# The app is a set of flat modules in the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from storage import CsvStorage, PartitionedCsvStorage, SQLiteStorage  # noqa: E402
+
+BACKENDS = ["csv", "partitioned", "sqlite"]
+
+
+# A fresh storage backend whose files live in directory
+def make_storage(backend, directory):
+    if backend == "sqlite":
+        return SQLiteStorage(str(directory / "schedule_app.db"))
+    files = [str(directory / name) for name in ("users.csv", "todo_tasks.csv", "schedule_tasks.csv",
+                                                 "verification_codes.csv")]
+    return PartitionedCsvStorage(*files) if backend == "partitioned" else CsvStorage(*files)
+
+
+@pytest.fixture(params=BACKENDS)
+def storage(request, tmp_path):
+    return make_storage(request.param, tmp_path)
+
+
+# The scheduling core running on a fresh SQLite store, with its process-wide caches emptied
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    import core
+    from cache import suggestion_cache, task_cache
+    from intervals import interval_indexes
+    from recurrence import calendar_indexes
+
+    storage = make_storage("sqlite", tmp_path)
+    monkeypatch.setattr(core, "get_storage", lambda: storage)
+    for cache in (task_cache, suggestion_cache, interval_indexes, calendar_indexes):
+        cache.clear()
+    yield core
+    for cache in (task_cache, suggestion_cache, interval_indexes, calendar_indexes):
+        cache.clear()
+
+
+# Clock for TTL tests that only moves when told to
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,41 @@
+import pandas as pd
+
+from analytics import UserStats, deadline_weeks, scheduled_minutes
+
+TODOS = pd.DataFrame({
+    "Status": ["Pending", "Completed", "Completed", "In Progress"],
+    "Deadline": ["2026-10-20", "2026-10-25", "2026-10-26", "2026-10-28"],
+})
+SCHEDULE = pd.DataFrame({
+    "Day": ["Friday", "Monday", "Friday"],
+    "Time From": ["10:00 PM", "09:00 AM", "08:00 AM"],
+    "Time To": ["02:00 AM", "10:30 AM", "09:00 AM"],
+})
+
+
+def test_weeks_start_on_monday():
+    assert deadline_weeks(["2026-10-19", "2026-10-25", "2026-10-26"]) == ["2026-10-19", "2026-10-19", "2026-10-26"]
+
+
+def test_slots_past_midnight_count_until_their_end():
+    assert scheduled_minutes("10:00 PM", "02:00 AM") == 4 * 60
+    assert scheduled_minutes("09:00 AM", "10:30 AM") == 90
+
+
+def test_stats_from_frames():
+    stats = UserStats.from_frames(TODOS, SCHEDULE)
+    assert stats.todo_counts == {("Pending", "2026-10-19"): 1, ("Completed", "2026-10-19"): 1,
+                                 ("Completed", "2026-10-26"): 1, ("In Progress", "2026-10-26"): 1}
+    assert stats.status_counts().to_dict() == {"Pending": 1, "In Progress": 1, "Completed": 2}
+    assert stats.weekday_hours().to_dict() == {"Monday": 1.5, "Friday": 5.0}
+
+    trend = stats.completion_trend()
+    assert trend.index.tolist() == ["2026-10-19", "2026-10-26"]
+    assert trend["Completion Rate"].tolist() == [0.5, 0.5]
+
+
+def test_empty_stats():
+    stats = UserStats.from_frames(TODOS[:0], SCHEDULE[:0])
+    assert stats.empty and stats.status_counts().empty and stats.completion_trend().empty
+    # Zero counts left by deletes do not show up
+    assert UserStats({("Pending", "2026-10-19"): 0}, {"Monday": 0}).empty
@@ -0,0 +1,67 @@
+import pytest
+
+from auth import LegacySha256Hasher, Pbkdf2Hasher, ScryptHasher, UserDirectory
+
+# Cheap costs keep the tests fast; the formats are the same
+CURRENT = Pbkdf2Hasher(iterations=1000)
+
+
+# Counts verify calls, to see that unknown emails cost a check too
+class CountingHasher(Pbkdf2Hasher):
+    calls = 0
+
+    def verify(self, password, encoded):
+        self.calls += 1
+        return super().verify(password, encoded)
+
+
+@pytest.mark.parametrize("old", [LegacySha256Hasher(), Pbkdf2Hasher(iterations=500), ScryptHasher(n=2 ** 8)])
+def test_older_hashes_log_in_and_are_upgraded(storage, old):
+    storage.insert_user("a@x.com", old.hash("secret"))
+    users = UserDirectory(storage, CURRENT)
+    assert not users.authenticate("a@x.com", "wrong")
+    assert users.authenticate("a@x.com", "secret")
+    assert storage.get_user_password("a@x.com").startswith("pbkdf2_sha256$1000$")
+    assert users.authenticate("a@x.com", "secret")
+    assert UserDirectory(storage, CURRENT).authenticate("a@x.com", "secret")
+
+
+def test_current_hashes_are_kept(storage):
+    storage.insert_user("a@x.com", CURRENT.hash("secret"))
+    version = storage.version("users", "a@x.com")
+    assert UserDirectory(storage, CURRENT).authenticate("a@x.com", "secret")
+    assert storage.version("users", "a@x.com") == version
+
+
+def test_password_changes_from_other_processes_are_seen(storage):
+    storage.insert_user("a@x.com", CURRENT.hash("secret"))
+    users = UserDirectory(storage, CURRENT)
+    assert users.authenticate("a@x.com", "secret")
+    storage.update_user_password("a@x.com", CURRENT.hash("changed"))
+    assert not users.authenticate("a@x.com", "secret")
+    assert users.authenticate("a@x.com", "changed")
+
+
+@pytest.mark.parametrize("stored", ["", "é", "pbkdf2_sha256$1000", "pbkdf2_sha256$x$c2FsdA$ZGlnZXN0",
+                                    "pbkdf2_sha256$1000$!!$!!", "scrypt$16$8", "scrypt$3$8$1$c2FsdA$ZGlnZXN0",
+                                    "scrypt$16384$8$1$c2FsdA", "bcrypt$2b$12$abc"])
+def test_malformed_hashes_fail_the_login(storage, stored):
+    storage.insert_user("a@x.com", stored)
+    assert not UserDirectory(storage, CURRENT).authenticate("a@x.com", "secret")
+
+
+def test_unknown_emails_are_checked_against_a_throwaway_hash(storage):
+    hasher = CountingHasher(iterations=1000)
+    users = UserDirectory(storage, hasher)
+    assert not users.authenticate("nobody@x.com", "secret")
+    assert not users.authenticate("nobody@x.com", "secret")
+    assert hasher.calls == 2
+
+
+def test_accounts_are_registered_once(storage):
+    users = UserDirectory(storage, CURRENT)
+    users.add_user("a@x.com", "secret")
+    assert users.exists("a@x.com") and not users.exists("b@x.com")
+    with pytest.raises(ValueError):
+        users.add_user("a@x.com", "other")
+    assert users.authenticate("a@x.com", "secret")
@@ -0,0 +1,61 @@
+from datetime import date, datetime
+
+import pandas as pd
+
+from autoscheduler import auto_schedule
+
+NOW = datetime(2026, 10, 19, 9, 0)
+MONDAY = NOW.date()
+NO_SCHEDULE = pd.DataFrame(columns=["Email", "Task", "Day", "Time From", "Time To"])
+
+
+def _todos(*rows):
+    return pd.DataFrame([{"Email": "a@x.com", "Task": task, "Deadline": deadline, "Status": status,
+                          "Time Needed": minutes, "Priority": priority, "Reminder": False}
+                         for task, deadline, minutes, priority, status in rows])
+
+
+def _blocks(result):
+    return [(block["Task"], block["Date"], block["Time From"], block["Time To"]) for block in result.blocks]
+
+
+def test_work_is_placed_up_to_and_on_the_deadline_day():
+    result = auto_schedule(_todos(("Essay", "2026-10-19", 60, "High", "Pending")), NO_SCHEDULE, NOW)
+    assert _blocks(result) == [("Essay", MONDAY, "09:00 AM", "10:00 AM")]
+    assert result.score == 1.0 and result.unscheduled == {}
+
+
+def test_busy_time_and_completed_todos_are_skipped():
+    schedule = pd.DataFrame([{"Email": "a@x.com", "Task": "Gym", "Day": "Monday", "Time From": "09:00 AM",
+                              "Time To": "10:30 AM"}])
+    todos = _todos(("Essay", "2026-10-19", 45, "High", "Pending"), ("Done", "2026-10-19", 60, "High", "Completed"))
+    assert _blocks(auto_schedule(todos, schedule, NOW)) == [("Essay", MONDAY, "10:30 AM", "11:15 AM")]
+    assert auto_schedule(todos[1:], schedule, NOW).blocks == []
+
+
+def test_scarce_time_goes_to_higher_priorities():
+    hours = {"Monday": [(9 * 60, 10 * 60)]}
+    todos = _todos(("Chores", "2026-10-19", 60, "Low", "Pending"), ("Essay", "2026-10-19", 60, "High", "Pending"))
+    result = auto_schedule(todos, NO_SCHEDULE, NOW, working_hours=hours)
+    assert _blocks(result) == [("Essay", MONDAY, "09:00 AM", "10:00 AM")]
+    assert result.unscheduled == {0: 60}
+    assert result.score == 3 * 60 / (3 * 60 + 60)
+
+
+def test_todos_with_the_same_name_are_scheduled_separately():
+    hours = {"Monday": [(9 * 60, 12 * 60)]}
+    todos = _todos(("Essay", "2026-10-19", 60, "High", "Pending"), ("Essay", "2026-10-19", 90, "High", "Pending"))
+    result = auto_schedule(todos, NO_SCHEDULE, NOW, working_hours=hours)
+    assert result.tasks == {0: "Essay", 1: "Essay"}
+    assert result.scheduled == {0: 60, 1: 90}
+    assert sum(block["Minutes"] for block in result.blocks) == 150
+
+
+def test_daily_cap_spreads_work_over_days():
+    todos = _todos(("Essay", "2026-10-21", 150, "High", "Pending"))
+    result = auto_schedule(todos, NO_SCHEDULE, NOW, max_minutes_per_day=60)
+    assert [(block["Date"], block["Minutes"]) for block in result.blocks] == \
+        [(MONDAY, 60), (date(2026, 10, 20), 60), (date(2026, 10, 21), 30)]
+    # A review day moves the last usable day forward
+    result = auto_schedule(todos, NO_SCHEDULE, NOW, max_minutes_per_day=60, review_days=1)
+    assert result.unscheduled == {0: 30}
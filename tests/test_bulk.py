@@ -0,0 +1,133 @@
+import io
+import random
+from datetime import date
+
+import pytest
+
+from bulk import (BulkImportError, export_tasks, find_batch_overlaps, read_schedule_tasks, read_todo_tasks,
+                  validate_schedule_rows, validate_todo_rows)
+from intervals import split_overnight
+from records import DAYS_OF_WEEK
+
+
+def _calendar(*components):
+    return io.StringIO("BEGIN:VCALENDAR\r\nVERSION:2.0\r\n" + "".join(components) + "END:VCALENDAR\r\n")
+
+
+def _vevent(summary, *lines):
+    return "BEGIN:VEVENT\r\nSUMMARY:" + summary + "\r\n" + "".join(line + "\r\n" for line in lines) + "END:VEVENT\r\n"
+
+
+def test_todo_rows_are_checked_and_normalised():
+    rows = validate_todo_rows("a@x.com", read_todo_tasks(io.StringIO(
+        "Task,Deadline,Time Needed,Reminder\nEssay,2026-10-20,90,yes\nRead,2026-10-21,,\n")))
+    assert rows == [
+        {"Email": "a@x.com", "Task": "Essay", "Deadline": date(2026, 10, 20), "Status": "Pending", "Time Needed": 90,
+         "Priority": "Medium", "Reminder": True},
+        {"Email": "a@x.com", "Task": "Read", "Deadline": date(2026, 10, 21), "Status": "Pending", "Time Needed": 60,
+         "Priority": "Medium", "Reminder": False}]
+
+    with pytest.raises(BulkImportError) as error:
+        validate_todo_rows("a@x.com", read_todo_tasks(io.StringIO(
+            "Task,Deadline,Status,Time Needed\n,2026-10-20,Pending,60\nEssay,2026-10-20,Started,60\n"
+            "Read,2026-10-20,Pending,-5\n")))
+    assert [problem.split(":")[0] for problem in error.value.problems] == ["row 1", "row 2", "row 3"]
+
+
+def test_schedule_rows_accept_common_time_formats():
+    rows = validate_schedule_rows("a@x.com", read_schedule_tasks(io.StringIO(
+        "Task,Day,Time From,Time To\nGym,monday,17:30,7:00 pm\n")))
+    assert rows == [{"Email": "a@x.com", "Task": "Gym", "Day": "Monday", "Time From": "05:30 PM",
+                     "Time To": "07:00 PM"}]
+
+
+@pytest.mark.parametrize("data", [b"Task,Deadline\n\"Essay,2026-10-20\n", b"", b"\xff\xfeTask\n"])
+def test_unreadable_csv_files_are_reported(data):
+    for read in (read_todo_tasks, read_schedule_tasks):
+        with pytest.raises(BulkImportError):
+            read(io.BytesIO(data))
+
+
+def test_icalendar_todos():
+    todo_df = read_todo_tasks(_calendar(
+        "BEGIN:VTODO\r\nSUMMARY:Essay\\, draft\r\nDUE;VALUE=DATE:20261020\r\nSTATUS:IN-PROCESS\r\n"
+        "PRIORITY:1\r\nESTIMATED-DURATION:PT1H30M\r\nBEGIN:VALARM\r\nTRIGGER:-P1D\r\nEND:VALARM\r\nEND:VTODO\r\n"))
+    assert todo_df.to_dict("records") == [{"Task": "Essay, draft", "Deadline": date(2026, 10, 20),
+                                           "Status": "In Progress", "Time Needed": 90, "Priority": "High",
+                                           "Reminder": True}]
+
+    with pytest.raises(BulkImportError) as error:
+        read_todo_tasks(_calendar("BEGIN:VTODO\r\nSUMMARY:A\r\nDUE:2026-10-20\r\nEND:VTODO\r\n",
+                                  "BEGIN:VTODO\r\nSUMMARY:B\r\nDUE:20261020\r\nEND:VTODO\r\n",
+                                  "BEGIN:VTODO\r\nSUMMARY:C\r\nPRIORITY:high\r\nEND:VTODO\r\n"))
+    assert [problem.split(":")[0] for problem in error.value.problems] == ["todo 1", "todo 3"]
+
+
+def test_icalendar_events():
+    schedule_df = read_schedule_tasks(_calendar(
+        _vevent("Gym", "DTSTART:20261019T173000", "DTEND:20261019T190000"),
+        _vevent("Night shift", "DTSTART:20261023T220000Z", "DURATION:PT4H")))
+    assert schedule_df.to_dict("records") == [
+        {"Task": "Gym", "Day": "Monday", "Time From": "05:30 PM", "Time To": "07:00 PM"},
+        {"Task": "Night shift", "Day": "Friday", "Time From": "10:00 PM", "Time To": "02:00 AM"}]
+
+
+@pytest.mark.parametrize("lines", [["DTSTART;VALUE=DATE:20261019", "DTEND;VALUE=DATE:20261020"],
+                                   ["DTSTART;VALUE=DATE:20261019"], ["DTSTART:20261019T090000"],
+                                   ["DTSTART:20261019T090000", "DTEND:20261019T080000"],
+                                   ["DTSTART:20261019T090000", "DURATION:PT1X"], ["DTSTART:tomorrow"]])
+def test_icalendar_events_that_cannot_be_weekly_slots(lines):
+    with pytest.raises(BulkImportError) as error:
+        read_schedule_tasks(_calendar(_vevent("Fine", "DTSTART:20261019T090000", "DURATION:PT1H"),
+                                      _vevent("Bad", *lines)))
+    assert [problem.split(":")[0] for problem in error.value.problems] == ["event 2"]
+
+
+def test_exports_read_back(storage):
+    storage.insert_todo_tasks(validate_todo_rows("a@x.com", read_todo_tasks(io.StringIO(
+        "Task,Deadline,Status,Time Needed,Priority,Reminder\nEssay,2026-10-20,In Progress,90,High,True\n"
+        "Read,2026-10-21,Pending,30,Low,False\n"))))
+    storage.insert_schedule_tasks(validate_schedule_rows("a@x.com", read_schedule_tasks(io.StringIO(
+        "Task,Day,Time From,Time To\nNight shift,Friday,10:00 PM,02:00 AM\n"))))
+    for file_format in ("csv", "ics"):
+        text = "".join(export_tasks(storage, "todo", "a@x.com", file_format, chunk_size=1))
+        todo_df = read_todo_tasks(io.StringIO(text))
+        assert todo_df["Task"].tolist() == ["Essay", "Read"]
+        assert todo_df["Time Needed"].tolist() == [90, 30]
+        assert [str(flag) for flag in todo_df["Reminder"]] == ["True", "False"]
+
+        text = "".join(export_tasks(storage, "schedule", "a@x.com", file_format))
+        assert validate_schedule_rows("a@x.com", read_schedule_tasks(io.StringIO(text))) == [
+            {"Email": "a@x.com", "Task": "Night shift", "Day": "Friday", "Time From": "10:00 PM",
+             "Time To": "02:00 AM"}]
+
+
+# Whether any new interval overlaps another new or an existing one, minute by minute
+def _brute_force_conflict(existing, new):
+    pieces = [(piece, is_new) for entries, is_new in ((existing, False), (new, True))
+              for day, start, end, _ in entries for piece in split_overnight(day, start, end)]
+    for i, ((day, start, end), is_new) in enumerate(pieces):
+        for j, ((other_day, other_start, other_end), other_new) in enumerate(pieces):
+            if i < j and (is_new or other_new) and day == other_day and start < other_end and other_start < end:
+                return True
+    return False
+
+
+def test_find_batch_overlaps_matches_brute_force():
+    rng = random.Random(3)
+    days = DAYS_OF_WEEK[:2]
+    for _ in range(500):
+        # Minutes near midnight so that overnight slots are common
+        slots = [(rng.choice(days), rng.randrange(1380, 1440), rng.randrange(0, 1440), f"t{i}") for i in range(5)]
+        slots = [(day, start, end, task) for day, start, end, task in slots if end != start]
+        existing, new = slots[:2], slots[2:]
+        conflicts = find_batch_overlaps(existing, new)
+        assert bool(conflicts) == _brute_force_conflict(existing, new)
+        assert all(task in {entry[3] for entry in new} for task, _, _ in conflicts)
+
+
+def test_find_batch_overlaps_reports_both_tasks():
+    existing = [("Friday", 22 * 60, 2 * 60, "Night shift")]
+    new = [("Saturday", 60, 120, "Run"), ("Saturday", 180, 240, "Swim")]
+    assert find_batch_overlaps(existing, new) == [("Run", "Night shift", "Saturday")]
+    assert find_batch_overlaps([], [("Monday", 60, 120, "A"), ("Monday", 90, 150, "B")]) == [("B", "A", "Monday")]
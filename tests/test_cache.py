@@ -0,0 +1,65 @@
+import pandas as pd
+
+from cache import FrameCache, ResultCache
+
+
+def _loader(frame, calls):
+    def load():
+        calls.append(1)
+        return frame
+    return load
+
+
+def test_frames_are_reused_until_the_version_moves():
+    cache = FrameCache()
+    calls = []
+    frame = pd.DataFrame({"Task": ["Essay"]})
+    first = cache.get(("todo", "a@x.com"), 1, _loader(frame, calls))
+    first.loc[0, "Task"] = "Changed by the caller"
+    assert cache.get(("todo", "a@x.com"), 1, _loader(frame, calls))["Task"].tolist() == ["Essay"]
+    assert len(calls) == 1
+
+    cache.get(("todo", "a@x.com"), 2, _loader(frame, calls))
+    cache.invalidate(("todo", "a@x.com"))
+    cache.get(("todo", "a@x.com"), 2, _loader(frame, calls))
+    assert len(calls) == 3
+    assert cache.stats()["hits"] == 1
+
+
+def test_loads_overtaken_by_a_write_are_not_kept():
+    cache = FrameCache()
+    calls = []
+
+    def load():
+        calls.append(1)
+        cache.invalidate(("todo", "a@x.com"))
+        return pd.DataFrame()
+
+    cache.get(("todo", "a@x.com"), 1, load)
+    cache.get(("todo", "a@x.com"), 1, load)
+    assert len(calls) == 2
+
+
+def test_least_recently_used_frames_are_evicted():
+    cache = FrameCache(max_entries=2)
+    calls = []
+    for email in ("a@x.com", "b@x.com", "a@x.com", "c@x.com", "a@x.com", "b@x.com"):
+        cache.get(("todo", email), 1, _loader(pd.DataFrame(), calls))
+    assert len(calls) == 4
+
+
+def test_results_are_recomputed_only_for_new_keys():
+    cache = ResultCache(max_users=1)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return object()
+
+    first = cache.get("a@x.com", (1, 1), compute)
+    assert cache.get("a@x.com", (1, 1), compute) is first
+    assert cache.get("a@x.com", (1, 2), compute) is not first
+    # One entry per user, and the least recently used user is evicted
+    cache.get("b@x.com", (1, 1), compute)
+    cache.get("a@x.com", (1, 2), compute)
+    assert len(calls) == 4
@@ -0,0 +1,21 @@
+import pandas as pd
+
+import bench
+from charts import ChartRenderer
+
+
+def test_charts_render_without_pyplot():
+    assert bench.check_chart_rendering() is False
+
+
+def test_unchanged_charts_are_not_drawn_again():
+    renderer = ChartRenderer()
+    try:
+        data = pd.Series([1.5, 4.0], index=["Monday", "Friday"])
+        image = renderer.render("weekly_working_time", data)
+        assert image.startswith(b"\x89PNG")
+        assert renderer.render("weekly_working_time", data.copy()) is image
+        renderer.render("weekly_working_time", data * 2)
+        assert renderer.stats() == {"hits": 1, "misses": 2, "images": 2}
+    finally:
+        renderer.close()
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from auth import UserDirectory
+from bulk import BulkImportError
+
+EMAIL = "a@x.com"
+
+
+def _next(weekday, hour):
+    today = datetime.now().replace(hour=hour, minute=0, second=0, microsecond=0)
+    return today + timedelta(days=(weekday - today.weekday()) % 7 + 7)
+
+
+def test_weekly_slots_clash_with_each_other(app):
+    app.save_schedule_task(EMAIL, "Night shift", "Friday", "10:00 PM", "02:00 AM")
+    assert app.check_overlap(EMAIL, "Saturday", "01:00 AM", "03:00 AM")
+    assert not app.check_overlap(EMAIL, "Saturday", "02:00 AM", "03:00 AM")
+    with pytest.raises(app.ScheduleConflictError):
+        app.save_schedule_task(EMAIL, "Run", "Friday", "11:00 PM", "11:30 PM")
+
+
+def test_weekly_slots_clash_with_dated_events(app):
+    dentist = _next(2, 9)
+    app.save_event(EMAIL, "Dentist", dentist, dentist + timedelta(hours=1))
+    assert app.check_overlap(EMAIL, "Wednesday", "09:30 AM", "10:30 AM")
+    assert not app.check_overlap(EMAIL, "Wednesday", "10:00 AM", "11:00 AM")
+    assert not app.check_overlap(EMAIL, "Thursday", "09:00 AM", "10:00 AM")
+
+    with pytest.raises(BulkImportError):
+        app.save_schedule_tasks_bulk(EMAIL, pd.DataFrame([
+            {"Task": "Gym", "Day": "Wednesday", "Time From": "08:30 AM", "Time To": "09:30 AM"}]))
+    assert app.load_schedule_tasks(EMAIL).empty
+
+
+def test_events_clash_with_the_weekly_schedule(app):
+    app.save_schedule_task(EMAIL, "Gym", "Monday", "06:00 PM", "07:00 PM")
+    with pytest.raises(app.ScheduleConflictError):
+        start = _next(0, 18)
+        app.save_event(EMAIL, "Dinner", start + timedelta(minutes=30), start + timedelta(hours=2))
+    # A weekly rule hits the Monday slot even though it starts on a Tuesday
+    with pytest.raises(app.ScheduleConflictError):
+        start = _next(1, 18)
+        app.save_event(EMAIL, "Class", start, start + timedelta(hours=1), "FREQ=WEEKLY;BYDAY=TU,MO")
+
+
+def test_free_time_slots_skip_booked_time(app):
+    app.save_schedule_task(EMAIL, "Lunch", "Tuesday", "12:00 PM", "01:00 PM")
+    for schedule_df in (None, app.load_schedule_tasks(EMAIL)):
+        slots = app.find_free_time_slots(schedule_df, 60, EMAIL, "Tuesday", prefer_afternoon=False)
+        assert [slot.strftime("%I:%M %p") for slot in slots] == ["09:00 AM", "01:00 PM"]
+
+
+def test_bulk_schedule_imports_are_all_or_nothing(app):
+    app.save_schedule_task(EMAIL, "Gym", "Monday", "06:00 PM", "07:00 PM")
+    swim = {"Task": "Swim", "Day": "Tuesday", "Time From": "09:00 AM", "Time To": "10:00 AM"}
+    with pytest.raises(BulkImportError) as error:
+        app.save_schedule_tasks_bulk(EMAIL, pd.DataFrame(
+            [swim, {"Task": "Run", "Day": "Monday", "Time From": "06:30 PM", "Time To": "07:30 PM"}]))
+    assert error.value.problems == ["'Run' overlaps 'Gym' on Monday"]
+    assert len(app.load_schedule_tasks(EMAIL)) == 1
+
+    assert app.save_schedule_tasks_bulk(EMAIL, pd.DataFrame([swim])) == 1
+    assert app.check_overlap(EMAIL, "Tuesday", "09:30 AM", "10:30 AM")
+
+
+# Another session registers the email between the existence check and the insert
+def test_racing_registrations_are_refused(app, monkeypatch):
+    app.get_user_directory().add_user(EMAIL, "first")
+    monkeypatch.setattr(UserDirectory, "exists", lambda self, email: False)
+    app.get_verification_codes().set(EMAIL, "123456")
+    with pytest.raises(app.RegistrationError):
+        app.register_user(EMAIL, "second", "123456")
+    assert app.validate_user(EMAIL, "first")
+
+
+def test_suggestions_skip_completed_and_keep_duplicates(app):
+    deadline = (datetime.now() + timedelta(days=5)).strftime("%Y-%m-%d")
+    for status in ("Pending", "Pending", "Completed"):
+        app.save_todo_task(EMAIL, "Essay", deadline, status, 120, "High", False)
+    suggestions, minutes, tasks = app.suggest_schedule(EMAIL, datetime.now().replace(hour=8))
+    assert sorted(tasks.values()) == ["Essay", "Essay"]
+    assert set(suggestions) == set(minutes) == set(tasks)
+
+
+def test_suggestions_are_cached_until_a_write(app):
+    deadline = (datetime.now() + timedelta(days=5)).strftime("%Y-%m-%d")
+    app.save_todo_task(EMAIL, "Essay", deadline, "Pending", 120, "High", False)
+    now = datetime.now().replace(hour=8, minute=7)
+    first = app.suggest_schedule(EMAIL, now)
+    assert app.suggest_schedule(EMAIL, now.replace(minute=14)) is first
+
+    app.save_schedule_task(EMAIL, "Gym", "Monday", "06:00 PM", "07:00 PM")
+    assert app.suggest_schedule(EMAIL, now) is not first
+
+
+def test_group_booking_is_all_or_nothing(app):
+    busy = _next(3, 14)
+    app.save_event("b@x.com", "Busy", busy, busy + timedelta(hours=1))
+    with pytest.raises(app.ScheduleConflictError):
+        app.book_group_event([EMAIL, "b@x.com"], "Review", busy, busy + timedelta(hours=1))
+    assert app.load_events(EMAIL).empty
+
+    app.book_group_event([EMAIL, "b@x.com"], "Review", busy + timedelta(hours=1), busy + timedelta(hours=2))
+    assert len(app.load_events(EMAIL)) == len(app.load_events("b@x.com")) - 1 == 1
+
+
+def test_group_free_time_counts_weekly_and_dated_busy_time(app):
+    day = _next(3, 0)
+    app.save_schedule_task(EMAIL, "Gym", "Thursday", "09:00 AM", "10:00 AM")
+    app.save_event("b@x.com", "Call", day + timedelta(hours=11), day + timedelta(hours=12))
+    free = app.find_group_free_time([EMAIL, "b@x.com"], day, day + timedelta(days=1), 60, working_hours=(9, 17))
+    assert free == [(day + timedelta(hours=10), day + timedelta(hours=11)),
+                    (day + timedelta(hours=12), day + timedelta(hours=17))]
+    # Letting one member be busy opens the whole working day
+    assert app.find_group_free_time([EMAIL, "b@x.com"], day, day + timedelta(days=1), 60, working_hours=(9, 17),
+                                    max_busy=1) == [(day + timedelta(hours=9), day + timedelta(hours=17))]
@@ -0,0 +1,61 @@
+import random
+
+from intervals import DayIntervalIndex, split_overnight
+from records import format_minutes, parse_minutes
+
+
+def _busy(intervals):
+    return {minute for start, end, _ in intervals for minute in range(start, end)}
+
+
+def _random_intervals(rng, n, day_minutes=200):
+    intervals = []
+    for i in range(n):
+        start = rng.randrange(day_minutes)
+        intervals.append((start, start + rng.randrange(1, 40), f"t{i}"))
+    return intervals
+
+
+def test_time_strings_round_trip():
+    assert parse_minutes("12:00 AM") == 0
+    assert parse_minutes("12:30 PM") == 12 * 60 + 30
+    assert parse_minutes("11:59 PM") == 24 * 60 - 1
+    assert all(parse_minutes(format_minutes(minutes)) == minutes for minutes in range(0, 24 * 60, 7))
+
+
+def test_split_overnight():
+    assert split_overnight("Monday", 60, 120) == [("Monday", 60, 120)]
+    assert split_overnight("Sunday", 22 * 60, 2 * 60) == [("Sunday", 22 * 60, 24 * 60), ("Monday", 0, 2 * 60)]
+
+
+def test_overlaps_matches_brute_force():
+    rng = random.Random(1)
+    for _ in range(200):
+        intervals = _random_intervals(rng, rng.randrange(8))
+        index = DayIntervalIndex(intervals)
+        busy = _busy(intervals)
+        for _ in range(20):
+            start = rng.randrange(240)
+            end = start + rng.randrange(1, 30)
+            assert index.overlaps(start, end) == any(minute in busy for minute in range(start, end))
+
+
+def test_add_and_remove_keep_blocks_merged():
+    rng = random.Random(2)
+    for _ in range(100):
+        intervals = _random_intervals(rng, 10)
+        built = DayIntervalIndex()
+        for start, end, task in intervals:
+            built.add(start, end, task)
+        assert built.blocks() == DayIntervalIndex(intervals).blocks()
+
+        built.remove("t3")
+        assert built.blocks() == DayIntervalIndex([entry for entry in intervals if entry[2] != "t3"]).blocks()
+
+
+def test_free_intervals():
+    index = DayIntervalIndex([(60, 120, "a"), (100, 180, "b"), (300, 330, "c")])
+    assert index.blocks() == [(60, 180), (300, 330)]
+    assert index.free_intervals(30, 0, 400) == [(0, 60), (180, 300), (330, 400)]
+    assert index.free_intervals(100, 0, 400) == [(180, 300)]
+    assert index.free_gaps(30, 90, 320) == [180]
@@ -0,0 +1,106 @@
+import smtplib
+import socket
+
+import pytest
+
+import mailer
+from mailer import DebuggingSMTPServer, MailQueue, SMTPPool
+
+
+@pytest.fixture
+def smtp_server():
+    server = DebuggingSMTPServer(port=0).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _queue(tmp_path, pool):
+    return MailQueue(str(tmp_path / "mail_queue.db"), "app@x.com", pool)
+
+
+def _closed_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def test_queued_messages_are_delivered(tmp_path, smtp_server):
+    pool = SMTPPool(*smtp_server.server_address, username="app@x.com", password="secret", starttls=False)
+    queue = _queue(tmp_path, pool)
+    ids = [queue.enqueue(f"user{i}@x.com", f"Subject {i}", "Body") for i in range(3)]
+    later = queue.enqueue("later@x.com", "Later", "Body", send_at=2 ** 40)
+
+    assert queue.drain() == 3
+    assert [queue.status(message_id)["status"] for message_id in ids + [later]] == ["sent"] * 3 + ["queued"]
+    assert [(sender, recipients) for sender, recipients, _ in smtp_server.messages] == \
+        [("app@x.com", [f"user{i}@x.com"]) for i in range(3)]
+    assert "Subject: Subject 0" in smtp_server.messages[0][2]
+    pool.close()
+
+
+def test_pool_reuses_live_connections(smtp_server):
+    pool = SMTPPool(*smtp_server.server_address, starttls=False, size=1)
+    first, second = pool.acquire(), pool.acquire()
+    assert first is not second
+    pool.release(first)
+    pool.release(second)
+    assert pool.acquire() is first
+
+    # A connection the server dropped is replaced
+    first.close()
+    pool.release(first)
+    assert pool.acquire() is not first
+    pool.close()
+
+
+def test_unreachable_server_backs_off(tmp_path, monkeypatch):
+    queue = _queue(tmp_path, SMTPPool("127.0.0.1", _closed_port(), starttls=False))
+    message_id = queue.enqueue("a@x.com", "Hello", "Body")
+    assert queue.drain() == 1
+    status = queue.status(message_id)
+    assert (status["status"], status["attempts"]) == ("queued", 1) and status["last_error"]
+
+    # Without backoff delays the message is retried until it gives up
+    monkeypatch.setattr(mailer, "RETRY_BASE_DELAY", 0)
+    queue._connection().execute("UPDATE outbox SET next_attempt = 0")
+    queue.drain()
+    assert queue.status(message_id)["status"] == "failed"
+    assert queue.status(message_id)["attempts"] == mailer.MAX_ATTEMPTS
+
+
+# Stands in for a server that refuses some recipients for good
+class _RefusingServer:
+    def __init__(self):
+        self.sent = []
+
+    def sendmail(self, sender, recipient, message):
+        if recipient.startswith("bad"):
+            raise smtplib.SMTPRecipientsRefused({recipient: (550, b"No such user")})
+        self.sent.append(recipient)
+
+
+class _Pool:
+    def __init__(self, server):
+        self.server = server
+        self.released = []
+
+    def acquire(self):
+        return self.server
+
+    def release(self, server):
+        self.released.append(server)
+
+    def _discard(self, server):
+        pass
+
+
+def test_refused_recipients_are_dead_and_keep_the_connection(tmp_path):
+    pool = _Pool(_RefusingServer())
+    queue = _queue(tmp_path, pool)
+    bad = queue.enqueue("bad@x.com", "Hello", "Body")
+    good = queue.enqueue("good@x.com", "Hello", "Body")
+    queue.drain()
+    assert (queue.status(bad)["status"], queue.status(good)["status"]) == ("dead", "sent")
+    assert pool.server.sent == ["good@x.com"] and pool.released == [pool.server]
+    assert queue.counts() == {"dead": 1, "sent": 1}
@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from planner import plan_suggestions, time_per_day
+from recurrence import CalendarIndex, Event
+
+NOW = datetime(2026, 10, 19, 8, 0)
+
+
+def _todos(*rows):
+    return pd.DataFrame([{"Email": "a@x.com", "Task": task, "Deadline": (NOW + timedelta(days=days)).strftime("%Y-%m-%d"),
+                          "Status": status, "Time Needed": minutes, "Priority": "High", "Reminder": False}
+                         for task, days, minutes, status in rows])
+
+
+def test_time_per_day_spreads_work_until_two_days_before_the_deadline():
+    todo_df = _todos(("Essay", 13, 600, "Pending"), ("Slides", 1, 90, "Pending"), ("Read", 30, 60, "Pending"),
+                     ("Call", 30, 10, "Pending"), ("Nothing", 30, 0, "Pending"))
+    # Shares too small to be worth a slot are raised to 15 minutes, never above Time Needed
+    assert time_per_day(todo_df, NOW).tolist() == [60, 90, 15, 10, 0]
+
+
+def test_suggestions_take_distinct_free_gaps():
+    calendar = CalendarIndex([Event("Lunch", NOW.replace(hour=12), NOW.replace(hour=13))])
+    suggestions, minutes, tasks = plan_suggestions(_todos(("Essay", 5, 120, "Pending"), ("Slides", 5, 120, "Pending")),
+                                                   calendar, NOW)
+    today = NOW.date().isoformat()
+    assert minutes == {0: 60, 1: 60}
+    assert suggestions[0][today][0] == 13 * 60
+    assert suggestions[1][today][0] == 14 * 60
+    assert len(suggestions[0]) == 2
+
+
+def test_suggestions_skip_completed_and_empty_todos():
+    suggestions, minutes, tasks = plan_suggestions(
+        _todos(("Essay", 5, 120, "Pending"), ("Done", 5, 120, "Completed"), ("Nothing", 5, 0, "Pending"),
+               ("Essay", 5, 60, "In Progress")), CalendarIndex([]), NOW)
+    assert tasks == {0: "Essay", 3: "Essay"}
+    assert set(suggestions) == set(minutes) == {0, 3}
+    assert plan_suggestions(_todos(("Done", 5, 120, "Completed")), CalendarIndex([]), NOW) == ({}, {}, {})
@@ -0,0 +1,132 @@
+import random
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+import pytest
+
+from recurrence import CalendarIndex, Event, RecurrenceRule, expand, shared_free_time, weekly_event
+
+MONDAY = date(2026, 10, 19)
+
+
+def _at(day, hour, minute=0):
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=hour, minutes=minute)
+
+
+def test_rrule_parse_and_format():
+    rule = RecurrenceRule.parse("RRULE:FREQ=weekly;INTERVAL=2;BYDAY=WE,MO;COUNT=5")
+    assert (rule.freq, rule.interval, rule.by_day, rule.count, rule.until) == ("WEEKLY", 2, [0, 2], 5, None)
+    assert str(rule) == "FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE;COUNT=5"
+    assert str(RecurrenceRule.parse("FREQ=DAILY;UNTIL=20261231T000000Z")) == "FREQ=DAILY;UNTIL=20261231"
+
+
+@pytest.mark.parametrize("text", ["FREQ=MONTHLY", "FREQ=DAILY;INTERVAL=0", "FREQ=WEEKLY;BYDAY=XX", "FREQ"])
+def test_rrule_rejects_unsupported_rules(text):
+    with pytest.raises(ValueError):
+        RecurrenceRule.parse(text)
+
+
+def test_rrule_dates():
+    daily = RecurrenceRule.parse("FREQ=DAILY;INTERVAL=3;COUNT=4")
+    assert list(daily.dates(MONDAY)) == [MONDAY + timedelta(days=k) for k in (0, 3, 6, 9)]
+
+    # BYDAY days before the first date in its week are skipped; UNTIL is inclusive
+    weekly = RecurrenceRule.parse("FREQ=WEEKLY;BYDAY=MO,FR;UNTIL=20261030")
+    assert list(weekly.dates(MONDAY + timedelta(days=1))) == [date(2026, 10, 23), date(2026, 10, 26), date(2026, 10, 30)]
+
+
+def test_rrule_dates_skip_ahead_to_after():
+    rule = RecurrenceRule.parse("FREQ=WEEKLY;INTERVAL=2;BYDAY=TU,TH")
+    after = MONDAY + timedelta(days=400)
+    full = [day for day in islice(rule.dates(MONDAY), 200) if day >= after][:10]
+    assert [day for day in islice(rule.dates(MONDAY, after), 20) if day >= after][:10] == full
+
+
+def test_event_occurrences_skip_cancelled_dates_and_run_past_midnight():
+    event = Event("Night shift", _at(MONDAY, 22), _at(MONDAY, 26), RecurrenceRule.parse("FREQ=DAILY"),
+                  exdates=[MONDAY + timedelta(days=1)])
+    occurrences = list(event.occurrences(_at(MONDAY, 23), _at(MONDAY + timedelta(days=3), 0)))
+    assert occurrences == [(_at(MONDAY, 22), _at(MONDAY, 26), "Night shift"),
+                           (_at(MONDAY, 2 * 24 + 22), _at(MONDAY, 2 * 24 + 26), "Night shift")]
+
+    row = event.to_row("a@x.com")
+    assert row["RRule"] == "FREQ=DAILY" and row["ExDates"] == "2026-10-20"
+    assert list(Event.from_row(row).occurrences(_at(MONDAY, 0), _at(MONDAY, 72))) == \
+        list(event.occurrences(_at(MONDAY, 0), _at(MONDAY, 72)))
+
+
+def test_weekly_event_repeats_on_its_weekday():
+    event = weekly_event("Gym", 2, 17 * 60, 18 * 60)
+    starts = [start for start, _, _ in event.occurrences(_at(MONDAY, 0), _at(MONDAY + timedelta(days=14), 0))]
+    assert starts == [_at(MONDAY + timedelta(days=2), 17), _at(MONDAY + timedelta(days=9), 17)]
+    assert weekly_event("Empty", 0, 60, 60) is None
+    assert weekly_event("Unknown day", -1, 60, 120) is None
+
+
+def _random_calendar(rng):
+    events = []
+    for i in range(rng.randrange(1, 6)):
+        start = _at(MONDAY + timedelta(days=rng.randrange(7)), rng.randrange(24), rng.choice((0, 30)))
+        rule = rng.choice([None, RecurrenceRule("DAILY", rng.randrange(1, 3)), RecurrenceRule("WEEKLY")])
+        events.append(Event(f"e{i}", start, start + timedelta(minutes=rng.randrange(30, 300, 30)), rule))
+    return events
+
+
+def _busy_minutes(events, range_start, range_end):
+    busy = set()
+    for start, end, _ in expand(events, range_start, range_end):
+        minute = max(start, range_start)
+        while minute < min(end, range_end):
+            busy.add(minute)
+            minute += timedelta(minutes=30)
+    return busy
+
+
+def test_calendar_overlaps_match_brute_force():
+    rng = random.Random(4)
+    for _ in range(100):
+        events = _random_calendar(rng)
+        calendar = CalendarIndex(events)
+        range_start, range_end = _at(MONDAY, 0), _at(MONDAY + timedelta(days=21), 0)
+        busy = _busy_minutes(events, range_start, range_end)
+        asked = []
+        for _ in range(10):
+            start = range_start + timedelta(minutes=30 * rng.randrange(2 * 24 * 20))
+            end = start + timedelta(minutes=30 * rng.randrange(1, 8))
+            expected = any(start + timedelta(minutes=30 * k) in busy for k in range((end - start) // timedelta(minutes=30)))
+            assert calendar.overlaps(start, end) == expected
+            asked.append((start, end, expected))
+        asked.sort()
+        assert calendar.overlaps_any([(start, end) for start, end, _ in asked]) == any(hit for _, _, hit in asked)
+
+
+def test_free_time_within_working_hours():
+    calendar = CalendarIndex([Event("Meeting", _at(MONDAY, 10), _at(MONDAY, 11))])
+    assert calendar.free_time(_at(MONDAY, 0), _at(MONDAY, 24), 30, (9 * 60, 17 * 60)) == \
+        [(_at(MONDAY, 9), _at(MONDAY, 10)), (_at(MONDAY, 11), _at(MONDAY, 17))]
+
+
+def test_shared_free_time_matches_brute_force():
+    rng = random.Random(5)
+    for _ in range(50):
+        calendars = [_random_calendar(rng) for _ in range(3)]
+        range_start, range_end = _at(MONDAY, 0), _at(MONDAY + timedelta(days=3), 0)
+        busy = [_busy_minutes(events, range_start, range_end) for events in calendars]
+        for max_busy in (0, 1):
+            free = shared_free_time([CalendarIndex(events) for events in calendars], range_start, range_end, 60,
+                                    max_busy=max_busy)
+            # Every 30-minute step is in a returned gap exactly when few enough members are busy
+            steps = [range_start + timedelta(minutes=30 * k) for k in range(2 * 24 * 3)]
+            in_gap = {step for step in steps if any(start <= step < end for start, end in free)}
+            open_steps = {step for step in steps if sum(step in minutes for minutes in busy) <= max_busy}
+            assert in_gap <= open_steps
+            assert all(end - start >= timedelta(minutes=60) for start, end in free)
+            # and every run of at least an hour of open steps is returned
+            run = []
+            for step in steps + [None]:
+                if step in open_steps:
+                    run.append(step)
+                    continue
+                if len(run) >= 2:
+                    assert set(run) <= in_gap
+                run = []
@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+
+from mailer import MailQueue
+from reminder_daemon import ReminderDaemon, reminder_key
+
+DEADLINE = datetime(2026, 10, 20)
+
+
+def _todo(task, status="Pending", reminder=True, deadline=DEADLINE):
+    return {"Email": "a@x.com", "Task": task, "Deadline": deadline.strftime("%Y-%m-%d"), "Status": status,
+            "Time Needed": 60, "Priority": "High", "Reminder": reminder}
+
+
+def _daemon(storage, tmp_path):
+    queue = MailQueue(str(tmp_path / "mail_queue.db"), "app@x.com", pool=None)
+    daemon = ReminderDaemon(storage, queue, str(tmp_path / "reminder_state.db"))
+    daemon.refresh()
+    return daemon, queue
+
+
+def test_each_todo_is_reminded_once(storage, tmp_path):
+    for todo in (_todo("Essay"), _todo("Essay"), _todo("Read", reminder=False), _todo("Done", "Completed")):
+        storage.insert_todo_task(todo)
+    daemon, queue = _daemon(storage, tmp_path)
+    assert len(daemon) == 2
+    assert daemon.fire_due(DEADLINE - timedelta(days=1, seconds=1)) == 0
+    assert daemon.fire_due(DEADLINE - timedelta(days=1)) == 2
+    assert queue.counts() == {"queued": 2}
+
+    # A restarted daemon knows what was sent
+    daemon, queue = _daemon(storage, tmp_path)
+    assert daemon.fire_due(DEADLINE) == 0
+    assert queue.counts() == {"queued": 2}
+
+
+def test_reminders_due_late_go_out_until_the_deadline_day_ends(storage, tmp_path):
+    daemon, queue = _daemon(storage, tmp_path)
+    storage.insert_todo_task(_todo("Essay"))
+    storage.insert_todo_task(_todo("Slides", deadline=DEADLINE - timedelta(days=1)))
+    daemon.refresh()
+    assert daemon.fire_due(DEADLINE + timedelta(hours=10)) == 1
+    assert queue.counts() == {"queued": 1}
+
+
+def test_edited_todos_are_rescheduled(storage, tmp_path):
+    storage.insert_todo_task(_todo("Essay"))
+    storage.insert_todo_task(_todo("Slides"))
+    daemon, queue = _daemon(storage, tmp_path)
+    storage.update_todo_task("a@x.com", "Essay", {"Status": "Completed"})
+    daemon.refresh()
+    assert daemon.fire_due(DEADLINE) == 1
+
+
+# The message was queued but the process died before recording it as sent
+def test_a_crash_between_queueing_and_recording_sends_once(storage, tmp_path):
+    storage.insert_todo_task(_todo("Essay"))
+    daemon, queue = _daemon(storage, tmp_path)
+    first = queue.enqueue("a@x.com", "Reminder", "Body", dedupe_key=reminder_key(("a@x.com", "Essay", DEADLINE, 0)))
+    assert daemon.fire_due(DEADLINE) == 1
+    assert queue.counts() == {"queued": 1}
+    assert queue.enqueue("a@x.com", "Reminder", "Body",
+                         dedupe_key=reminder_key(("a@x.com", "Essay", DEADLINE, 0))) == first
@@ -0,0 +1,71 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+
+import pytest
+
+import service
+
+
+@pytest.fixture(autouse=True)
+def secret(monkeypatch):
+    monkeypatch.setattr(service, "SERVICE_SECRET", "test-secret")
+
+
+def _signed(payload):
+    return payload + "." + hmac.new(b"test-secret", payload.encode(), hashlib.sha256).hexdigest()
+
+
+def test_token_round_trip():
+    assert service.verify_token(service.issue_token("a@x.com")) == "a@x.com"
+
+
+def test_expired_token():
+    assert service.verify_token(service.issue_token("a@x.com", ttl=-1)) is None
+
+
+def test_token_signed_with_another_secret(monkeypatch):
+    token = service.issue_token("a@x.com")
+    monkeypatch.setattr(service, "SERVICE_SECRET", "other-secret")
+    assert service.verify_token(token) is None
+
+
+@pytest.mark.parametrize("token", ["", ".", "no-dot", "é.é", "abc." + "é" * 64, "abc." + "0" * 64])
+def test_malformed_tokens(token):
+    assert service.verify_token(token) is None
+
+
+def test_tampered_payload():
+    payload, _, signature = service.issue_token("a@x.com").rpartition(".")
+    forged = base64.urlsafe_b64encode(b"admin@x.com\n9999999999").decode().rstrip("=")
+    assert service.verify_token(forged + "." + signature) is None
+
+
+# Correctly signed payloads that do not decode are refused, not raised
+@pytest.mark.parametrize("payload", ["%%%", base64.urlsafe_b64encode(b"\xff\xfe\n1").decode(),
+                                     base64.urlsafe_b64encode(b"a@x.com\nlater").decode()])
+def test_signed_garbage(payload):
+    assert service.verify_token(_signed(payload)) is None
+
+
+def test_service_needs_a_secret(monkeypatch):
+    monkeypatch.setattr(service, "SERVICE_SECRET", "")
+    with pytest.raises(RuntimeError):
+        service.Service(0, 1)
+    with pytest.raises(RuntimeError):
+        service.ServiceClient("http://127.0.0.1:8080")
+
+
+def test_metrics_need_a_token():
+    app = service.Service(0, 1)
+    try:
+        status, _ = asyncio.run(app.dispatch("GET", "/metrics", {}, b""))
+        assert status == 401
+        status, _ = asyncio.run(app.dispatch("GET", "/metrics", {"authorization": "Bearer é.é"}, b""))
+        assert status == 401
+        token = service.issue_token("a@x.com")
+        status, body = asyncio.run(app.dispatch("GET", "/metrics", {"authorization": "Bearer " + token}, b""))
+        assert status == 200 and isinstance(body, str)
+    finally:
+        app.close()
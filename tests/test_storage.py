@@ -0,0 +1,197 @@
+import pandas as pd
+import pytest
+
+from storage import CsvStorage, PartitionedCsvStorage, SQLiteStorage, StaleVersionError, UserExistsError
+
+# Every backend must store and return the same records; each test runs once
+# per backend through the parametrized `storage` fixture.
+
+TODOS = [
+    {"Email": "a@x.com", "Task": "Essay", "Deadline": "2026-10-20", "Status": "Pending", "Time Needed": 60,
+     "Priority": "High", "Reminder": True},
+    {"Email": "b@x.com", "Task": "Read", "Deadline": "2026-10-21", "Status": "Completed", "Time Needed": 30,
+     "Priority": "Low", "Reminder": False},
+    {"Email": "a@x.com", "Task": "Slides", "Deadline": "2026-10-27", "Status": "In Progress", "Time Needed": 90,
+     "Priority": "Medium", "Reminder": False},
+]
+
+SCHEDULE = [
+    {"Email": "a@x.com", "Task": "Gym", "Day": "Monday", "Time From": "09:00 AM", "Time To": "10:00 AM"},
+    {"Email": "a@x.com", "Task": "Night shift", "Day": "Friday", "Time From": "10:00 PM", "Time To": "02:00 AM"},
+    {"Email": "b@x.com", "Task": "Gym", "Day": "Monday", "Time From": "07:00 AM", "Time To": "08:00 AM"},
+]
+
+
+def _event(email, task, start="2026-10-20 09:00", end="2026-10-20 10:00", rrule="", exdates=""):
+    return {"Email": email, "Task": task, "Start": start, "End": end, "RRule": rrule, "ExDates": exdates}
+
+
+def _records(df):
+    return df.to_dict("records")
+
+
+def test_todo_round_trip(storage):
+    for row in TODOS:
+        storage.insert_todo_task(row)
+
+    assert _records(storage.load_todo_tasks("a@x.com")) == [TODOS[0], TODOS[2]]
+    assert sorted(map(tuple, (row.values() for row in _records(storage.load_todo_tasks())))) == \
+        sorted(map(tuple, (row.values() for row in TODOS)))
+
+    storage.update_todo_task("a@x.com", "Essay", {"Status": "Completed"})
+    storage.delete_todo_task("a@x.com", "Slides")
+    assert _records(storage.load_todo_tasks("a@x.com")) == [{**TODOS[0], "Status": "Completed"}]
+    assert _records(storage.load_todo_tasks("b@x.com")) == [TODOS[1]]
+
+
+# Rows read back from CSV carry "False" strings and blank minutes
+def test_todo_values_are_normalised(storage):
+    storage.insert_todo_task({**TODOS[0], "Reminder": "False", "Time Needed": float("nan")})
+    storage.insert_todo_task({**TODOS[2], "Reminder": "1", "Time Needed": "45"})
+    assert _records(storage.load_todo_tasks("a@x.com")) == [
+        {**TODOS[0], "Reminder": False, "Time Needed": 0}, {**TODOS[2], "Reminder": True, "Time Needed": 45}]
+
+
+def test_schedule_round_trip(storage):
+    for row in SCHEDULE:
+        storage.insert_schedule_task(row)
+
+    assert _records(storage.load_schedule_tasks("a@x.com")) == SCHEDULE[:2]
+    assert _records(storage.load_schedule_tasks("a@x.com", day="Friday")) == [SCHEDULE[1]]
+    assert len(storage.load_schedule_tasks(day="Monday")) == 2
+
+    storage.delete_schedule_task("a@x.com", "Gym", "Monday")
+    assert _records(storage.load_schedule_tasks("a@x.com")) == [SCHEDULE[1]]
+    assert _records(storage.load_schedule_tasks("b@x.com")) == [SCHEDULE[2]]
+
+
+def test_event_round_trip(storage):
+    weekly = _event("a@x.com", "Standup", rrule="FREQ=WEEKLY;BYDAY=MO,WE")
+    storage.insert_event(weekly)
+    storage.insert_event(_event("b@x.com", "Lunch"))
+    storage.insert_event(_event("a@x.com", "Lunch"))
+
+    assert _records(storage.load_events("a@x.com")) == [weekly, _event("a@x.com", "Lunch")]
+    assert len(storage.load_events()) == 3
+
+    storage.update_event("a@x.com", "Standup", weekly["Start"], {"ExDates": "2026-10-21"})
+    storage.delete_event("a@x.com", "Lunch", "2026-10-20 09:00")
+    assert _records(storage.load_events("a@x.com")) == [{**weekly, "ExDates": "2026-10-21"}]
+    assert _records(storage.load_events("b@x.com")) == [_event("b@x.com", "Lunch")]
+
+
+def test_group_reads_and_batch_event_inserts(storage):
+    for row in SCHEDULE:
+        storage.insert_schedule_task(row)
+    storage.insert_events([_event("a@x.com", "Review"), _event("b@x.com", "Review"), _event("c@x.com", "Lunch")])
+
+    assert sorted(_records(storage.load_group_schedule_tasks(["a@x.com", "b@x.com"])), key=str) == \
+        sorted(SCHEDULE, key=str)
+    assert sorted(_records(storage.load_group_events(["a@x.com", "b@x.com"])), key=str) == \
+        sorted([_event("a@x.com", "Review"), _event("b@x.com", "Review")], key=str)
+    assert storage.load_group_events([]).empty
+
+
+def test_insert_events_refuses_stale_versions(storage):
+    expected = {(kind, email): storage.version(kind, email)
+                for email in ("a@x.com", "b@x.com") for kind in ("schedule", "event")}
+    storage.insert_event(_event("b@x.com", "Dentist"))
+
+    with pytest.raises(StaleVersionError) as error:
+        storage.insert_events([_event("a@x.com", "Meeting"), _event("b@x.com", "Meeting")], expected)
+    assert "b@x.com" in error.value.emails
+    assert storage.load_events("a@x.com").empty
+    assert _records(storage.load_events("b@x.com")) == [_event("b@x.com", "Dentist")]
+
+
+def test_flat_files_are_split_per_user(tmp_path):
+    files = [str(tmp_path / name) for name in ("users.csv", "todo_tasks.csv", "schedule_tasks.csv",
+                                               "verification_codes.csv")]
+    pd.DataFrame(TODOS).to_csv(files[1], index=False)
+    pd.DataFrame(SCHEDULE).to_csv(files[2], index=False)
+
+    storage = PartitionedCsvStorage(*files)
+    assert _records(storage.load_todo_tasks("a@x.com")) == [TODOS[0], TODOS[2]]
+    assert _records(storage.load_schedule_tasks("b@x.com")) == [SCHEDULE[2]]
+
+    # Writes after the split land in the partitions, not the flat file
+    storage.delete_todo_task("a@x.com", "Essay")
+    assert _records(PartitionedCsvStorage(*files).load_todo_tasks("a@x.com")) == [TODOS[2]]
+    assert len(pd.read_csv(files[1])) == 3
+
+
+def test_users_and_verification_codes(storage):
+    storage.insert_user("a@x.com", "hash-1")
+    assert storage.get_user_password("a@x.com") == "hash-1"
+    assert storage.get_user_password("nobody@x.com") is None
+    storage.insert_user("b@x.com", "hash-2")
+    storage.update_user_password("a@x.com", "hash-3")
+    with pytest.raises(UserExistsError):
+        storage.insert_user("a@x.com", "hash-4")
+    assert sorted(map(tuple, storage.load_users())) == [("a@x.com", "hash-3"), ("b@x.com", "hash-2")]
+
+    storage.upsert_verification_code("a@x.com", "123456", "2026-10-17 09:00:00")
+    storage.upsert_verification_code("a@x.com", "654321", "2026-10-17 09:01:00")
+    code, timestamp = storage.get_verification_code("a@x.com")
+    assert (str(code), str(timestamp)) == ("654321", "2026-10-17 09:01:00")
+
+    storage.delete_verification_code("a@x.com")
+    assert storage.get_verification_code("a@x.com") is None
+
+
+def test_version_moves_on_every_write(storage):
+    seen = {storage.version("todo", "a@x.com")}
+    for write in (lambda: storage.insert_todo_task(TODOS[0]),
+                  lambda: storage.update_todo_task("a@x.com", "Essay", {"Status": "Completed"}),
+                  lambda: storage.delete_todo_task("a@x.com", "Essay"),
+                  lambda: storage.insert_schedule_task(SCHEDULE[0]),
+                  lambda: storage.insert_event(_event("a@x.com", "Lunch"))):
+        write()
+        version = tuple(storage.version(kind, "a@x.com") for kind in ("todo", "schedule", "event"))
+        assert version not in seen
+        seen.add(version)
+
+    before = storage.version("users", "a@x.com")
+    storage.insert_user("a@x.com", "hash-1")
+    after = storage.version("users", "a@x.com")
+    storage.update_user_password("a@x.com", "hash-2")
+    assert len({before, after, storage.version("users", "a@x.com")}) == 3
+
+
+def test_migrate_from_csv(tmp_path):
+    files = [str(tmp_path / name) for name in ("users.csv", "todo_tasks.csv", "schedule_tasks.csv",
+                                               "verification_codes.csv")]
+    pd.DataFrame([{"Email": "a@x.com", "Password": "hash-1"}]).to_csv(files[0], index=False)
+    pd.DataFrame(TODOS).to_csv(files[1], index=False)
+    pd.DataFrame(SCHEDULE).to_csv(files[2], index=False)
+
+    database = SQLiteStorage(str(tmp_path / "schedule_app.db"))
+    assert database.migrate_from_csv(CsvStorage(*files))
+    assert not database.migrate_from_csv(CsvStorage(*files))
+    assert database.get_user_password("a@x.com") == "hash-1"
+    assert _records(database.load_todo_tasks("a@x.com")) == [TODOS[0], TODOS[2]]
+    assert _records(database.load_schedule_tasks("a@x.com")) == SCHEDULE[:2]
+
+
+def test_user_stats(storage):
+    for row in TODOS:
+        storage.insert_todo_task(row)
+    for row in SCHEDULE:
+        storage.insert_schedule_task(row)
+    storage.insert_user("a@x.com", "hash-1")
+
+    stats = storage.user_stats("a@x.com")
+    assert stats.todo_counts == {("Pending", "2026-10-19"): 1, ("In Progress", "2026-10-26"): 1}
+    assert stats.weekday_minutes == {"Monday": 60, "Friday": 240}
+
+    # Counts follow updates and deletes
+    storage.update_todo_task("a@x.com", "Essay", {"Status": "Completed"})
+    storage.delete_schedule_task("a@x.com", "Gym", "Monday")
+    stats = storage.user_stats("a@x.com")
+    assert stats.todo_counts == {("Completed", "2026-10-19"): 1, ("In Progress", "2026-10-26"): 1}
+    assert stats.weekday_minutes == {"Friday": 240}
+
+    rollup = storage.stats_rollup()
+    assert rollup.users == 1
+    assert rollup.weekday_minutes == {"Monday": 60, "Friday": 240}
+    assert sum(rollup.todo_counts.values()) == 3
@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+from conftest import FakeClock
+from ttl_store import TTLStore, VerificationCodeStore
+
+START = datetime(2026, 10, 17, 9, 0)
+TTL = timedelta(minutes=5)
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock(START)
+    expired = []
+    store = TTLStore(TTL, clock, on_expire=expired.extend)
+    store.set("a", 1)
+    clock.now += timedelta(minutes=3)
+    store.set("b", 2)
+    assert (store.get("a"), store.get("b"), len(store)) == (1, 2, 2)
+
+    clock.now += timedelta(minutes=2)
+    assert store.get("a") is None and store.get("b") == 2
+    assert expired == [("a", START)]
+
+
+def test_upsert_restarts_the_ttl():
+    clock = FakeClock(START)
+    store = TTLStore(TTL, clock)
+    store.set("a", 1)
+    clock.now += timedelta(minutes=4)
+    store.set("a", 2)
+    clock.now += timedelta(minutes=4)
+    assert store.get_entry("a") == (2, START + timedelta(minutes=4))
+    assert store.pop("a") == 2 and store.get("a") is None
+
+
+def test_entries_created_long_ago_are_not_stored():
+    store = TTLStore(TTL, FakeClock(START))
+    assert store.set("a", 1, created=START - TTL) is None
+    assert store.get("a") is None
+
+
+def test_codes_are_written_through(storage):
+    clock = FakeClock(START)
+    codes = VerificationCodeStore(storage, TTL, clock)
+    codes.set("a@x.com", "123456")
+    assert codes.get("a@x.com") == "123456"
+
+    # A restarted process sees the code; another one's re-send and use win over memory
+    other = VerificationCodeStore(storage, TTL, clock)
+    assert other.get("a@x.com") == "123456"
+    clock.now += timedelta(seconds=1)
+    other.set("a@x.com", "654321")
+    assert codes.get("a@x.com") == "654321"
+    other.pop("a@x.com")
+    assert codes.get("a@x.com") is None
+    assert storage.get_verification_code("a@x.com") is None
+
+
+def test_expired_codes_leave_storage(storage):
+    clock = FakeClock(START)
+    codes = VerificationCodeStore(storage, TTL, clock)
+    codes.set("a@x.com", "123456")
+    codes.set("b@x.com", "222222")
+    clock.now += TTL
+    assert codes.get("a@x.com") is None
+    assert len(codes) == 0
+    assert storage.get_verification_code("b@x.com") is None
+
+    # Codes abandoned while no process was running are dropped on startup
+    clock.now = START
+    codes.set("c@x.com", "333333")
+    clock.now += TTL
+    assert len(VerificationCodeStore(storage, TTL, clock)) == 0
+    assert list(storage.load_verification_codes()) == []
+
+
+def test_expired_codes_from_other_processes_leave_storage(storage):
+    clock = FakeClock(START)
+    codes = VerificationCodeStore(storage, TTL, clock)
+    storage.upsert_verification_code("a@x.com", "123456", START - TTL)
+    assert codes.get("a@x.com") is None
+    assert storage.get_verification_code("a@x.com") is None
@@ -0,0 +1,142 @@
+import heapq
+import threading
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+# How long a verification code stays valid
+VERIFICATION_CODE_TTL = timedelta(minutes=5)
+
+# Open code stores are kept per process so entries survive Streamlit reruns
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+# In-memory key-value store whose entries expire a fixed time after they are set.
+#
+# Lookups and upserts are dict operations. Expiry times go into a min-heap, and
+# every call first pops the entries whose time has passed, so expired entries
+# are evicted without scanning the store. Heap entries made stale by a later
+# upsert are skipped when popped.
+class TTLStore:
+    def __init__(self, ttl, clock=datetime.now, on_expire=None):
+        self.ttl = ttl
+        self.clock = clock
+        self.on_expire = on_expire
+        self._entries = {}
+        self._heap = []
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        with self._lock:
+            self.purge()
+            return len(self._entries)
+
+    def set(self, key, value, created=None):
+        created = self.clock() if created is None else created
+        expires = created + self.ttl
+        with self._lock:
+            self.purge()
+            if expires <= self.clock():
+                return None
+            self._entries[key] = (value, created, expires)
+            heapq.heappush(self._heap, (expires, key))
+        return expires
+
+    # Value for key, or None if it is missing or expired
+    def get(self, key):
+        with self._lock:
+            self.purge()
+            entry = self._entries.get(key)
+            return None if entry is None else entry[0]
+
+    # (value, created) for key, or None if it is missing or expired
+    def get_entry(self, key):
+        with self._lock:
+            self.purge()
+            entry = self._entries.get(key)
+            return None if entry is None else entry[:2]
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return None if entry is None else entry[0]
+
+    # Evict everything that has expired; returns the evicted (key, created) pairs
+    def purge(self):
+        now = self.clock()
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                expires, key = heapq.heappop(self._heap)
+                entry = self._entries.get(key)
+                if entry is not None and entry[2] == expires:
+                    del self._entries[key]
+                    expired.append((key, entry[1]))
+            if len(self._heap) > 2 * len(self._entries) + 1024:
+                self._heap = [(entry[2], key) for key, entry in self._entries.items()]
+                heapq.heapify(self._heap)
+        if expired and self.on_expire is not None:
+            self.on_expire(expired)
+        return expired
+
+
+# Verification codes kept in a TTLStore and written through to the storage
+# backend, so codes survive restarts and are visible to other processes.
+# Expired codes are deleted from storage as they are evicted from memory.
+class VerificationCodeStore:
+    def __init__(self, storage, ttl=VERIFICATION_CODE_TTL, clock=datetime.now):
+        self.storage = storage
+        self.ttl = ttl
+        self.clock = clock
+        self._store = TTLStore(ttl, clock, on_expire=self._delete_expired)
+
+        # Load live codes once and drop the ones abandoned while we were down
+        expired = []
+        for email, code, timestamp in storage.load_verification_codes():
+            if self._store.set(email, str(code).strip(), pd.to_datetime(timestamp).to_pydatetime()) is None:
+                expired.append((email, timestamp))
+        if expired:
+            storage.delete_verification_codes(expired)
+
+    def __len__(self):
+        return len(self._store)
+
+    def _delete_expired(self, expired):
+        self.storage.delete_verification_codes([(email, str(created)) for email, created in expired])
+
+    def set(self, email, code):
+        created = self.clock()
+        self.storage.upsert_verification_code(email, code, created)
+        self._store.set(email, str(code), created)
+
+    # The live code for email, or None. Storage is the source of truth: another
+    # process may have re-sent or used the code, so the stored row always wins
+    # and the in-memory entry only tracks its expiry.
+    def get(self, email):
+        stored = self.storage.get_verification_code(email)
+        if stored is None:
+            self._store.pop(email)
+            return None
+        code, created = str(stored[0]).strip(), pd.to_datetime(stored[1]).to_pydatetime()
+        if self._store.get_entry(email) != (code, created):
+            if self._store.set(email, code, created) is None:
+                # Expired before this process saw it (on_expire only covers codes we hold)
+                self._store.pop(email)
+                self.storage.delete_verification_codes([(email, str(created))])
+                return None
+        return self._store.get(email)
+
+    def pop(self, email):
+        self._store.pop(email)
+        self.storage.delete_verification_code(email)
+
+
+# Open (or reuse) the verification code store for a storage backend
+def open_verification_codes(storage, ttl=VERIFICATION_CODE_TTL):
+    with _stores_lock:
+        store = _stores.get(id(storage))
+        if store is None or store.storage is not storage:
+            store = VerificationCodeStore(storage, ttl)
+            _stores[id(storage)] = store
+        return store